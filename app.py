@@ -3,10 +3,10 @@ Main entry point - backward compatible wrapper
 For new installations, use run.py instead
 """
 from app import create_app
-from app.db_init import initialize_db
+from app.db_init import check_schema
 
 app = create_app()
 
 if __name__ == '__main__':
-    initialize_db(app)
+    check_schema(app)
     app.run(debug=True)
@@ -2,14 +2,17 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 import os
+from app.database import RoutingSession
+from app.startup import LazyGroup, LazyView, StartupTimer
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})  # reads/writes split, see app/database.py
 login_manager = LoginManager()
 
 
 def create_app(config_name='default'):
     """Application factory pattern"""
+    timer = StartupTimer()  # phase timings, see app/startup.py
     # Get the root directory (parent of app/)
     root_dir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
     template_dir = os.path.join(root_dir, 'templates')
@@ -22,10 +25,61 @@ def create_app(config_name='default'):
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///streamverse.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
+    # Engine profile: pools, SQLite pragmas, reader/writer split (see app/database.py)
+    app.config['DB_PROFILE'] = os.environ.get('DB_PROFILE', 'tuned')  # 'tuned' or 'default'
+    app.config['DATABASE_READ_URL'] = os.environ.get('DATABASE_READ_URL')  # e.g. a PostgreSQL replica
+    for key in ('DB_POOL_SIZE', 'DB_MAX_OVERFLOW', 'DB_WRITER_POOL_SIZE', 'DB_WRITER_MAX_OVERFLOW',
+                'DB_POOL_TIMEOUT'):
+        app.config[key] = os.environ.get(key)  # unset: per-database default from app/database.py
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    app.config['SQLITE_CACHE_SIZE_KB'] = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 32768))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    
+    # Home page shelf cache
+    app.config['SHELF_CACHE_TTL'] = int(os.environ.get('SHELF_CACHE_TTL', 300))  # seconds
+    app.config['SHELF_CACHE_USERS'] = int(os.environ.get('SHELF_CACHE_USERS', 1024))
+    
+    # Content-based Top Picks cached per user (see app/recommend.py)
+    app.config['RECOMMEND_CACHE_TTL'] = int(os.environ.get('RECOMMEND_CACHE_TTL', 3600))  # seconds
+    
+    # Collaborative filtering job (see app/collab.py)
+    app.config['COLLAB_METHOD'] = os.environ.get('COLLAB_METHOD', 'svd')  # 'svd' or 'als'
+    app.config['COLLAB_FACTORS'] = int(os.environ.get('COLLAB_FACTORS', 64))
+    app.config['COLLAB_TOP_K'] = int(os.environ.get('COLLAB_TOP_K', 20))
+    app.config['COLLAB_FULL_REFRESH_RATIO'] = float(os.environ.get('COLLAB_FULL_REFRESH_RATIO', 0.2))
+    app.config['COLLAB_MODEL_PATH'] = os.environ.get('COLLAB_MODEL_PATH')  # default: instance/collab.npz
+    
+    # Subscription status cache (per user)
+    app.config['SUBSCRIPTION_CACHE_TTL'] = int(os.environ.get('SUBSCRIPTION_CACHE_TTL', 60))  # seconds
+    app.config['SUBSCRIPTION_CACHE_SIZE'] = int(os.environ.get('SUBSCRIPTION_CACHE_SIZE', 4096))
+    
+    # Logged-in user cache (Flask-Login user_loader)
+    app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', 300))  # seconds
+    app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 4096))
+    
+    # How often each process re-reads the catalog version (ETags, cross-process cache invalidation)
+    app.config['CATALOG_VERSION_TTL'] = float(os.environ.get('CATALOG_VERSION_TTL', 2))  # seconds
+    
     # Stripe configuration
     app.config['STRIPE_SECRET_KEY'] = os.environ.get('STRIPE_SECRET_KEY', None)
     app.config['STRIPE_WEBHOOK_SECRET'] = os.environ.get('STRIPE_WEBHOOK_SECRET', None)
     app.config['STRIPE_PUBLISHABLE_KEY'] = os.environ.get('STRIPE_PUBLISHABLE_KEY', None)
+    # Stripe API client (see app/payments.py)
+    app.config['STRIPE_API_BASE'] = os.environ.get('STRIPE_API_BASE', 'https://api.stripe.com')
+    app.config['STRIPE_CONNECT_TIMEOUT'] = float(os.environ.get('STRIPE_CONNECT_TIMEOUT', 3))  # seconds
+    app.config['STRIPE_READ_TIMEOUT'] = float(os.environ.get('STRIPE_READ_TIMEOUT', 10))  # seconds
+    app.config['STRIPE_MAX_CONCURRENCY'] = int(os.environ.get('STRIPE_MAX_CONCURRENCY', 8))
+    
+    # Stripe webhook queue (see app/webhooks.py)
+    app.config['WEBHOOK_WORKER'] = os.environ.get('WEBHOOK_WORKER', 'thread')  # 'thread' or 'off'
+    app.config['WEBHOOK_BATCH_SIZE'] = int(os.environ.get('WEBHOOK_BATCH_SIZE', 100))
+    app.config['WEBHOOK_MAX_ATTEMPTS'] = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', 8))
+    app.config['WEBHOOK_POLL_INTERVAL'] = float(os.environ.get('WEBHOOK_POLL_INTERVAL', 5))  # seconds
+    
+    # Request/SQL/template instrumentation (see app/metrics.py)
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') == '1'
+    app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 200))
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')  # lets Prometheus scrape without a session
     
     # File upload settings
     UPLOAD_FOLDER = os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'static', 'uploads')
@@ -34,69 +88,102 @@ def create_app(config_name='default'):
     os.makedirs(POSTER_FOLDER, exist_ok=True)
     app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
     app.config['POSTER_FOLDER'] = POSTER_FOLDER
+    # Background threads resizing posters/avatars (0 = resize inline)
+    app.config['IMAGE_WORKERS'] = int(os.environ.get('IMAGE_WORKERS', 2))
     
+    timer.mark('config')
+
     # Initialize extensions
+    from app import database
+    database.configure(app)
     db.init_app(app)
+    database.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'login'
     login_manager.login_message = 'Please login to access this page.'
     
-    # Import models
-    from app.models import User
-    
-    @login_manager.user_loader
-    def load_user(user_id):
-        return User.query.get(int(user_id))
-    
-    # Register blueprints
-    from app.routes.main import bp as main_bp
-    from app.routes.auth import bp as auth_bp
-    from app.routes.movies import bp as movies_bp
-    from app.routes.user import bp as user_bp
-    from app.routes.admin import bp as admin_bp
-    from app.routes.subscriptions import bp as subscriptions_bp
-    
-    # Register routes directly on app (bypassing blueprint prefixing for backward compatibility)
-    from app.routes import auth, main, movies, user, admin, subscriptions
+    # Request, SQL and template metrics (/admin/metrics)
+    from app import metrics
+    metrics.init_app(app)
+    
+    # Cached user loader (see app/users.py)
+    from app.users import load_user
+    login_manager.user_loader(load_user)
+    timer.mark('extensions')
+    
+    # Responsive image helpers for templates
+    from app import images
+    for helper in (images.poster_src, images.poster_srcset, images.avatar_src, images.avatar_srcset):
+        app.add_template_global(helper)
+    
+    # Fingerprinted static files (built by `flask assets build`)
+    from app import assets
+    assets.init_app(app)
+    timer.mark('templates/static')
+    
+    # CLI commands; each group's module is imported when the group is used
+    from app.db_init import init_db_command
+    app.cli.add_command(init_db_command)
+    for name, import_name, help in (
+        ('reviews', 'app.reviews:reviews_cli', 'Review aggregate maintenance.'),
+        ('assets', 'app.assets:assets_cli', 'Static asset build.'),
+        ('webhooks', 'app.webhooks:webhooks_cli', 'Stripe webhook queue.'),
+        ('catalog', 'app.catalog_io:catalog_cli', 'Bulk catalog import and export.'),
+        ('collab', 'app.collab:collab_cli', 'Collaborative-filtering recommendations.'),
+        ('schema', 'app.migrations:schema_cli', 'Database schema migrations.'),
+    ):
+        app.cli.add_command(LazyGroup(name, import_name, help=help))
+    timer.mark('cli')
+    
+    # Register routes directly on app (bypassing blueprint prefixing for backward compatibility).
+    # Each route module is imported by the first request to one of its endpoints (see app/startup.py).
+    def route(rule, endpoint, view, **options):
+        app.add_url_rule(rule, endpoint, LazyView(f'app.routes.{view}'), **options)
     
     # Main routes
-    app.add_url_rule('/', 'landing', main.landing)
-    app.add_url_rule('/home', 'home', main.home)
-    app.add_url_rule('/api/search', 'api_search', main.api_search)
+    route('/', 'landing', 'main.landing')
+    route('/home', 'home', 'main.home')
+    route('/api/search', 'api_search', 'main.api_search')
+    route('/api/movies', 'api_movies', 'main.api_movies')
+    route('/api/shelves', 'api_shelves', 'main.api_shelves')
     
     # Auth routes
-    app.add_url_rule('/login', 'login', auth.login, methods=['GET', 'POST'])
-    app.add_url_rule('/register', 'register', auth.register, methods=['GET', 'POST'])
-    app.add_url_rule('/logout', 'logout', auth.logout)
+    route('/login', 'login', 'auth.login', methods=['GET', 'POST'])
+    route('/register', 'register', 'auth.register', methods=['GET', 'POST'])
+    route('/logout', 'logout', 'auth.logout')
     
     # Movie routes
-    app.add_url_rule('/movie/<int:movie_id>', 'movie_detail', movies.movie_detail)
-    app.add_url_rule('/add_review/<int:movie_id>', 'add_review', movies.add_review, methods=['GET', 'POST'])
-    app.add_url_rule('/watchlist/add/<int:movie_id>', 'add_to_watchlist', movies.add_to_watchlist, methods=['POST'])
-    app.add_url_rule('/watchlist/remove/<int:movie_id>', 'remove_from_watchlist', movies.remove_from_watchlist, methods=['GET', 'POST'])
-    app.add_url_rule('/watchlist', 'watchlist', movies.watchlist)
+    route('/movie/<int:movie_id>', 'movie_detail', 'movies.movie_detail')
+    route('/movie/<int:movie_id>/reviews', 'movie_reviews', 'movies.movie_reviews')
+    route('/add_review/<int:movie_id>', 'add_review', 'movies.add_review', methods=['GET', 'POST'])
+    route('/watchlist/add/<int:movie_id>', 'add_to_watchlist', 'movies.add_to_watchlist', methods=['POST'])
+    route('/watchlist/remove/<int:movie_id>', 'remove_from_watchlist', 'movies.remove_from_watchlist', methods=['GET', 'POST'])
+    route('/watchlist', 'watchlist', 'movies.watchlist')
     
     # User routes
-    app.add_url_rule('/dashboard', 'dashboard', user.dashboard)
-    app.add_url_rule('/profile/<username>', 'profile', user.profile)
-    app.add_url_rule('/edit_profile', 'edit_profile', user.edit_profile, methods=['GET', 'POST'])
-    app.add_url_rule('/remove_watchlist/<int:movie_id>', 'remove_watchlist', user.remove_watchlist, methods=['POST'])
+    route('/dashboard', 'dashboard', 'user.dashboard')
+    route('/profile/<username>', 'profile', 'user.profile')
+    route('/edit_profile', 'edit_profile', 'user.edit_profile', methods=['GET', 'POST'])
+    route('/remove_watchlist/<int:movie_id>', 'remove_watchlist', 'user.remove_watchlist', methods=['POST'])
     
     # Admin routes
-    app.add_url_rule('/admin', 'admin_dashboard', admin.admin_dashboard)
-    app.add_url_rule('/admin/subscription_plans', 'admin_subscription_plans', admin.admin_subscription_plans)
-    app.add_url_rule('/admin/subscription_plans/add', 'admin_subscription_plans_add', admin.admin_subscription_plans_add, methods=['GET', 'POST'])
-    app.add_url_rule('/admin/subscription_users', 'admin_subscription_users', admin.admin_subscription_users)
-    app.add_url_rule('/admin/edit/<int:movie_id>', 'admin_edit', admin.admin_edit, methods=['GET'])
-    app.add_url_rule('/edit_movie/<int:movie_id>', 'edit_movie', admin.edit_movie, methods=['POST'])
-    app.add_url_rule('/delete_movie/<int:movie_id>', 'delete_movie', admin.delete_movie, methods=['POST'])
-    app.add_url_rule('/add_movie', 'add_movie', admin.add_movie, methods=['GET', 'POST'])
+    route('/admin', 'admin_dashboard', 'admin.admin_dashboard')
+    route('/admin/subscription_plans', 'admin_subscription_plans', 'admin.admin_subscription_plans')
+    route('/admin/subscription_plans/add', 'admin_subscription_plans_add', 'admin.admin_subscription_plans_add', methods=['GET', 'POST'])
+    route('/admin/subscription_users', 'admin_subscription_users', 'admin.admin_subscription_users')
+    route('/admin/edit/<int:movie_id>', 'admin_edit', 'admin.admin_edit', methods=['GET'])
+    route('/edit_movie/<int:movie_id>', 'edit_movie', 'admin.edit_movie', methods=['POST'])
+    route('/delete_movie/<int:movie_id>', 'delete_movie', 'admin.delete_movie', methods=['POST'])
+    route('/add_movie', 'add_movie', 'admin.add_movie', methods=['GET', 'POST'])
+    app.add_url_rule('/admin/metrics', 'admin_metrics', metrics.metrics_view)
     
     # Subscription routes
-    app.add_url_rule('/subscriptions', 'subscriptions', subscriptions.subscriptions)
-    app.add_url_rule('/subscribe/<int:plan_id>', 'subscribe', subscriptions.subscribe, methods=['GET', 'POST'])
-    app.add_url_rule('/subscription/cancel', 'cancel_subscription', subscriptions.cancel_subscription, methods=['POST'])
-    app.add_url_rule('/stripe/webhook', 'stripe_webhook', subscriptions.stripe_webhook, methods=['POST'])
+    route('/subscriptions', 'subscriptions', 'subscriptions.subscriptions')
+    route('/subscribe/<int:plan_id>', 'subscribe', 'subscriptions.subscribe', methods=['GET', 'POST'])
+    route('/subscription/cancel', 'cancel_subscription', 'subscriptions.cancel_subscription', methods=['POST'])
+    route('/stripe/webhook', 'stripe_webhook', 'subscriptions.stripe_webhook', methods=['POST'])
+    timer.mark('routes')
+    app.extensions['startup'] = timer.phases
     
     return app
 
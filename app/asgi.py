@@ -0,0 +1,243 @@
+"""Async read path: the catalog JSON APIs as an ASGI application
+
+    uvicorn asgi:application --workers 2
+
+serves /api/search (typeahead included), /api/movies and /api/shelves from
+an event loop, so a slow or idle keep-alive call costs a coroutine instead of
+a worker thread.  Everything else stays on the WSGI app; the proxy sends
+these three paths to the ASGI processes (see the README).
+
+The handlers run inside a Flask request context of an app built by
+create_app(), so they share its models, caches (shelves, autocomplete index,
+catalog version), ETags and JSON with the Flask views and return the same
+responses.  SQL goes through an AsyncSession on
+database.create_async_reader().  The few things that only exist as sync
+code, cache rebuilds of the shelves and the autocomplete index, run in a
+worker thread; lifespan startup builds them before the first request.
+"""
+import asyncio
+import io
+import sys
+import time
+from flask import abort, jsonify, request, session as flask_session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from werkzeug.exceptions import HTTPException, InternalServerError, MethodNotAllowed, NotFound
+from app import create_app, autocomplete, catalog, database, metrics, search, shelves, startup
+from app.models import CatalogState, Movie
+from app.pagination import InvalidCursor, keyset_query, keyset_rows
+from app.routes.main import POPULAR_GENRES, catalog_statement, grid_movie_json, movie_json, shelves_json
+from app.taxonomy import has_genre
+
+
+def _environ(scope):
+    """A WSGI environ for Flask's request context, from an ASGI HTTP scope"""
+    host, port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': host,
+        'SERVER_PORT': str(port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        key = name.decode('latin-1').upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = f'HTTP_{key}'
+        value = value.decode('latin-1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def _send(send, response, head=False):
+    headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers.items()]
+    await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': b'' if head else response.get_data()})
+
+
+class AsyncCatalogAPI:
+    """ASGI callable serving the read-only catalog endpoints of flask_app"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.engine = database.create_async_reader(flask_app)
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.routes = {  # path -> (endpoint, handler), named like the Flask views
+            '/api/search': ('api_search', self.api_search),
+            '/api/movies': ('api_movies', self.api_movies),
+            '/api/shelves': ('api_shelves', self.api_shelves),
+        }
+        self.fts = None  # search.fts_enabled(), once known
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise RuntimeError(f"Unsupported ASGI scope {scope['type']!r}")
+
+        started = time.perf_counter()
+        endpoint, handler = self.routes.get(scope['path'], ('unmatched', None))
+        with self.flask_app.request_context(_environ(scope)):
+            try:
+                if handler is None:
+                    raise NotFound()
+                if request.method not in ('GET', 'HEAD'):
+                    raise MethodNotAllowed(['GET', 'HEAD'])
+                async with self.session() as session:
+                    response = await self._conditional(session, handler, endpoint == 'api_shelves')
+            except HTTPException as e:
+                response = e.get_response()
+            except Exception:
+                self.flask_app.logger.exception('Error serving %s', scope['path'])
+                response = InternalServerError().get_response()
+            await _send(send, response, head=request.method == 'HEAD')
+        metrics.observe_request(self.flask_app, endpoint, scope['method'], response.status_code,
+                                time.perf_counter() - started)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await asyncio.to_thread(self.warm)
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def warm(self):
+        """Build the caches the handlers would otherwise build on the first requests"""
+        startup.warm(self.flask_app, views=False)
+        with self.flask_app.app_context():
+            self.fts = search.fts_enabled()
+
+    async def _in_thread(self, function, *args):
+        """Run sync code that uses db.session in a worker thread, inside this request's Flask context"""
+        return await asyncio.to_thread(function, *args)
+
+    # -- conditional responses, as @catalog.conditional() -------------------------
+
+    async def _etag(self, session, shelf_token):
+        """ETag value, or None while the shelves are not cached"""
+        if catalog.stale():
+            version = catalog.observe(await session.get(CatalogState, 1))
+        else:
+            version = catalog.current()
+        values = [version]
+        if shelf_token:
+            token = shelves.cache_token()
+            if token is None:
+                return None
+            values.append(token)
+        return catalog.make_etag(values)
+
+    async def _conditional(self, session, handler, shelf_token):
+        if '_flashes' in flask_session:
+            return await handler(session)
+        etag = await self._etag(session, shelf_token)
+        if etag is not None and catalog.not_modified(etag):
+            response = self.flask_app.response_class('', 304)
+            return catalog.set_validators(response, etag, False)
+        response = await handler(session)
+        if response.status_code != 200:
+            return response
+        etag = await self._etag(session, shelf_token)
+        if etag is None:
+            return response
+        return catalog.set_validators(response, etag, False)
+
+    # -- endpoints --------------------------------------------------------------------
+
+    async def _search(self, session, q, genre, limit):
+        if self.fts is None:
+            self.fts = await self._in_thread(search.fts_enabled)
+        statement, ranked = search.search_statement(q, genre, limit, self.fts)
+        if not ranked:
+            return list((await session.scalars(statement)).all())
+        ids = (await session.scalars(statement)).all()
+        if not ids:
+            return []
+        return search.movies_by_id(ids, (await session.scalars(select(Movie).where(Movie.id.in_(ids)))).all())
+
+    async def api_search(self, session):
+        """/api/search, as app.routes.main.api_search"""
+        q = request.args.get('q', '').strip()
+        genre = request.args.get('genre', '').strip()
+        limit = request.args.get('limit', 20, type=int)
+        mode = request.args.get('mode', '').strip()
+
+        if mode == 'suggest':
+            # Typeahead: answered from the in-memory index, no SQL
+            index = autocomplete.loaded_index() or await self._in_thread(autocomplete.get_index)
+            suggestions, movies = index.suggest(q, limit=min(limit, 10), genre=genre)
+            return jsonify({
+                'movies': [movie_json(m) for m in movies],
+                'count': len(movies),
+                'suggestions': suggestions,
+                'popular_genres': index.popular_genres()
+            })
+
+        sort = request.args.get('sort', '').strip()
+        if q:
+            movies = await self._search(session, q, genre, limit)
+            if sort == 'community':
+                movies.sort(key=lambda m: m.community_rating or 0, reverse=True)
+        else:
+            statement = catalog_statement(genre, sort).order_by(Movie.created_at.desc()).limit(limit)
+            movies = (await session.scalars(statement)).all()
+        popular_genres = (await session.scalars(POPULAR_GENRES)).all()
+
+        return jsonify({
+            'movies': [movie_json(m) for m in movies],
+            'count': len(movies),
+            'popular_genres': popular_genres
+        })
+
+    async def api_movies(self, session):
+        """/api/movies, as app.routes.main.api_movies"""
+        genre = request.args.get('genre', '').strip()
+        cursor = request.args.get('cursor', '').strip() or None
+        per_page = request.args.get('per_page', 24, type=int)
+
+        query = select(Movie)
+        if genre:
+            query = query.where(has_genre(genre))
+        try:
+            statement = keyset_query(query, Movie.created_at, Movie.id, cursor, per_page)
+        except InvalidCursor:
+            abort(400)
+        rows = (await session.scalars(statement)).all()
+        movies, next_cursor = keyset_rows(rows, Movie.created_at, Movie.id, per_page)
+
+        return jsonify({
+            'movies': [grid_movie_json(m) for m in movies],
+            'next_cursor': next_cursor
+        })
+
+    async def api_shelves(self, session):
+        """/api/shelves, as app.routes.main.api_shelves"""
+        if shelves.cache_token() is None:
+            global_shelves = await self._in_thread(shelves.get_global_shelves)
+        else:
+            global_shelves = shelves.get_global_shelves()
+        return jsonify(shelves_json(global_shelves))
+
+
+def create_asgi_app(flask_app=None):
+    """The ASGI application, sharing flask_app (default: a new create_app())"""
+    return AsyncCatalogAPI(flask_app or create_app())
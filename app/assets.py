@@ -0,0 +1,168 @@
+"""Fingerprinted, precompressed static assets
+
+`flask assets build` copies every file under static/ (except user uploads)
+to static/dist/ with a content hash in its name, writes .gz / .br
+variants of the text assets, and records the mapping in
+static/dist/manifest.json.  When that manifest exists:
+
+- url_for('static', filename='style.css') returns /static/dist/style.<hash>.css
+- hashed files are served with a one-year immutable Cache-Control and the
+  smallest precompressed variant the client's Accept-Encoding allows
+
+Without a manifest (a fresh checkout) nothing changes, so the build step
+is only needed for deployments.  Re-run it after editing static files and
+restart the app; files from earlier builds are kept so pages rendered
+before the deploy still find their assets.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import AppGroup
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are still built
+    brotli = None
+
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Runtime content, already content-hashed by app.images
+SKIP_DIRS = {DIST_DIR, 'uploads', 'posters'}
+COMPRESSIBLE = {'.css', '.js', '.mjs', '.svg', '.json', '.txt', '.html', '.xml', '.map', '.ico'}
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))  # preferred first
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+_CONTENT_HASHED = re.compile(r'^(posters|uploads)/[0-9a-f]{16}(-\d+w)?\.\w+$')
+
+
+# -- build -------------------------------------------------------------------
+
+def _hashed_name(rel_path, digest):
+    stem, ext = os.path.splitext(rel_path)
+    return f"{stem}.{digest[:12]}{ext}"
+
+
+def _compress(data, encoding):
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    return brotli.compress(data, quality=11)
+
+
+def build(static_folder):
+    """Fingerprint and precompress static_folder into static_folder/dist; returns the manifest"""
+    dist = os.path.join(static_folder, DIST_DIR)
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        rel_root = os.path.relpath(root, static_folder)
+        if rel_root == '.':
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for name in sorted(files):
+            src = os.path.join(root, name)
+            rel_path = os.path.normpath(os.path.join(rel_root, name)).replace(os.sep, '/')
+            with open(src, 'rb') as f:
+                data = f.read()
+            hashed = _hashed_name(rel_path, hashlib.sha256(data).hexdigest())
+            out = os.path.join(dist, hashed)
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+            shutil.copyfile(src, out)
+
+            encodings = []
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE:
+                for encoding, suffix in ENCODINGS:
+                    if encoding == 'br' and brotli is None:
+                        continue
+                    packed = _compress(data, encoding)
+                    if len(packed) < len(data) * 0.9:  # not worth it otherwise
+                        with open(out + suffix, 'wb') as f:
+                            f.write(packed)
+                        encodings.append(encoding)
+            manifest[rel_path] = {'file': f"{DIST_DIR}/{hashed}", 'encodings': encodings}
+
+    os.makedirs(dist, exist_ok=True)
+    path = os.path.join(dist, MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+    return manifest
+
+
+# -- runtime -----------------------------------------------------------------
+
+def load_manifest(app):
+    """Read static/dist/manifest.json into app.extensions (empty if not built)"""
+    path = os.path.join(app.static_folder, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    state = {
+        'urls': {name: entry['file'] for name, entry in manifest.items()},
+        'encodings': {entry['file']: entry['encodings'] for entry in manifest.values()},
+    }
+    app.extensions['static_manifest'] = state
+    return state
+
+
+def init_app(app):
+    """Rewrite url_for('static') to hashed names and serve them with long-lived caching"""
+    load_manifest(app)
+
+    @app.url_defaults
+    def _fingerprint(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            hashed = app.extensions['static_manifest']['urls'].get(values['filename'])
+            if hashed:
+                values['filename'] = hashed
+
+    app.view_functions['static'] = serve_static
+
+
+def serve_static(filename):
+    """Flask's static view, plus immutable caching and precompressed variants"""
+    app = current_app
+    encodings = app.extensions['static_manifest']['encodings'].get(filename)
+    if encodings is None:
+        response = app.send_static_file(filename)
+        if _CONTENT_HASHED.match(filename):
+            response.headers['Cache-Control'] = IMMUTABLE
+        return response
+
+    accepted = request.accept_encodings
+    for encoding, suffix in ENCODINGS:
+        if encoding in encodings and accepted[encoding]:
+            response = send_from_directory(
+                app.static_folder, filename + suffix,
+                mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                max_age=None
+            )
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(app.static_folder, filename, max_age=None)
+    if encodings:
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response
+
+
+assets_cli = AppGroup('assets', help='Static asset build.')
+
+
+@assets_cli.command('build')
+def build_command():
+    """Fingerprint static files and write gzip/brotli variants to static/dist."""
+    manifest = build(current_app.static_folder)
+    compressed = sum(1 for entry in manifest.values() if entry['encodings'])
+    click.echo(f"✅ Built {len(manifest)} static assets ({compressed} precompressed) into static/{DIST_DIR}")
+    if brotli is None:
+        click.echo("brotli is not installed; only gzip variants were written")
+    load_manifest(current_app)
@@ -0,0 +1,301 @@
+"""Process-local, typo-tolerant autocomplete over movie titles, genres and tags
+
+The index is a character trie kept in memory.  Lookups walk it with a
+Levenshtein row per node, so a misspelt prefix such as "intersteler" still
+reaches "Interstellar" without touching the database.  The admin movie
+routes keep it current with update_movie()/remove_movie().
+"""
+import gc
+import re
+import threading
+import unicodedata
+from collections import namedtuple, deque
+from itertools import islice
+from flask import current_app
+from app import db
+from app.models import Movie
+
+
+# Light-weight copy of the Movie fields the search dropdown renders
+MovieSnapshot = namedtuple(
+    'MovieSnapshot', 'id title genre poster_url poster_path poster_widths imdb_rating description'
+)
+
+# Movie columns update_movie() reads
+INDEX_COLUMNS = ('id', 'title', 'genre', 'tags', 'poster_url', 'poster_path', 'poster_widths',
+                 'imdb_rating', 'description')
+
+KIND_RANK = {'title': 0, 'genre': 1, 'tag': 2}
+MIN_QUERY_LENGTH = 2
+
+_WORD_RE = re.compile(r'[^\w\s]+', re.UNICODE)
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(_WORD_RE.sub(' ', text.lower()).split())
+
+
+def max_edits_for(query: str) -> int:
+    """Allowed typos grow with the query length"""
+    if len(query) < 4:
+        return 0
+    if len(query) < 8:
+        return 1
+    return 2
+
+
+def split_terms(value: str, seps=r'[/,|]'):
+    return [t.strip() for t in re.split(seps, value or '') if t.strip()]
+
+
+class _Node:
+    __slots__ = ('children', 'entries')
+
+    def __init__(self):
+        self.children = {}
+        self.entries = None  # {kind: [display, set(movie_ids)]} on terminal nodes
+
+
+class AutocompleteIndex:
+    """Trie of normalized terms -> movies, safe to share between request threads"""
+
+    def __init__(self):
+        self._root = _Node()
+        self._movies = {}       # movie_id -> MovieSnapshot
+        self._movie_terms = {}  # movie_id -> [(key, kind)] for incremental removal
+        self._genre_counts = {}  # display genre -> number of movies
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._movies)
+
+    # -- building -------------------------------------------------------
+
+    @staticmethod
+    def _terms_for(movie):
+        """(key, kind, display) triples a movie contributes to the index"""
+        terms = []
+        title_key = normalize(movie.title)
+        if title_key:
+            # Index every word suffix so "knight" finds "The Dark Knight"
+            words = title_key.split()
+            for i in range(len(words)):
+                terms.append((' '.join(words[i:]), 'title', movie.title))
+        for g in split_terms(movie.genre):
+            terms.append((normalize(g), 'genre', g))
+        for t in split_terms(movie.tags, r','):
+            terms.append((normalize(t), 'tag', t))
+        return [t for t in terms if t[0]]
+
+    def _insert(self, key, kind, display, movie_id):
+        node = self._root
+        for ch in key:
+            child = node.children.get(ch)
+            if child is None:
+                child = node.children[ch] = _Node()
+            node = child
+        if node.entries is None:
+            node.entries = {}
+        entry = node.entries.setdefault(kind, [display, set()])
+        entry[1].add(movie_id)
+
+    def _discard(self, key, kind, movie_id):
+        path = [self._root]
+        for ch in key:
+            nxt = path[-1].children.get(ch)
+            if nxt is None:
+                return
+            path.append(nxt)
+        node = path[-1]
+        if not node.entries or kind not in node.entries:
+            return
+        node.entries[kind][1].discard(movie_id)
+        if not node.entries[kind][1]:
+            del node.entries[kind]
+        if not node.entries:
+            node.entries = None
+        # Prune now-empty branches
+        for depth in range(len(key), 0, -1):
+            child = path[depth]
+            if child.children or child.entries:
+                break
+            del path[depth - 1].children[key[depth - 1]]
+
+    def update_movie(self, movie):
+        """Insert a movie, replacing whatever it contributed before"""
+        with self._lock:
+            self._remove(movie.id)
+            terms = self._terms_for(movie)
+            for key, kind, display in terms:
+                self._insert(key, kind, display, movie.id)
+            self._movie_terms[movie.id] = [(key, kind) for key, kind, _ in terms]
+            for g in split_terms(movie.genre):
+                self._genre_counts[g] = self._genre_counts.get(g, 0) + 1
+            self._movies[movie.id] = MovieSnapshot(
+                movie.id, movie.title, movie.genre, movie.poster_url,
+                movie.poster_path, movie.poster_widths,
+                movie.imdb_rating, movie.description or ''
+            )
+
+    def _remove(self, movie_id):
+        for key, kind in self._movie_terms.pop(movie_id, []):
+            self._discard(key, kind, movie_id)
+        snapshot = self._movies.pop(movie_id, None)
+        if snapshot is not None:
+            for g in split_terms(snapshot.genre):
+                self._genre_counts[g] -= 1
+                if not self._genre_counts[g]:
+                    del self._genre_counts[g]
+
+    def remove_movie(self, movie_id):
+        with self._lock:
+            self._remove(movie_id)
+
+    # -- lookup ---------------------------------------------------------
+
+    def _collect(self, node, dist, found, cap):
+        """Breadth-first gather of terminal nodes below node (shortest completions first)"""
+        queue = deque([node])
+        seen = 0
+        while queue and seen < cap:
+            current = queue.popleft()
+            if current.entries:
+                seen += 1
+                if found.get(id(current), (dist + 1,))[0] > dist:
+                    found[id(current)] = (dist, current)
+            queue.extend(current.children.values())
+
+    def _fuzzy(self, query, max_edits, cap):
+        """Terminal nodes whose term has a prefix within max_edits of query
+
+        Typos in the first letters are rare, so the first max(1, max_edits)
+        characters must match exactly; that keeps the walk small.
+        """
+        found = {}
+        anchor = max(1, max_edits)
+        stack = [(self._root, 0, list(range(len(query) + 1)), None)]
+        while stack:
+            parent, depth, prev, best = stack.pop()
+            if depth < anchor:
+                ch = query[depth]
+                children = [(ch, parent.children[ch])] if ch in parent.children else []
+            else:
+                children = parent.children.items()
+            for ch, node in children:
+                row = [prev[0] + 1]
+                for i in range(1, len(query) + 1):
+                    cost = 0 if query[i - 1] == ch else 1
+                    row.append(min(row[i - 1] + 1, prev[i] + 1, prev[i - 1] + cost))
+                node_best = best
+                if row[-1] <= max_edits and (node_best is None or row[-1] < node_best):
+                    node_best = row[-1]
+                if min(row) <= max_edits:
+                    if node_best is not None and node.entries:
+                        if found.get(id(node), (node_best + 1,))[0] > node_best:
+                            found[id(node)] = (node_best, node)
+                    stack.append((node, depth + 1, row, node_best))
+                elif node_best is not None:
+                    # Edits are exhausted below here; everything beneath is a completion
+                    self._collect(node, node_best, found, cap)
+        return found.values()
+
+    def suggest(self, q: str, limit: int = 8, genre: str = ''):
+        """Return (suggestions, movies) for a search-box prefix"""
+        query = normalize(q)
+        if len(query) < MIN_QUERY_LENGTH:
+            return [], []
+        genre_key = normalize(genre)
+        with self._lock:
+            matches = self._fuzzy(query, max_edits_for(query), cap=limit * 8)
+            ranked = []
+            for dist, node in matches:
+                for kind, (display, ids) in node.entries.items():
+                    if kind == 'title':
+                        popularity = max((self._movies[i].imdb_rating or 0) for i in ids)
+                    else:
+                        popularity = len(ids)
+                    ranked.append((dist, KIND_RANK[kind], -popularity, len(display), display, kind, ids))
+            ranked.sort(key=lambda r: r[:5])
+
+            suggestions, seen_terms = [], set()
+            movie_ids, seen_movies = [], set()
+            for dist, _, _, _, display, kind, ids in ranked:
+                if (kind, display) not in seen_terms and len(suggestions) < limit:
+                    seen_terms.add((kind, display))
+                    suggestions.append({'text': display, 'type': kind, 'distance': dist})
+                # Broad genre/tag terms can cover most of the catalog; rank a sample
+                ordered = sorted(islice(ids, limit * 25), key=lambda i: -(self._movies[i].imdb_rating or 0))
+                for movie_id in ordered:
+                    if movie_id in seen_movies:
+                        continue
+                    snapshot = self._movies[movie_id]
+                    if genre_key and genre_key not in normalize(snapshot.genre):
+                        continue
+                    seen_movies.add(movie_id)
+                    movie_ids.append(movie_id)
+                if len(suggestions) >= limit and len(movie_ids) >= limit:
+                    break
+            movies = [self._movies[i] for i in movie_ids[:limit]]
+        return suggestions, movies
+
+    def popular_genres(self, limit: int = 8):
+        """Most common genres, straight from the in-memory index"""
+        with self._lock:
+            counts = list(self._genre_counts.items())
+        return [g for g, _ in sorted(counts, key=lambda kv: -kv[1])[:limit]]
+
+
+def build_index(movies):
+    """Bulk-build an index; GC is paused since the trie only allocates"""
+    index = AutocompleteIndex()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for movie in movies:
+            index.update_movie(movie)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return index
+
+
+def get_index():
+    """The app's autocomplete index, built from the catalog on first use"""
+    state = current_app.extensions.setdefault('autocomplete', {'index': None, 'lock': threading.Lock()})
+    if state['index'] is None:
+        with state['lock']:
+            if state['index'] is None:
+                # Plain rows with just the indexed columns: far cheaper than ORM objects
+                rows = db.session.execute(db.select(*(getattr(Movie, c) for c in INDEX_COLUMNS))).all()
+                state['index'] = build_index(rows)
+    return state['index']
+
+
+def reset():
+    """Throw the index away; the next get_index() rebuilds it from the database"""
+    state = current_app.extensions.get('autocomplete')
+    if state:
+        state['index'] = None
+
+
+def loaded_index():
+    """The index if it has been built, else None (never touches the database)"""
+    state = current_app.extensions.get('autocomplete')
+    return state['index'] if state else None
+
+
+def update_movie(movie):
+    """Refresh one movie in the index, if the index has been built"""
+    index = loaded_index()
+    if index is not None:
+        index.update_movie(movie)
+
+
+def remove_movie(movie_id):
+    """Drop one movie from the index, if the index has been built"""
+    index = loaded_index()
+    if index is not None:
+        index.remove_movie(movie_id)
@@ -0,0 +1,216 @@
+"""Catalog version counter and conditional (304 Not Modified) responses
+
+CatalogState.version is bumped after every change to what the catalog
+pages show: the admin movie routes, imports, new reviews and finished
+poster renditions call bump() once they have committed.  Changes to the
+movies themselves (admin edits, imports) also bump content_version; reviews
+and renditions pass content=False.  Each process keeps the versions in
+memory and re-reads them at most every CATALOG_VERSION_TTL seconds.  When
+another process has bumped version, the local shelf cache is dropped; when
+it bumped content_version, the autocomplete index and the content
+recommender are dropped too, so they are only rebuilt after a movie really
+changed.
+
+The collaborative-filtering job bumps collab_version instead (bump_collab()):
+other processes then drop their cached rails and personal shelves only, and
+just the pages showing those rails put collab_version() in their ETag.
+
+@conditional() turns the version (plus anything a view adds, such as the
+shelf cache token or who is logged in) into a weak ETag and answers a
+matching If-None-Match with a 304 before the view runs any query or
+template.  There is no Last-Modified: HTTP dates have one-second
+precision, so two changes within a second would look like none, and a
+date cannot follow the other parts of the ETag anyway.
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from flask import current_app, request, session, make_response
+from flask.globals import request_ctx
+from flask_login import current_user
+from app import db
+from app.models import CatalogState
+
+
+def _state():
+    return current_app.extensions.setdefault('catalog', {
+        'version': None, 'content_version': None, 'collab_version': None, 'checked_at': 0.0,
+        'lock': threading.Lock(),
+    })
+
+
+def _drop_local_caches(content):
+    from app import autocomplete, collab, recommend, shelves
+    shelves.invalidate()
+    collab.reset()
+    if content:
+        autocomplete.reset()
+        recommend.reset()
+
+
+def stale():
+    """Whether current() would re-read the version from the database"""
+    state = _state()
+    ttl = current_app.config.get('CATALOG_VERSION_TTL', 2)
+    return state['version'] is None or time.monotonic() - state['checked_at'] >= ttl
+
+
+def _drop_collab_caches():
+    from app import collab, shelves
+    collab.reset()
+    shelves.invalidate_users()
+
+
+def _observe(state, row):
+    version, content_version, collab_version = (
+        (row.version, row.content_version, row.collab_version) if row else (0, 0, 0)
+    )
+    if state['version'] is not None:
+        # Changed by another process: our caches are stale too
+        if version != state['version']:
+            _drop_local_caches(content=content_version != state['content_version'])
+        if collab_version != state['collab_version']:
+            _drop_collab_caches()
+    state.update(version=version, content_version=content_version, collab_version=collab_version,
+                 checked_at=time.monotonic())
+
+
+def observe(row):
+    """Record a CatalogState row (or None) read elsewhere, e.g. by the async read path"""
+    state = _state()
+    with state['lock']:
+        _observe(state, row)
+    return state['version']
+
+
+def current():
+    """Version of the catalog as this process knows it"""
+    state = _state()
+    if stale():
+        with state['lock']:
+            if stale():
+                _observe(state, db.session.get(CatalogState, 1))
+    return state['version']
+
+
+def bump(content=True):
+    """Record that the catalog changed (call after committing the change)
+
+    content=False for changes that leave the movies' own details alone (new
+    reviews, poster renditions): ETags and shelves change, but other
+    processes keep their autocomplete index and content recommender.
+    """
+    now = datetime.utcnow()
+    values = {CatalogState.version: CatalogState.version + 1, CatalogState.updated_at: now}
+    if content:
+        values[CatalogState.content_version] = CatalogState.content_version + 1
+    updated = CatalogState.query.filter_by(id=1).update(values, synchronize_session=False)
+    if not updated:
+        db.session.add(CatalogState(id=1, version=1, content_version=int(content), updated_at=now))
+    db.session.commit()
+    row = db.session.get(CatalogState, 1, populate_existing=True)
+
+    state = _state()
+    with state['lock']:
+        if state['version'] is not None:
+            # Our own change: the caller has updated this process's caches
+            state['version'] += 1
+            state['content_version'] += int(content)
+        _observe(state, row)  # drops them only if someone else bumped in between
+    return row.version
+
+
+def bump_collab():
+    """Record that the collaborative-filtering rails changed (after committing them)
+
+    Leaves the catalog version, and with it every other ETag and cache, alone.
+    """
+    updated = CatalogState.query.filter_by(id=1).update(
+        {CatalogState.collab_version: CatalogState.collab_version + 1}, synchronize_session=False
+    )
+    if not updated:
+        db.session.add(CatalogState(id=1, version=0, collab_version=1))
+    db.session.commit()
+    _drop_collab_caches()
+    row = db.session.get(CatalogState, 1, populate_existing=True)
+    state = _state()
+    with state['lock']:
+        if state['version'] is not None:
+            state['collab_version'] = row.collab_version  # our own ETags change now, not after the TTL
+    return row.collab_version
+
+
+def collab_version():
+    """Version of the collaborative-filtering rails; part of the ETag of pages showing them"""
+    current()
+    return _state()['collab_version']
+
+
+def _etag(parts, personal):
+    """Weak ETag value, or None when a part is unknown
+
+    personal is True when the response depends on the logged-in user.
+    """
+    values = [current()]
+    for part in parts:
+        value = part()
+        if value is None:
+            return None
+        values.append(value)
+    if personal:
+        # Covers the navbar (name, avatar, admin links) and anything user-specific
+        values.append(tuple(current_user))
+    return make_etag(values)
+
+
+def make_etag(values):
+    """Weak ETag value for [catalog version, *what else the response depends on]"""
+    digest = hashlib.blake2b(repr(values).encode(), digest_size=8).hexdigest()
+    return f"{values[0]}-{digest}"
+
+
+def not_modified(etag):
+    """Whether the request's If-None-Match still matches"""
+    return bool(request.if_none_match) and request.if_none_match.contains_weak(etag)
+
+
+def set_validators(response, etag, personal):
+    """ETag and Cache-Control of a conditional response"""
+    response.set_etag(etag, weak=True)
+    # Always revalidate; private when the page depends on the visitor
+    response.headers['Cache-Control'] = 'private, no-cache' if personal else 'no-cache'
+    response.vary.add('Cookie')
+    return response
+
+
+def conditional(*parts, personal=False):
+    """Serve 304s for unchanged catalog pages
+
+    parts are callables whose results join the catalog version in the ETag
+    (return None when the value is not known yet, e.g. a cold cache);
+    personal=True also keys the ETag on the logged-in user.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            # Pending flash messages are rendered into the page, so never 304 them
+            if request.method not in ('GET', 'HEAD') or '_flashes' in session:
+                return view(*args, **kwargs)
+
+            personal_now = personal and current_user.is_authenticated
+            etag = _etag(parts, personal_now)
+            if etag is not None and not_modified(etag):
+                return set_validators(make_response('', 304), etag, personal_now)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or getattr(request_ctx, 'flashes', None):
+                return response
+            # Recomputed: the view may just have warmed a cache that is part of the tag
+            etag = _etag(parts, personal_now)
+            if etag is None:
+                return response
+            return set_validators(response, etag, personal_now)
+        return wrapped
+    return decorator
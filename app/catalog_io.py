@@ -0,0 +1,445 @@
+"""Bulk catalog import / export (`flask catalog import|export`)
+
+Feeds are CSV (with a header row) or JSON Lines, optionally gzipped, and are
+streamed row by row, so their size only costs time.  Every row needs an
+external_id; importing the same feed twice updates the movies in place:
+
+    external_id,title,description,genre,tags,language,runtime,age_rating,
+    imdb_rating,release_date,trailer_url,poster_url,poster
+
+Empty or missing values never overwrite what is stored, so a partial feed
+only touches the fields it carries.  `poster` is an image to store locally: an http(s) URL is
+downloaded, anything else is a file path (relative to --poster-dir).  Posters
+are fetched and resized by a thread pool while the rows keep loading.
+
+Rows are written in batches (one executemany and one transaction per batch)
+and the search index, autocomplete, recommender and shelves are rebuilt once
+at the end.
+Export writes the same columns, so an export can be re-imported; movies added
+through the admin form are exported as "streamverse-<id>".  Importing with
+match_local_ids (--match-local-ids) matches those back to the movie with that
+row id; only do that with an export of the same database, since elsewhere
+the same row id is an unrelated movie.  Without it they are imported as new
+movies with that external_id.
+"""
+import contextlib
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+import click
+import requests
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import insert, update, select
+from app import db
+from app.models import Movie
+
+
+FIELDS = (
+    'external_id', 'title', 'description', 'genre', 'tags', 'language', 'runtime', 'age_rating',
+    'imdb_rating', 'release_date', 'trailer_url', 'poster_url', 'poster',
+)
+TEXT_FIELDS = ('title', 'description', 'genre', 'tags', 'language', 'age_rating', 'release_date',
+               'trailer_url', 'poster_url')
+
+LOCAL_ID_PREFIX = 'streamverse-'   # export name of movies without an external id
+LOOKUP_CHUNK = 500                 # ids per IN (...) lookup, well under SQLite's variable limit
+POSTER_MAX_BYTES = 20 * 1024 * 1024
+POSTER_TIMEOUT = (5, 30)           # connect, read (seconds)
+
+
+class RowError(ValueError):
+    """A feed row that cannot be imported (reported and skipped)"""
+
+
+# -- reading / writing feeds --------------------------------------------------
+
+def _format(path, fmt):
+    if fmt:
+        return fmt
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'jsonl' if name.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def _open(path, mode):
+    if path == '-':
+        if mode == 'r':
+            return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+        return contextlib.nullcontext(sys.stdout)  # leave stdout open
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', newline='')
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, dict) for every record in a CSV or JSONL stream"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, RowError(f'invalid JSON: {e}')
+            continue
+        yield line_no, row if isinstance(row, dict) else RowError('not a JSON object')
+
+
+def _text(value):
+    if isinstance(value, (list, tuple)):
+        value = ', '.join(str(v).strip() for v in value if str(v).strip())
+    value = '' if value is None else str(value).strip()
+    return value or None
+
+
+def movie_values(row):
+    """Column values for one feed row (only the fields the row carries)"""
+    external_id = _text(row.get('external_id'))
+    if not external_id:
+        raise RowError('missing external_id')
+    values = {'external_id': external_id[:100]}
+    for field in TEXT_FIELDS:
+        if field in row:
+            values[field] = _text(row[field])
+    if 'runtime' in row:
+        runtime = _text(row['runtime'])
+        try:
+            values['runtime'] = int(float(runtime)) if runtime else None
+        except ValueError:
+            raise RowError(f'bad runtime {runtime!r}')
+    if 'imdb_rating' in row:
+        rating = _text(row['imdb_rating'])
+        try:
+            values['imdb_rating'] = float(rating) if rating else None
+        except ValueError:
+            raise RowError(f'bad imdb_rating {rating!r}')
+        if values['imdb_rating'] is not None and not 0 <= values['imdb_rating'] <= 10:
+            raise RowError(f'imdb_rating {rating} out of range')
+    return values
+
+
+def export_rows(chunk_size=2000):
+    """Yield every movie as a feed dict, walking the table by id"""
+    columns = [getattr(Movie, f) for f in FIELDS if f != 'poster'] + [Movie.id, Movie.poster_path]
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(*columns).where(Movie.id > last_id).order_by(Movie.id).limit(chunk_size)
+        ).mappings().all()
+        if not rows:
+            return
+        for row in rows:
+            record = {f: row[f] for f in FIELDS if f != 'poster'}
+            record['external_id'] = row['external_id'] or f"{LOCAL_ID_PREFIX}{row['id']}"
+            record['poster'] = row['poster_path']
+            yield record
+        last_id = rows[-1]['id']
+        db.session.rollback()  # end the read transaction between chunks
+
+
+# -- posters ------------------------------------------------------------------
+
+_http = threading.local()
+
+
+def _download(url):
+    if not hasattr(_http, 'session'):
+        _http.session = requests.Session()
+    with _http.session.get(url, timeout=POSTER_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        data = bytearray()
+        for chunk in response.iter_content(64 * 1024):
+            data += chunk
+            if len(data) > POSTER_MAX_BYTES:
+                raise ValueError('poster larger than 20 MB')
+    return bytes(data)
+
+
+def fetch_poster(source, base_dir, folder):
+    """Download or copy one poster into folder and render it; returns (poster_path, widths)"""
+    from app import images
+    if source.startswith(('http://', 'https://')):
+        data = _download(source)
+        name = os.path.basename(urlsplit(source).path)
+    else:
+        path = source if os.path.isabs(source) else os.path.join(base_dir, source)
+        with open(path, 'rb') as f:
+            data = f.read()
+        name = os.path.basename(path)
+    if os.path.splitext(name)[1].lower() not in ('.jpg', '.jpeg', '.png', '.webp', '.gif'):
+        name = 'poster.jpg'
+    filename = images.save_bytes(data, name, folder)
+
+    # Same bytes as an earlier import: the renditions are already there
+    widths = [w for w in images.POSTER_WIDTHS
+              if os.path.exists(os.path.join(folder, images.rendition_name(filename, w, 'webp')))]
+    if not widths:
+        widths = images.render(os.path.join(folder, filename), images.POSTER_WIDTHS)
+    return f"{os.path.basename(folder)}/{filename}", widths
+
+
+# -- import -------------------------------------------------------------------
+
+def _lookup_ids(external_ids, match_local_ids=False):
+    """external_id -> movie id for the ids already in the catalog"""
+    found = {}
+    external_ids = list(external_ids)
+    for start in range(0, len(external_ids), LOOKUP_CHUNK):
+        chunk = external_ids[start:start + LOOKUP_CHUNK]
+        found.update(db.session.execute(
+            select(Movie.external_id, Movie.id).where(Movie.external_id.in_(chunk))
+        ).all())
+
+    if not match_local_ids:
+        return found
+
+    # Our own exports name movies without an external id after their row id
+    local = {}
+    for external_id in external_ids:
+        suffix = external_id[len(LOCAL_ID_PREFIX):]
+        if external_id not in found and external_id.startswith(LOCAL_ID_PREFIX) and suffix.isdigit():
+            local[int(suffix)] = external_id
+    if local:
+        for movie_id, in db.session.execute(
+            select(Movie.id).where(Movie.id.in_(list(local)), Movie.external_id.is_(None))
+        ):
+            found[local[movie_id]] = movie_id
+    return found
+
+
+def _grouped(rows):
+    """Split dicts into lists with identical keys (one executemany each)"""
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    return groups.values()
+
+
+class Importer:
+    """Streams feed rows into the movie table; see import_catalog()"""
+
+    def __init__(self, batch_size=1000, poster_workers=8, poster_dir=None, posters=True, progress=None,
+                 match_local_ids=False):
+        self.batch_size = batch_size
+        self.match_local_ids = match_local_ids
+        self.posters = posters and poster_workers > 0
+        self.poster_dir = poster_dir or current_app.static_folder
+        self.poster_folder = current_app.config['POSTER_FOLDER']
+        self.pool = ThreadPoolExecutor(max_workers=poster_workers, thread_name_prefix='import-posters') \
+            if self.posters else None
+        self.pending = deque()  # (external_id, source, future), oldest first
+        self.max_pending = max(1, poster_workers) * 64
+        self.progress = progress
+        self.taxonomy_cache = {}
+        self.stats = {'rows': 0, 'inserted': 0, 'updated': 0, 'skipped': 0,
+                      'posters': 0, 'poster_errors': 0, 'errors': []}
+        self.started = time.perf_counter()
+
+    def error(self, where, message):
+        self.stats['errors'].append(f'{where}: {message}')
+
+    def run(self, records):
+        batch = {}
+        for line_no, row in records:
+            self.stats['rows'] += 1
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                values = movie_values(row)
+            except RowError as e:
+                self.stats['skipped'] += 1
+                self.error(f'line {line_no}', e)
+                continue
+            source = _text(row.get('poster'))
+            earlier = batch.get(values['external_id'])
+            if earlier:
+                # Same id twice in a batch: merge as if imported one by one (empty values never overwrite)
+                values = {**earlier[1], **{k: v for k, v in values.items() if v is not None}}
+                source = source or earlier[2]
+            batch[values['external_id']] = (line_no, values, source)
+            if len(batch) >= self.batch_size:
+                self.write(batch)
+                batch = {}
+        if batch:
+            self.write(batch)
+        self.finish_posters()
+        return self.stats
+
+    def write(self, batch):
+        existing = _lookup_ids(batch, self.match_local_ids)
+        inserts, updates, posters = [], [], []
+        now = datetime.utcnow()
+        for external_id, (line_no, values, source) in batch.items():
+            if source:
+                posters.append((external_id, source))
+            if external_id in existing:
+                updates.append({'id': existing[external_id], **{k: v for k, v in values.items() if v is not None}})
+                continue
+            if not values.get('title'):
+                self.stats['skipped'] += 1
+                self.error(f'line {line_no}', 'new movie without a title')
+                continue
+            row = {field: values.get(field) for field in FIELDS if field != 'poster'}
+            row['description'] = row['description'] or ''
+            row['created_at'] = now
+            inserts.append(row)
+
+        if inserts:
+            db.session.execute(insert(Movie), inserts)
+            existing.update(_lookup_ids(row['external_id'] for row in inserts))
+        for group in _grouped(updates):
+            db.session.execute(update(Movie), group)
+
+        # Taxonomy join rows for every movie whose genre/tags/language may have changed
+        touched = [existing[row['external_id']] for row in inserts] + [
+            row['id'] for row in updates if {'genre', 'tags', 'language'} & row.keys()
+        ]
+        if touched:
+            current = {
+                row.id: row for row in db.session.execute(
+                    select(Movie.id, Movie.genre, Movie.tags, Movie.language).where(Movie.id.in_(touched))
+                )
+            }
+            from app.taxonomy import link_movies
+            link_movies([tuple(current[movie_id]) for movie_id in touched if movie_id in current],
+                        self.taxonomy_cache)
+
+        self.apply_posters(block=False)
+        db.session.commit()
+        self.stats['inserted'] += len(inserts)
+        self.stats['updated'] += len(updates)
+
+        for external_id, source in posters:
+            self.submit_poster(external_id, source)
+        self.report()
+
+    # posters run in the pool; finished ones are written with the next batch
+    def submit_poster(self, external_id, source):
+        if not self.posters:
+            return
+        while len(self.pending) >= self.max_pending:
+            self.pending[0][2].result()  # backpressure: wait for the oldest download
+            self.apply_posters(block=False)
+            db.session.commit()
+        future = self.pool.submit(fetch_poster, source, self.poster_dir, self.poster_folder)
+        self.pending.append((external_id, source, future))
+
+    def apply_posters(self, block):
+        done = []
+        while self.pending and (block or self.pending[0][2].done()):
+            external_id, source, future = self.pending.popleft()
+            try:
+                poster_path, widths = future.result()
+            except Exception as e:
+                self.stats['poster_errors'] += 1
+                self.error(f'poster {source}', f'{e.__class__.__name__}: {e}')
+                continue
+            done.append({'eid': external_id, 'path': poster_path, 'widths': ','.join(str(w) for w in widths)})
+        if done:
+            db.session.execute(
+                db.text("UPDATE movie SET poster_path = :path, poster_widths = :widths WHERE external_id = :eid"),
+                done
+            )
+            self.stats['posters'] += len(done)
+
+    def finish_posters(self):
+        if self.pool is None:
+            return
+        while self.pending:
+            self.pending[0][2].result()
+            self.apply_posters(block=False)
+            db.session.commit()
+            self.report()
+        self.pool.shutdown()
+
+    def report(self):
+        if self.progress:
+            elapsed = time.perf_counter() - self.started
+            self.progress(dict(self.stats, seconds=elapsed, pending_posters=len(self.pending)))
+
+
+def import_catalog(records, **options):
+    """Load (line number, row) records; returns counts. Rebuilds search/caches once at the end."""
+    from app import autocomplete, catalog, recommend, search, shelves
+    stats = Importer(**options).run(records)
+    if stats['inserted'] or stats['updated'] or stats['posters']:
+        search.rebuild_search_index()
+        autocomplete.reset()
+        recommend.reset()
+        shelves.invalidate()
+        catalog.bump()
+    return stats
+
+
+# -- CLI ----------------------------------------------------------------------
+
+catalog_cli = AppGroup('catalog', help='Bulk catalog import and export.')
+
+
+def _print_progress(stats):
+    rate = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+    line = (f"{stats['rows']:>9,} rows  {stats['inserted']:,} new  {stats['updated']:,} updated  "
+            f"{stats['skipped']:,} skipped  {rate:,.0f} rows/s")
+    if stats['posters'] or stats['pending_posters'] or stats['poster_errors']:
+        line += f"  posters {stats['posters']:,} done / {stats['pending_posters']:,} pending"
+    click.echo(line, err=True)
+
+
+@catalog_cli.command('import')
+@click.argument('source')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Default: from the file name.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per transaction.')
+@click.option('--poster-workers', default=8, show_default=True, help='Parallel poster downloads/resizes.')
+@click.option('--poster-dir', type=click.Path(file_okay=False), help='Base for relative poster paths (default: static/).')
+@click.option('--no-posters', is_flag=True, help='Ignore the poster column.')
+@click.option('--match-local-ids', is_flag=True,
+              help='Update movies by row id for "streamverse-<id>" rows (an export of this same database).')
+def import_command(source, fmt, batch_size, poster_workers, poster_dir, no_posters, match_local_ids):
+    """Upsert movies from a CSV/JSONL file (or - for stdin) by external_id."""
+    fmt = _format(source, fmt)
+    with _open(source, 'r') as stream:
+        stats = import_catalog(
+            read_rows(stream, fmt), batch_size=batch_size, poster_workers=poster_workers,
+            poster_dir=poster_dir, posters=not no_posters, progress=_print_progress,
+            match_local_ids=match_local_ids,
+        )
+    for message in stats['errors'][:20]:
+        click.echo(f"  {message}", err=True)
+    if len(stats['errors']) > 20:
+        click.echo(f"  ... and {len(stats['errors']) - 20} more", err=True)
+    click.echo(f"✅ Imported {stats['rows']:,} rows: {stats['inserted']:,} new, {stats['updated']:,} updated, "
+               f"{stats['skipped']:,} skipped, {stats['posters']:,} posters ({stats['poster_errors']:,} failed)")
+
+
+@catalog_cli.command('export')
+@click.argument('dest')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Default: from the file name.')
+def export_command(dest, fmt):
+    """Write every movie to a CSV/JSONL file (or - for stdout)."""
+    fmt = _format(dest, fmt)
+    count = 0
+    with _open(dest, 'w') as stream:
+        writer = csv.DictWriter(stream, fieldnames=FIELDS) if fmt == 'csv' else None
+        if writer:
+            writer.writeheader()
+        for record in export_rows():
+            if writer:
+                writer.writerow(record)
+            else:
+                stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+            count += 1
+    click.echo(f"✅ Exported {count:,} movies", err=dest == '-')
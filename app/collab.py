@@ -0,0 +1,413 @@
+"""Offline collaborative filtering over watchlists and reviews
+
+`flask collab refresh` (run it from cron, or keep `flask collab run` going)
+builds a sparse user x movie matrix of implicit feedback and factorizes it
+with truncated SVD or implicit ALS:
+
+    watchlist entry             WATCHLIST_WEIGHT
+    review with rating r        REVIEW_WEIGHT * r / 10
+
+From the factors it stores compact top-K tables that requests only read:
+
+    movie_neighbor   per movie, the movies most often saved alongside it
+                     ("Viewers also saved" on the detail page)
+    user_pick        per user, unseen movies their neighbours liked
+                     (first in "Top Picks for You", before content picks)
+
+The movie factors are kept in COLLAB_MODEL_PATH.  A refresh without --full
+only folds in users who added watchlist entries or reviews since the last
+run (projecting them onto the saved factors), which takes seconds; it falls
+back to a full factorization when there is no model yet or the new
+interactions exceed COLLAB_FULL_REFRESH_RATIO of the old ones.  Removals
+and brand-new movies are picked up by the next full run.
+"""
+import os
+import time
+from datetime import datetime
+import click
+import numpy as np
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func, select
+from app import db
+from app.cache import TTLCache
+from app.models import CollabState, Movie, MovieNeighbor, Review, UserPick, Watchlist
+
+
+WATCHLIST_WEIGHT = 1.0
+REVIEW_WEIGHT = 2.0     # a 10/10 review counts twice a watchlist save
+ALS_ALPHA = 10.0        # confidence = 1 + alpha * weight
+ALS_REGULARIZATION = 0.1
+ALS_ITERATIONS = 10
+MIN_SUPPORT = 3         # a neighbour must have been saved/reviewed by this many users
+SHRINKAGE = 10.0        # damp similarities of thinly supported neighbours: n / (n + SHRINKAGE)
+SCORE_BUDGET = 16_000_000  # floats per scoring block (~64 MB)
+WRITE_CHUNK = 5000      # rows per executemany
+
+
+# -- interactions -------------------------------------------------------------
+
+def _interactions(user_ids=None):
+    """(user_id, movie_id, weight) arrays from watchlists and reviews (optionally for some users)"""
+    watch = select(Watchlist.user_id, Watchlist.movie_id)
+    reviews = select(Review.user_id, Review.movie_id, Review.rating)
+    if user_ids is not None:
+        watch = watch.where(Watchlist.user_id.in_(user_ids))
+        reviews = reviews.where(Review.user_id.in_(user_ids))
+    rows = [(u, m, WATCHLIST_WEIGHT) for u, m in db.session.execute(watch)]
+    rows += [(u, m, REVIEW_WEIGHT * (r or 0) / 10) for u, m, r in db.session.execute(reviews)]
+    if not rows:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.float32)
+    users, movies, weights = zip(*rows)
+    return np.array(users), np.array(movies), np.array(weights, dtype=np.float32)
+
+
+def _matrix(users, movies, weights, user_index=None, movie_index=None):
+    """CSR matrix plus the user/movie id arrays its rows/columns stand for"""
+    from scipy import sparse  # SciPy is only needed by the job, not by the read path
+    user_ids = np.unique(users) if user_index is None else user_index
+    movie_ids = np.unique(movies) if movie_index is None else movie_index
+    rows = np.searchsorted(user_ids, users)
+    cols = np.searchsorted(movie_ids, movies)
+    known = (cols < len(movie_ids)) & (movie_ids[np.minimum(cols, len(movie_ids) - 1)] == movies)
+    matrix = sparse.coo_matrix(
+        (weights[known], (rows[known], cols[known])), shape=(len(user_ids), len(movie_ids))
+    ).tocsr()
+    matrix.sum_duplicates()  # a movie both saved and reviewed adds up
+    return matrix, user_ids, movie_ids
+
+
+# -- factorization -----------------------------------------------------------
+
+def _log_scaled(matrix):
+    scaled = matrix.astype(np.float64)
+    scaled.data = np.log1p(scaled.data)
+    return scaled
+
+
+def factorize_svd(matrix, factors):
+    """Truncated SVD of log-scaled feedback: (U * sqrt(S), V * sqrt(S))"""
+    from scipy.sparse.linalg import svds
+    k = max(1, min(factors, min(matrix.shape) - 1))
+    u, s, vt = svds(_log_scaled(matrix), k=k)
+    root = np.sqrt(s)
+    return (u * root).astype(np.float32), (vt.T * root).astype(np.float32)
+
+
+def _als_step(fixed, matrix, regularization):
+    """Solve every row of matrix against the fixed factors (implicit ALS, Hu et al. 2008)"""
+    k = fixed.shape[1]
+    gram = fixed.T @ fixed + regularization * np.eye(k, dtype=np.float32)
+    solved = np.zeros((matrix.shape[0], k), dtype=np.float32)
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        if start == end:
+            continue
+        idx = matrix.indices[start:end]
+        confidence = 1 + ALS_ALPHA * matrix.data[start:end]
+        y = fixed[idx]
+        a = gram + (y.T * (confidence - 1)) @ y
+        solved[row] = np.linalg.solve(a, y.T @ confidence)
+    return solved
+
+
+def factorize_als(matrix, factors, iterations=ALS_ITERATIONS, seed=0):
+    """Implicit-feedback ALS: (user factors, movie factors)"""
+    rng = np.random.default_rng(seed)
+    item = (rng.standard_normal((matrix.shape[1], factors)) * 0.01).astype(np.float32)
+    transposed = matrix.T.tocsr()
+    for _ in range(iterations):
+        user = _als_step(item, matrix, ALS_REGULARIZATION)
+        item = _als_step(user, transposed, ALS_REGULARIZATION)
+    return user, item
+
+
+def fold_in(method, matrix, item_factors):
+    """User factors for rows of matrix against already trained movie factors"""
+    if method == 'svd':
+        # item factors are V * sqrt(S), and their squared column norms are S
+        singular = np.maximum((item_factors.astype(np.float64) ** 2).sum(axis=0), 1e-12)
+        return np.asarray((_log_scaled(matrix) @ item_factors) / singular, dtype=np.float32)
+    return _als_step(item_factors, matrix, ALS_REGULARIZATION)
+
+
+# -- top-K tables ---------------------------------------------------------------
+
+def _blocks(rows, columns):
+    """Row ranges small enough that a rows x columns score block fits SCORE_BUDGET"""
+    step = max(1, SCORE_BUDGET // max(columns, 1))
+    return [(start, min(start + step, rows)) for start in range(0, rows, step)]
+
+
+def _top_k(scores, k):
+    """Column indexes of the k best scores per row, best first"""
+    k = min(k, scores.shape[1])
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, best, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(best, order, axis=1)
+
+
+def _ranked(scores, row_ids, column_ids, k):
+    """(row id, rank, column id, score) of each row's k best positive scores"""
+    best = _top_k(scores, k)
+    values = np.take_along_axis(scores, best, axis=1)
+    keep = values > 0
+    ranks = np.cumsum(keep, axis=1) - 1  # ranks stay dense when a score is dropped
+    rows = np.broadcast_to(row_ids[:, None], best.shape)
+    return zip(rows[keep].tolist(), ranks[keep].tolist(), column_ids[best[keep]].tolist(),
+               values[keep].astype(float).tolist())
+
+
+def movie_neighbors(item_factors, movie_ids, support, k):
+    """Yield (movie_id, rank, neighbor_id, score) by cosine similarity of movie factors
+
+    support[i] is how many users interacted with movie i; rarely seen movies
+    are not offered as neighbours, since their factors are mostly noise.
+    """
+    norms = np.linalg.norm(item_factors, axis=1, keepdims=True)
+    unit = np.divide(item_factors, norms, out=np.zeros_like(item_factors), where=norms > 0)
+    candidates = np.flatnonzero(support >= MIN_SUPPORT)
+    if not len(candidates):
+        return
+    weight = (support[candidates] / (support[candidates] + SHRINKAGE)).astype(np.float32)
+    position = np.full(len(movie_ids), -1)
+    position[candidates] = np.arange(len(candidates))
+    for start, end in _blocks(len(movie_ids), len(candidates)):
+        scores = (unit[start:end] @ unit[candidates].T) * weight
+        own = np.flatnonzero(position[start:end] >= 0)
+        scores[own, position[start + own]] = -np.inf  # a movie is not its own neighbour
+        yield from _ranked(scores, movie_ids[start:end], movie_ids[candidates], k)
+
+
+def user_picks(user_factors, item_factors, matrix, user_ids, movie_ids, k):
+    """Yield (user_id, rank, movie_id, score), skipping movies the user already has"""
+    for start, end in _blocks(len(user_ids), len(movie_ids)):
+        scores = user_factors[start:end] @ item_factors.T
+        seen = matrix[start:end].tocoo()
+        scores[seen.row, seen.col] = -np.inf
+        yield from _ranked(scores, user_ids[start:end], movie_ids, k)
+
+
+def _write(model, key, rows, replace_ids=None):
+    """Replace model rows (all, or those whose key is in replace_ids) with rows"""
+    table = model.__table__
+    if replace_ids is None:
+        db.session.execute(table.delete())
+    else:
+        replace_ids = list(replace_ids)
+        for start in range(0, len(replace_ids), 500):
+            db.session.execute(table.delete().where(table.c[key].in_(replace_ids[start:start + 500])))
+    columns = [c.name for c in table.columns]
+    written, chunk = 0, []
+    for row in rows:
+        chunk.append(dict(zip(columns, row)))
+        if len(chunk) >= WRITE_CHUNK:
+            db.session.execute(table.insert(), chunk)
+            written += len(chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(table.insert(), chunk)
+        written += len(chunk)
+    return written
+
+
+# -- model file -------------------------------------------------------------------
+
+def model_path():
+    return current_app.config.get('COLLAB_MODEL_PATH') or os.path.join(current_app.instance_path, 'collab.npz')
+
+
+def _save_model(method, movie_ids, item_factors):
+    path = model_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(f, method=np.array(method), movie_ids=movie_ids, item_factors=item_factors)
+    os.replace(path + '.tmp', path)
+
+
+def _load_model():
+    try:
+        with np.load(model_path()) as data:
+            return str(data['method']), data['movie_ids'], data['item_factors']
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+# -- job -------------------------------------------------------------------------
+
+def _marks():
+    return (
+        db.session.scalar(select(func.max(Watchlist.id))) or 0,
+        db.session.scalar(select(func.max(Review.id))) or 0,
+    )
+
+
+def full_refresh(method='svd', factors=64, top_k=20):
+    """Factorize all interactions and rewrite both tables; returns a stats dict"""
+    watchlist_mark, review_mark = _marks()
+    users, movies, weights = _interactions()
+    stats = {'mode': 'full', 'method': method, 'interactions': len(weights), 'neighbors': 0, 'picks': 0}
+    state = db.session.get(CollabState, 1) or CollabState(id=1)
+    neighbors, picks = [], []
+    state.users = state.movies = 0
+    if len(weights):
+        matrix, user_ids, movie_ids = _matrix(users, movies, weights)
+        state.users, state.movies = len(user_ids), len(movie_ids)
+        # SVD needs at least two users and two movies to learn anything
+        if method == 'als' or min(matrix.shape) >= 2:
+            if method == 'svd':
+                factors = min(factors, min(matrix.shape) - 1)
+                user_factors, item_factors = factorize_svd(matrix, factors)
+            else:
+                user_factors, item_factors = factorize_als(matrix, factors)
+            _save_model(method, movie_ids, item_factors)
+            support = np.diff(matrix.tocsc().indptr)
+            neighbors = movie_neighbors(item_factors, movie_ids, support, top_k)
+            picks = user_picks(user_factors, item_factors, matrix, user_ids, movie_ids, top_k)
+    stats.update(users=state.users, movies=state.movies)
+    stats['neighbors'] = _write(MovieNeighbor, 'movie_id', neighbors)
+    stats['picks'] = _write(UserPick, 'user_id', picks)
+    state.method, state.factors, state.interactions = method, factors, len(weights)
+    state.watchlist_mark, state.review_mark = watchlist_mark, review_mark
+    state.built_at = state.refreshed_at = datetime.utcnow()
+    db.session.add(state)
+    db.session.commit()
+    return stats
+
+
+def incremental_refresh(top_k=20):
+    """Re-score users with new interactions against the saved factors
+
+    Returns a stats dict, or None when a full refresh is needed instead.
+    """
+    state = db.session.get(CollabState, 1)
+    model = _load_model()
+    if state is None or model is None:
+        return None
+    method, movie_ids, item_factors = model
+    watchlist_mark, review_mark = _marks()
+    new_watch = select(Watchlist.user_id).where(Watchlist.id > state.watchlist_mark)
+    new_reviews = select(Review.user_id).where(Review.id > state.review_mark)
+    touched = {u for u, in db.session.execute(new_watch)} | {u for u, in db.session.execute(new_reviews)}
+    new = (watchlist_mark - state.watchlist_mark) + (review_mark - state.review_mark)
+    ratio = current_app.config.get('COLLAB_FULL_REFRESH_RATIO', 0.2)
+    if state.interactions and new > state.interactions * ratio:
+        return None
+
+    stats = {'mode': 'incremental', 'method': method, 'users': len(touched), 'interactions': new, 'picks': 0}
+    if touched:
+        users, movies, weights = _interactions(sorted(touched))
+        matrix, user_ids, _ = _matrix(users, movies, weights, user_index=np.array(sorted(touched)),
+                                      movie_index=movie_ids)
+        user_factors = fold_in(method, matrix, item_factors)
+        stats['picks'] = _write(UserPick, 'user_id',
+                                user_picks(user_factors, item_factors, matrix, user_ids, movie_ids, top_k),
+                                replace_ids=user_ids.tolist())
+    state.interactions += new
+    state.watchlist_mark, state.review_mark = watchlist_mark, review_mark
+    state.refreshed_at = datetime.utcnow()
+    db.session.commit()
+    return stats
+
+
+def refresh(full=False, method=None, factors=None, top_k=None):
+    """Incremental refresh when possible, otherwise a full one; bumps the collab version"""
+    from app import catalog
+    config = current_app.config
+    top_k = top_k or config.get('COLLAB_TOP_K', 20)
+    stats = None if full else incremental_refresh(top_k)
+    if stats is None:
+        stats = full_refresh(
+            method or config.get('COLLAB_METHOD', 'svd'), factors or config.get('COLLAB_FACTORS', 64), top_k
+        )
+    if stats['mode'] == 'full' or stats['picks']:
+        catalog.bump_collab()  # new rails: processes drop cached rails and personal shelves
+    return stats
+
+
+# -- request side -----------------------------------------------------------------
+
+def _cache():
+    cache = current_app.extensions.get('collab_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('collab_cache', TTLCache(
+            maxsize=current_app.config.get('COLLAB_CACHE_SIZE', 4096),
+            ttl=current_app.config.get('COLLAB_CACHE_TTL', 3600),
+        ))
+    return cache
+
+
+def also_saved(movie_id, limit=12):
+    """MovieCards for the "Viewers also saved" rail (precomputed, cached per movie)"""
+    from app.shelves import to_card
+    cache = _cache()
+    cards = cache.get(movie_id)
+    if cards is None:
+        movies = db.session.query(Movie).join(
+            MovieNeighbor, MovieNeighbor.neighbor_id == Movie.id
+        ).filter(MovieNeighbor.movie_id == movie_id).order_by(MovieNeighbor.rank).limit(limit).all()
+        cards = [to_card(m) for m in movies]
+        cache.set(movie_id, cards)
+    return cards
+
+
+def picks_for(user_id, limit=10):
+    """Movie ids the collaborative model picked for a user, best first"""
+    return [movie_id for movie_id, in db.session.query(UserPick.movie_id).filter_by(
+        user_id=user_id
+    ).order_by(UserPick.rank).limit(limit)]
+
+
+def reset():
+    """Drop cached rails (after a refresh, or when another process ran one)"""
+    cache = current_app.extensions.get('collab_cache')
+    if cache is not None:
+        cache.clear()
+
+
+# -- CLI ------------------------------------------------------------------------------
+
+collab_cli = AppGroup('collab', help='Collaborative-filtering recommendations.')
+
+
+def _echo_stats(stats, elapsed):
+    if stats['mode'] == 'full':
+        click.echo(f"✅ Full {stats['method']} refresh: {stats['interactions']:,} interactions, "
+                   f"{stats['neighbors']:,} neighbour rows, {stats['picks']:,} user picks in {elapsed:.1f}s")
+    else:
+        click.echo(f"✅ Incremental refresh: {stats['users']:,} users re-scored "
+                   f"({stats['interactions']:,} new interactions, {stats['picks']:,} picks) in {elapsed:.1f}s")
+
+
+@collab_cli.command('refresh')
+@click.option('--full', is_flag=True, help='Refactorize everything instead of folding in new activity.')
+@click.option('--method', type=click.Choice(['svd', 'als']), help='Default: COLLAB_METHOD.')
+@click.option('--factors', type=int, help='Latent factors. Default: COLLAB_FACTORS.')
+@click.option('--top-k', type=int, help='Rows kept per movie/user. Default: COLLAB_TOP_K.')
+def refresh_command(full, method, factors, top_k):
+    """Rebuild "viewers also saved" and per-user picks."""
+    started = time.perf_counter()
+    stats = refresh(full, method, factors, top_k)
+    _echo_stats(stats, time.perf_counter() - started)
+
+
+@collab_cli.command('run')
+@click.option('--interval', default=900, show_default=True, help='Seconds between incremental refreshes.')
+@click.option('--full-every', default=24 * 3600, show_default=True, help='Seconds between full refreshes.')
+def run_command(interval, full_every):
+    """Keep refreshing on a schedule (a long-running alternative to cron)."""
+    last_full = 0.0
+    while True:
+        started = time.perf_counter()
+        full = time.monotonic() - last_full >= full_every
+        try:
+            stats = refresh(full=full)
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f"Collaborative refresh failed: {e}", err=True)
+        else:
+            if stats['mode'] == 'full':
+                last_full = time.monotonic()
+            _echo_stats(stats, time.perf_counter() - started)
+        db.session.remove()
+        time.sleep(interval)
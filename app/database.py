@@ -0,0 +1,191 @@
+"""Database engine profiles and read/write routing
+
+With DB_PROFILE=tuned (the default) the app gets two engines per database:
+
+- the default engine, the *writer*: flushes, INSERT/UPDATE/DELETE,
+  SELECT ... FOR UPDATE, and every statement that follows a write in the
+  same transaction, so a request always reads its own writes;
+- a "reader" bind serving all other SELECTs from its own, larger pool.
+
+SQLite files are opened in WAL mode, so readers never wait for the writer.
+Every connection also gets synchronous=NORMAL, a busy_timeout, a page cache
+and mmap.  Reader connections are query_only.  The writer pool defaults to a
+single connection, so writers inside one process queue in the pool instead
+of spinning on "database is locked".
+
+PostgreSQL gets sized, pre-pinged, recycled pools.  The reader bind is only
+added when DATABASE_READ_URL names a replica.  Replicas lag, so a page
+reached right after a write may briefly not show it.
+
+In-memory SQLite databases and other dialects keep Flask-SQLAlchemy's
+defaults, as does DB_PROFILE=default.
+
+create_async_reader() opens the same reader database through an asyncio
+driver (aiosqlite / asyncpg) for the async read path in app/asgi.py.
+"""
+import re
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql import Select, CompoundSelect, TextClause
+from flask_sqlalchemy.session import Session
+
+READER = 'reader'  # bind key of the read-only engine
+
+# Per-dialect defaults; DB_* settings override them
+PROFILES = {
+    'sqlite': {
+        'reader_pool_size': 8, 'reader_max_overflow': 8,
+        'writer_pool_size': 1, 'writer_max_overflow': 0,
+        'pool_timeout': 30,
+    },
+    'postgresql': {
+        'reader_pool_size': 10, 'reader_max_overflow': 10,
+        'writer_pool_size': 5, 'writer_max_overflow': 5,
+        'pool_timeout': 10, 'pool_recycle': 1800,
+    },
+}
+SETTINGS = {  # config key -> profile key
+    'DB_POOL_SIZE': 'reader_pool_size',
+    'DB_MAX_OVERFLOW': 'reader_max_overflow',
+    'DB_WRITER_POOL_SIZE': 'writer_pool_size',
+    'DB_WRITER_MAX_OVERFLOW': 'writer_max_overflow',
+    'DB_POOL_TIMEOUT': 'pool_timeout',
+}
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+}
+
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'postgresql': 'asyncpg'}
+
+_READ_SQL = re.compile(r'\s*(SELECT|WITH)\b', re.IGNORECASE)
+
+
+def _is_read(clause):
+    """Whether a statement only reads (and may go to the reader engine)"""
+    if isinstance(clause, (Select, CompoundSelect)):
+        return clause._for_update_arg is None
+    if isinstance(clause, TextClause):
+        return bool(_READ_SQL.match(clause.text))
+    return False
+
+
+class RoutingSession(Session):
+    """db.session: reads go to the reader bind, unless this transaction has written"""
+
+    _writing = False
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and READER in self._db.engines:
+            if not self._writing and not self._flushing and _is_read(clause):
+                return self._db.engines[READER]
+            self._writing = True  # stay on the writer until commit/rollback: read your own writes
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _transaction_ended(session, transaction):
+    if transaction.parent is None:
+        session._writing = False
+
+
+def _profile(config, dialect):
+    profile = dict(PROFILES[dialect])
+    for key, name in SETTINGS.items():
+        if config.get(key) not in (None, ''):
+            profile[name] = int(config[key])
+    return profile
+
+
+def _pool(profile, role):
+    options = {
+        'pool_size': profile[f'{role}_pool_size'],
+        'max_overflow': profile[f'{role}_max_overflow'],
+        'pool_timeout': profile['pool_timeout'],
+    }
+    if 'pool_recycle' in profile:
+        options['pool_recycle'] = profile['pool_recycle']
+    return options
+
+
+def configure(app):
+    """Fill in SQLALCHEMY_ENGINE_OPTIONS / SQLALCHEMY_BINDS for the profile (before db.init_app)"""
+    config = app.config
+    if config.get('DB_PROFILE', 'tuned') != 'tuned':
+        return
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    dialect = url.get_backend_name()
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+    read_url = config.get('DATABASE_READ_URL')
+
+    if dialect == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            return  # one shared in-memory connection; nothing to tune
+        profile = _profile(config, dialect)
+        options.update(_pool(profile, 'writer'))
+        binds.setdefault(READER, {'url': read_url or config['SQLALCHEMY_DATABASE_URI'], **_pool(profile, 'reader')})
+    elif dialect == 'postgresql':
+        profile = _profile(config, dialect)
+        connect_args = {'application_name': 'streamverse'} if url.get_driver_name() == 'psycopg2' else {}
+        options.update(_pool(profile, 'writer'), pool_pre_ping=True)
+        options.setdefault('connect_args', connect_args)
+        if read_url:
+            binds.setdefault(READER, {'url': read_url, **_pool(profile, 'reader'), 'pool_pre_ping': True,
+                                      'connect_args': connect_args})
+    else:
+        return
+
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    if binds:
+        config['SQLALCHEMY_BINDS'] = binds
+
+
+def _sqlite_pragmas(config, query_only):
+    pragmas = dict(SQLITE_PRAGMAS)
+    pragmas['busy_timeout'] = int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    pragmas['cache_size'] = -int(config.get('SQLITE_CACHE_SIZE_KB', 32768))  # negative = KiB
+    pragmas['mmap_size'] = int(config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    if query_only:
+        pragmas['query_only'] = 'ON'
+
+    def connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+    return connect
+
+
+def init_app(app):
+    """Install the SQLite connection pragmas on the app's engines (after db.init_app)"""
+    from app import db
+    if app.config.get('DB_PROFILE', 'tuned') != 'tuned':
+        return
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:'):
+                event.listen(engine, 'connect', _sqlite_pragmas(app.config, query_only=key == READER))
+
+
+def create_async_reader(app):
+    """AsyncEngine on the reader database (the main one without a reader bind), pooled like the reader"""
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from app import db
+    with app.app_context():
+        url = db.engines.get(READER, db.engine).url  # relative SQLite paths already resolved
+    dialect = url.get_backend_name()
+    if dialect not in ASYNC_DRIVERS or (dialect == 'sqlite' and url.database in (None, '', ':memory:')):
+        raise RuntimeError(f'The async read path needs a SQLite file or PostgreSQL, not {url.render_as_string()}')
+    options = {}
+    if app.config.get('DB_PROFILE', 'tuned') == 'tuned':
+        profile = _profile(app.config, dialect)
+        options.update(_pool(profile, 'reader'))
+        if dialect == 'postgresql':
+            options['pool_pre_ping'] = True
+    engine = create_async_engine(url.set(drivername=f'{dialect}+{ASYNC_DRIVERS[dialect]}'), **options)
+    if dialect == 'sqlite' and app.config.get('DB_PROFILE', 'tuned') == 'tuned':
+        event.listen(engine.sync_engine, 'connect', _sqlite_pragmas(app.config, query_only=True))
+    return engine
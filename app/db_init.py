@@ -1,16 +1,22 @@
-"""Database initialization and seeding"""
+"""Database initialization and seeding (`flask init-db`)
+
+Serving never creates or migrates tables: run `flask --app run init-db` once
+per deploy, before starting the workers.
+"""
 import os
+import click
+from flask import current_app
+from flask.cli import with_appcontext
 from werkzeug.security import generate_password_hash
 from app import db
 from app.models import User, SubscriptionPlan
-from app.utils import bootstrap_migration
+from app import migrations
 
 
 def initialize_db(app):
     """Initialize database and seed default data"""
     with app.app_context():
-        db.create_all()
-        bootstrap_migration(app)
+        migrations.upgrade()
 
         # Create a default admin user if not exists ONLY when explicitly requested via env var.
         if os.environ.get('STREAMVERSE_CREATE_ADMIN', '0') == '1':
@@ -38,3 +44,20 @@ def initialize_db(app):
             db.session.commit()
             print("✅ Seeded default subscription plans")
 
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Apply schema migrations and seed default data"""
+    initialize_db(current_app)
+
+
+def check_schema(app):
+    """Warn when the database is behind the code; one version query, no introspection"""
+    with app.app_context():
+        current = migrations.current_version()
+    if current < migrations.head():
+        print(f"⚠️ Database schema is at version {current}, the code expects {migrations.head()}. "
+              "Run `flask --app run init-db`.")
+        return False
+    return True
@@ -0,0 +1,79 @@
+"""Cached subscription status per user
+
+get_active_subscription() is called on the dashboard, profile and
+subscription pages and by subscription_required on every premium
+movie_detail hit.  Lookups are memoized for the rest of the request (on
+flask.g) and held across requests in a bounded TTL cache.  subscribe,
+cancel_subscription and the Stripe webhook call invalidate() after they
+write, and every entry also expires when the subscription itself ends.
+
+Other worker processes only see a change once their own entry expires,
+so SUBSCRIPTION_CACHE_TTL should stay short.
+"""
+from collections import namedtuple
+from datetime import datetime
+from flask import current_app, g
+from app.cache import TTLCache
+from app.models import UserSubscription
+
+
+# Immutable copies so cached values never touch a closed session
+PlanSnapshot = namedtuple('PlanSnapshot', 'id name price duration_days')
+Entitlement = namedtuple('Entitlement', 'id user_id plan_id plan start_date end_date')
+
+_NONE = 'none'  # cached "no active subscription"
+
+
+def _cache():
+    cache = current_app.extensions.get('entitlements')
+    if cache is None:
+        cache = current_app.extensions['entitlements'] = TTLCache(
+            maxsize=current_app.config.get('SUBSCRIPTION_CACHE_SIZE', 4096),
+            ttl=current_app.config.get('SUBSCRIPTION_CACHE_TTL', 60),
+        )
+    return cache
+
+
+def _snapshot(sub):
+    plan = sub.plan
+    return Entitlement(
+        sub.id, sub.user_id, sub.plan_id,
+        PlanSnapshot(plan.id, plan.name, plan.price, plan.duration_days) if plan else None,
+        sub.start_date, sub.end_date,
+    )
+
+
+def _load(user_id, now):
+    # Served by ix_user_subscription_user_id_end_date
+    sub = UserSubscription.query.filter(
+        UserSubscription.user_id == user_id,
+        UserSubscription.end_date > now
+    ).order_by(UserSubscription.end_date.desc()).first()
+    return _snapshot(sub) if sub else None
+
+
+def active_entitlement(user_id):
+    """The user's current subscription as an Entitlement, or None"""
+    memo = g.setdefault('_entitlements', {})
+    if user_id in memo:
+        return memo[user_id]
+
+    now = datetime.utcnow()
+    cache = _cache()
+    value = cache.get(user_id)
+    if value is None or (value != _NONE and value.end_date <= now):
+        value = _load(user_id, now)
+        if value is None:
+            cache.set(user_id, _NONE)
+        else:
+            # Never serve a subscription past its end date
+            cache.set(user_id, value, ttl=min(cache.ttl, (value.end_date - now).total_seconds()))
+    result = None if value == _NONE else value
+    memo[user_id] = result
+    return result
+
+
+def invalidate(user_id):
+    """Forget a user's cached status (call after their subscriptions change)"""
+    _cache().pop(user_id)
+    g.get('_entitlements', {}).pop(user_id, None)
@@ -0,0 +1,221 @@
+"""Poster and profile-picture pipeline
+
+Uploads are stored under a content-hashed name (same bytes -> same file,
+so two uploads in the same second can no longer collide) and resized in
+the background into a few widths, each as WebP plus a JPEG/PNG fallback:
+
+    posters/3f2a9c01d4e5b6a7.jpg          original
+    posters/3f2a9c01d4e5b6a7-320w.webp    rendition
+    posters/3f2a9c01d4e5b6a7-320w.jpg     rendition (fallback format)
+
+Once a job finishes it records the widths it produced on the row
+(Movie.poster_widths / User.profile_pic_widths); until then templates
+simply keep using the original.  Pillow releases the GIL while decoding,
+resizing and encoding, so a small thread pool is enough.
+"""
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, url_for
+from werkzeug.utils import secure_filename
+from app import db
+from app.models import Movie, User
+
+
+POSTER_WIDTHS = (160, 320, 640)   # shelf thumbnail, grid tile, detail page
+AVATAR_WIDTHS = (48, 96, 256)     # navbar, dashboard, profile
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+DEFAULT_POSTER = 'images/default_poster.jpg'
+DEFAULT_AVATAR = 'images/default_profile.png'
+
+
+def _executor():
+    pool = current_app.extensions.get('image_pool')
+    if pool is None:
+        pool = current_app.extensions['image_pool'] = ThreadPoolExecutor(
+            max_workers=max(1, current_app.config.get('IMAGE_WORKERS', 2)),
+            thread_name_prefix='images',
+        )
+    return pool
+
+
+def parse_widths(value):
+    """'160,320' -> [160, 320]"""
+    return [int(w) for w in value.split(',') if w] if value else []
+
+
+def _fallback_format(filename):
+    return 'png' if filename.lower().endswith('.png') else 'jpg'
+
+
+def rendition_name(filename, width, fmt):
+    stem, _ = os.path.splitext(filename)
+    return f"{stem}-{width}w.{fmt}"
+
+
+def save_upload(file, folder):
+    """Store an uploaded FileStorage under its content hash; returns the file name"""
+    return save_bytes(file.read(), file.filename, folder)
+
+
+def save_bytes(data, original_name, folder):
+    """Store image bytes under their content hash (keeping original_name's extension)"""
+    _, ext = os.path.splitext(secure_filename(original_name or ''))
+    filename = hashlib.sha256(data).hexdigest()[:16] + (ext.lower() or '.jpg')
+    path = os.path.join(folder, filename)
+    if not os.path.exists(path):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return filename
+
+
+def render(path, widths):
+    """Write every rendition of the image at path; returns the widths produced"""
+    from PIL import Image, ImageOps  # only the resize workers need Pillow
+    folder, filename = os.path.split(path)
+    with Image.open(path) as src:
+        img = ImageOps.exif_transpose(src)
+        # PNGs keep PNG (and their transparency); everything else falls back to JPEG
+        fallback = _fallback_format(filename)
+        alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        img = img.convert('RGBA' if alpha and fallback == 'png' else 'RGB')
+
+        # Never upscale; a small original still gets one (re-encoded) rendition
+        targets = [w for w in widths if w < img.width] or [img.width]
+        for width in targets:
+            height = max(1, round(img.height * width / img.width))
+            resized = img.resize((width, height), Image.LANCZOS)
+            for fmt, options in (
+                ('webp', {'quality': WEBP_QUALITY, 'method': 4}),
+                (fallback, {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True}
+                 if fallback == 'jpg' else {'optimize': True}),
+            ):
+                out = os.path.join(folder, rendition_name(filename, width, fmt))
+                tmp = f"{out}.{os.getpid()}.{threading.get_ident()}.tmp"
+                resized.save(tmp, format='JPEG' if fmt == 'jpg' else fmt.upper(), **options)
+                os.replace(tmp, out)
+    return targets
+
+
+def remove(folder, filename, widths):
+    """Delete an original and its renditions (missing files are ignored)"""
+    names = [filename] + [
+        rendition_name(filename, w, fmt) for w in widths for fmt in ('webp', 'jpg', 'png')
+    ]
+    for name in names:
+        try:
+            os.remove(os.path.join(folder, name))
+        except OSError:
+            pass
+
+
+def _run(app, path, widths, on_done):
+    with app.app_context():
+        try:
+            produced = render(path, widths)
+        except Exception as e:
+            print(f"Image processing failed for {path}: {e}")
+            return
+        on_done(produced)
+
+
+def _submit(path, widths, on_done):
+    app = current_app._get_current_object()
+    if app.config.get('IMAGE_WORKERS', 2) <= 0:
+        _run(app, path, widths, on_done)  # synchronous (tests, scripts)
+    else:
+        _executor().submit(_run, app, path, widths, on_done)
+
+
+def process_poster(poster_path):
+    """Queue renditions for an uploaded poster ('posters/<name>', relative to /static/)"""
+    path = os.path.join(current_app.static_folder, poster_path)
+
+    def done(widths):
+        from app import autocomplete, shelves, catalog
+        movies = Movie.query.filter_by(poster_path=poster_path).all()
+        for movie in movies:
+            movie.poster_widths = ','.join(str(w) for w in widths)
+        db.session.commit()
+        for movie in movies:
+            autocomplete.update_movie(movie)
+        shelves.invalidate()
+        catalog.bump(content=False)  # other processes' autocomplete gets the widths with the next content bump
+
+    _submit(path, POSTER_WIDTHS, done)
+
+
+def process_avatar(user_id, filename):
+    """Queue renditions for a profile picture stored in UPLOAD_FOLDER"""
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+
+    def done(widths):
+        from app import users
+        User.query.filter_by(id=user_id, profile_pic=filename).update(
+            {User.profile_pic_widths: ','.join(str(w) for w in widths)},
+            synchronize_session=False
+        )
+        db.session.commit()
+        users.invalidate(user_id)
+
+    _submit(path, AVATAR_WIDTHS, done)
+
+
+# -- template helpers -------------------------------------------------------
+
+def _pick(widths, width):
+    """Smallest available width >= width (else the largest)"""
+    larger = [w for w in widths if w >= width]
+    return min(larger) if larger else max(widths)
+
+
+def _src(static_path, widths, width):
+    if not static_path:
+        return None
+    if widths:
+        static_path = rendition_name(static_path, _pick(widths, width), _fallback_format(static_path))
+    return url_for('static', filename=static_path)
+
+
+def _srcset(static_path, widths, webp=True):
+    if not static_path or not widths:
+        return ''
+    fmt = 'webp' if webp else _fallback_format(static_path)
+    return ', '.join(
+        f"{url_for('static', filename=rendition_name(static_path, w, fmt))} {w}w" for w in widths
+    )
+
+
+def poster_src(movie, width=320):
+    """Best single URL for a movie poster about `width` px wide"""
+    path = getattr(movie, 'poster_path', None)
+    return (
+        _src(path, parse_widths(getattr(movie, 'poster_widths', None)), width)
+        or movie.poster_url
+        or url_for('static', filename=DEFAULT_POSTER)
+    )
+
+
+def poster_srcset(movie, webp=True):
+    """srcset for an uploaded poster ('' when there are no renditions yet)"""
+    return _srcset(
+        getattr(movie, 'poster_path', None), parse_widths(getattr(movie, 'poster_widths', None)), webp
+    )
+
+
+def avatar_src(user, width=96):
+    if not user.profile_pic:
+        return url_for('static', filename=DEFAULT_AVATAR)
+    return _src('uploads/' + user.profile_pic, parse_widths(user.profile_pic_widths), width)
+
+
+def avatar_srcset(user, webp=True):
+    if not user.profile_pic:
+        return ''
+    return _srcset('uploads/' + user.profile_pic, parse_widths(user.profile_pic_widths), webp)
@@ -0,0 +1,248 @@
+"""Request, SQL and template instrumentation, exported as Prometheus text
+
+Flask request hooks time every request per endpoint, SQLAlchemy cursor
+events count and time each statement (attributed to the endpoint running
+it), and the template signals time render_template().  Statements slower
+than SLOW_QUERY_MS are logged, with their parameters, to the
+"app.metrics.slow_queries" logger.
+
+Everything is kept in memory as plain counters and fixed-bucket histograms
+behind one lock, so recording costs a few microseconds per request and per
+statement.  /admin/metrics (admins, or a scraper sending
+"Authorization: Bearer $METRICS_TOKEN") renders them in the Prometheus text
+format.  Numbers are per process: scrape each worker, or sum them in
+Prometheus.
+"""
+import bisect
+import hmac
+import logging
+import threading
+import time
+from functools import wraps
+from flask import Response, current_app, request, before_render_template, template_rendered
+from sqlalchemy import event
+from app import db
+from app.utils import admin_required
+
+slow_log = logging.getLogger('app.metrics.slow_queries')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+NO_ENDPOINT = '-'  # statements run outside a request (CLI jobs, background workers)
+MAX_LOGGED_PARAMS = 500  # characters of a slow statement's parameters worth logging
+
+# Per-thread state of the request being served; a worker thread serves one request at a time
+_local = threading.local()
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label tuple"""
+
+    def __init__(self, name, help, labels, buckets):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self.series = {}  # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, values, amount):
+        series = self.series.get(values)
+        if series is None:
+            series = self.series[values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, amount)] += 1
+        series[-1] += amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        for values, series in sorted(self.series.items()):
+            labels = _labels(self.labels, values)
+            total = 0
+            for bound, n in zip(self.buckets + ('+Inf',), series):
+                total += n
+                yield f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {total}'
+            yield f'{self.name}_sum{{{labels}}} {series[-1]:.6f}'
+            yield f'{self.name}_count{{{labels}}} {total}'
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name, self.help, self.labels = name, help, labels
+        self.series = {}
+
+    def inc(self, values, amount=1):
+        self.series[values] = self.series.get(values, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        for values, total in sorted(self.series.items()):
+            yield f'{self.name}{{{_labels(self.labels, values)}}} {total}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+
+class Metrics:
+    """The app's metric families; every update happens under one lock"""
+
+    def __init__(self, slow_query_seconds):
+        self.slow_query_seconds = slow_query_seconds
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Start every family from zero, e.g. in a freshly forked worker"""
+        self.started = time.time()
+        self.requests = Histogram('streamverse_request_duration_seconds', 'Request latency.',
+                                  ('endpoint', 'method', 'status'), LATENCY_BUCKETS)
+        self.request_queries = Histogram('streamverse_request_sql_queries', 'SQL statements per request.',
+                                         ('endpoint',), COUNT_BUCKETS)
+        self.queries = Histogram('streamverse_sql_query_duration_seconds', 'SQL statement latency.',
+                                 ('endpoint',), SQL_BUCKETS)
+        self.slow_queries = Counter('streamverse_sql_slow_queries_total',
+                                    'SQL statements slower than SLOW_QUERY_MS.', ('endpoint',))
+        self.templates = Histogram('streamverse_template_render_seconds', 'render_template() time.',
+                                   ('template',), LATENCY_BUCKETS)
+
+    def render(self):
+        with self.lock:
+            lines = [
+                '# HELP streamverse_process_start_time_seconds Start time of the process since the epoch.',
+                '# TYPE streamverse_process_start_time_seconds gauge',
+                f'streamverse_process_start_time_seconds {self.started:.3f}',
+            ]
+            for family in (self.requests, self.request_queries, self.queries, self.slow_queries, self.templates):
+                lines.extend(family.render())
+        return '\n'.join(lines) + '\n'
+
+
+# -- hooks ----------------------------------------------------------------------
+
+def _start_request():
+    _local.endpoint = request.endpoint or 'unmatched'  # unmatched URLs share one series
+    _local.started = time.perf_counter()
+    _local.queries = 0
+    _local.status = 500  # until after_request says otherwise
+
+
+def _after_request(response):
+    _local.status = response.status_code
+    return response
+
+
+def _end_request(metrics):
+    def end(exc=None):
+        started = getattr(_local, 'started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        endpoint = _local.endpoint
+        with metrics.lock:
+            metrics.requests.observe((endpoint, request.method, str(_local.status)), elapsed)
+            metrics.request_queries.observe((endpoint,), _local.queries)
+        _local.started = None
+        _local.endpoint = None
+    return end
+
+
+def _track_sql(metrics):
+    # The start time lives on the statement's execution context, so a statement that fails leaves nothing behind
+    def before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:  # None only for a few dialect-internal statements
+            context.metrics_started = time.perf_counter()
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, 'metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        endpoint = getattr(_local, 'endpoint', None)
+        if endpoint:
+            _local.queries += 1
+        else:
+            endpoint = NO_ENDPOINT
+        slow = elapsed >= metrics.slow_query_seconds
+        with metrics.lock:
+            metrics.queries.observe((endpoint,), elapsed)
+            if slow:
+                metrics.slow_queries.inc((endpoint,))
+        if slow:
+            if executemany:
+                parameters = f'{parameters[:3]!r} ({len(parameters)} rows)'
+            slow_log.warning('%.1f ms [%s] %s -- %s', elapsed * 1000, endpoint,
+                             ' '.join(statement.split()), str(parameters)[:MAX_LOGGED_PARAMS])
+
+    return before, after
+
+
+def _track_templates(metrics):
+    def before(sender, template, context, **extra):
+        if not hasattr(_local, 'template_started'):
+            _local.template_started = []
+        _local.template_started.append(time.perf_counter())
+
+    def rendered(sender, template, context, **extra):
+        stack = getattr(_local, 'template_started', None)
+        if stack:
+            elapsed = time.perf_counter() - stack.pop()
+            with metrics.lock:
+                metrics.templates.observe((template.name or '<string>',), elapsed)
+
+    return before, rendered
+
+
+def init_app(app):
+    """Install the hooks (unless METRICS_ENABLED is off) and keep the registry on the app"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    metrics = app.extensions['metrics'] = Metrics(app.config.get('SLOW_QUERY_MS', 200) / 1000)
+    app.before_request(_start_request)
+    app.after_request(_after_request)
+    app.teardown_request(_end_request(metrics))
+
+    sql_before, sql_after = _track_sql(metrics)
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', sql_before)
+            event.listen(engine, 'after_cursor_execute', sql_after)
+
+    template_before, template_after = _track_templates(metrics)
+    metrics.receivers = (template_before, template_after)  # signals only hold weak references
+    before_render_template.connect(template_before, app)
+    template_rendered.connect(template_after, app)
+
+
+def observe_request(app, endpoint, method, status, seconds):
+    """Record a request served outside Flask's dispatch (the ASGI read path)"""
+    metrics = app.extensions.get('metrics')
+    if metrics is not None:
+        with metrics.lock:
+            metrics.requests.observe((endpoint, method, str(status)), seconds)
+
+
+# -- endpoint -------------------------------------------------------------------
+
+def _scraper_or_admin(view):
+    """Let a scraper in with the METRICS_TOKEN bearer token; everyone else must be an admin"""
+    guarded = admin_required(view)
+
+    @wraps(view)
+    def decorated(*args, **kwargs):
+        token = current_app.config.get('METRICS_TOKEN')
+        if token and hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+            return view(*args, **kwargs)
+        return guarded(*args, **kwargs)
+    return decorated
+
+
+@_scraper_or_admin
+def metrics_view():
+    """Prometheus text exposition of this process's metrics"""
+    metrics = current_app.extensions.get('metrics')
+    if metrics is None:
+        return Response('# metrics are disabled (METRICS_ENABLED=0)\n', mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,207 @@
+"""Versioned schema migrations
+
+Each migration is a function registered with @migration(version, description).
+The schema_version table records the versions applied, so startup runs a
+single "SELECT max(version)" and only introspects or alters anything when a
+newer migration ships.  Migrations run in order and each is committed
+together with its schema_version row, except that large backfills commit in
+batches.  They are written to be idempotent, deciding what to do from the
+database rather than from what an earlier step just did, so a database that
+already has some of the objects (e.g. one set up by an older release, or a
+migration interrupted part-way) upgrades cleanly.
+
+    flask schema upgrade   # apply pending migrations
+    flask schema status    # current version and what is pending
+
+Add new migrations at the end with the next version number; never edit one
+that has shipped.
+"""
+from datetime import datetime
+import click
+import sqlalchemy as sa
+from flask.cli import AppGroup
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+from app import db
+from app.models import CatalogState, Movie, Payment, Review, SchemaVersion, User, UserSubscription, Watchlist
+
+MIGRATIONS = []  # (version, description, function), in version order
+
+
+def migration(version, description):
+    """Register the decorated function as schema migration number `version`"""
+    def register(function):
+        if MIGRATIONS and version <= MIGRATIONS[-1][0]:
+            raise ValueError(f'Migration {version} must come after {MIGRATIONS[-1][0]}')
+        MIGRATIONS.append((version, description, function))
+        return function
+    return register
+
+
+def head():
+    """Version the code expects"""
+    return MIGRATIONS[-1][0]
+
+
+def current_version():
+    """Highest applied version; 0 for a database without a schema_version table"""
+    try:
+        return db.session.scalar(sa.select(sa.func.max(SchemaVersion.version))) or 0
+    except (OperationalError, ProgrammingError):
+        db.session.rollback()
+        return 0
+
+
+def pending():
+    current = current_version()
+    return [m for m in MIGRATIONS if m[0] > current]
+
+
+def upgrade():
+    """Apply pending migrations; returns the versions applied"""
+    applied = []
+    for version, description, function in pending():
+        function()
+        db.session.add(SchemaVersion(version=version, description=description))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # another process applied it at the same time; the migration is idempotent
+            db.session.rollback()
+            continue
+        applied.append(version)
+        print(f"✅ Schema migration {version}: {description}")
+    return applied
+
+
+# -- helpers --------------------------------------------------------------------
+
+def _add_columns(model, *names):
+    """ALTER TABLE ... ADD COLUMN for the model's columns missing from the table; returns the added names"""
+    table = model.__table__
+    connection = db.session.connection()
+    existing = {c['name'] for c in sa.inspect(connection).get_columns(table.name)}
+    preparer = connection.dialect.identifier_preparer
+    added = []
+    for name in names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        ddl = f'{preparer.quote(name)} {column.type.compile(connection.dialect)}'
+        if column.server_default is not None:
+            ddl += f" NOT NULL DEFAULT {column.server_default.arg}"
+        for fk in column.foreign_keys:
+            ddl += f' REFERENCES {preparer.quote(fk.column.table.name)} ({preparer.quote(fk.column.name)})'
+        connection.execute(sa.text(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}'))
+        added.append(name)
+    return added
+
+
+def _create_indexes(model, *names):
+    """Create the model's named indexes unless they exist"""
+    connection = db.session.connection()
+    indexes = {index.name: index for index in model.__table__.indexes}
+    for name in names:
+        indexes[name].create(connection, checkfirst=True)
+
+
+# -- migrations -----------------------------------------------------------------
+
+@migration(1, 'baseline schema')
+def baseline():
+    """Create missing tables, and bring databases from before versioning up to date"""
+    db.create_all()
+    _add_columns(
+        Movie, 'language', 'runtime', 'age_rating', 'imdb_rating', 'tags', 'poster_path', 'created_at',
+        'review_count', 'rating_sum', 'poster_widths', 'external_id',
+    )
+    from app.reviews import RATING_COLUMNS
+    _add_columns(Movie, *RATING_COLUMNS)  # the review recount below writes them
+    _add_columns(User, 'profile_pic_widths')
+    _add_columns(Payment, 'stripe_id', 'subscription_id')
+    _add_columns(UserSubscription, 'stripe_subscription_id')
+
+    # Keyset pagination needs a non-NULL created_at
+    db.session.execute(sa.update(Movie).where(Movie.created_at.is_(None)).values(created_at=datetime(1970, 1, 1)))
+    _create_indexes(Movie, 'ix_movie_created_at_id', 'ix_movie_external_id')
+    _create_indexes(Review, 'ix_review_movie_id_timestamp')
+    _create_indexes(UserSubscription, 'ix_user_subscription_user_id_end_date',
+                    'ix_user_subscription_stripe_subscription_id')
+    _create_indexes(Payment, 'ix_payment_stripe_id')
+
+    # Count reviews nobody has counted yet: the columns were just added, or an earlier run died before this
+    reviewed_uncounted = sa.select(Review.id).join(Movie, Movie.id == Review.movie_id).where(Movie.review_count == 0)
+    if db.session.execute(reviewed_uncounted.limit(1)).first():
+        from app.reviews import recompute_review_stats
+        count = recompute_review_stats()
+        print(f"✅ Computed review stats for {count} movies")
+
+    # Backfill the genre/tag/language join tables from the free-text columns
+    from app.taxonomy import needs_backfill, backfill_taxonomy
+    if needs_backfill():
+        count = backfill_taxonomy()
+        print(f"✅ Backfilled genres/tags/languages for {count} movies")
+
+
+@migration(2, 'full-text search index')
+def search_index():
+    from app.search import ensure_search_index
+    ensure_search_index()
+
+
+@migration(3, 'watchlist, review and rating indexes')
+def hot_path_indexes():
+    """Indexes behind the watchlist, review and shelf queries; one watchlist entry per user and movie"""
+    keep = sa.select(sa.func.min(Watchlist.id)).group_by(Watchlist.user_id, Watchlist.movie_id)
+    duplicates = db.session.execute(sa.delete(Watchlist).where(Watchlist.id.not_in(keep))).rowcount
+    if duplicates:
+        print(f"✅ Removed {duplicates} duplicate watchlist entries")
+    _create_indexes(Watchlist, 'ix_watchlist_user_id_movie_id', 'ix_watchlist_movie_id')
+    _create_indexes(Review, 'ix_review_user_id')
+    _create_indexes(Movie, 'ix_movie_imdb_rating_created_at')
+
+
+@migration(4, 'catalog content version')
+def catalog_content_version():
+    _add_columns(CatalogState, 'content_version')
+
+
+@migration(5, 'collaborative-filtering version')
+def catalog_collab_version():
+    _add_columns(CatalogState, 'collab_version')
+
+
+@migration(6, 'review histogram counters')
+def review_histogram_counters():
+    """rating_1 .. rating_10 replace the rating_histogram string, so a review increments one counter"""
+    from app.reviews import RATING_COLUMNS, recompute_review_stats
+    _add_columns(Movie, *RATING_COLUMNS)
+    bucketed = sum((getattr(Movie, name) for name in RATING_COLUMNS), sa.literal(0))
+    if db.session.execute(sa.select(Movie.id).where(Movie.review_count != bucketed).limit(1)).first():
+        count = recompute_review_stats()
+        print(f"✅ Computed review histograms for {count} movies")
+
+    connection = db.session.connection()
+    if 'rating_histogram' in {c['name'] for c in sa.inspect(connection).get_columns(Movie.__table__.name)}:
+        table = connection.dialect.identifier_preparer.format_table(Movie.__table__)
+        connection.execute(sa.text(f'ALTER TABLE {table} DROP COLUMN rating_histogram'))
+
+
+# -- CLI ------------------------------------------------------------------------
+
+schema_cli = AppGroup('schema', help='Database schema migrations.')
+
+
+@schema_cli.command('upgrade')
+def upgrade_command():
+    """Apply pending schema migrations"""
+    applied = upgrade()
+    if not applied:
+        click.echo(f"✅ Schema is up to date (version {current_version()})")
+
+
+@schema_cli.command('status')
+def status_command():
+    """Show the applied version and pending migrations"""
+    click.echo(f"Schema version {current_version()} (code expects {head()})")
+    for version, description, _ in pending():
+        click.echo(f"  pending {version}: {description}")
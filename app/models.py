@@ -10,6 +10,7 @@ class User(UserMixin, db.Model):
     password = db.Column(db.String(200), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
     profile_pic = db.Column(db.String(300), nullable=True)
+    profile_pic_widths = db.Column(db.String(50))  # renditions ready, set by app.images
 
     # relationships
     reviews = db.relationship('Review', backref='user', lazy=True, cascade="all, delete-orphan")
@@ -17,8 +18,51 @@ class User(UserMixin, db.Model):
     subscriptions = db.relationship('UserSubscription', backref='user', lazy=True, cascade="all, delete-orphan")
 
 
+# Many-to-many join tables between movies and their genres / tags / languages.
+# The composite primary key serves movie -> terms; the extra index serves term -> movies.
+movie_genre = db.Table(
+    'movie_genre',
+    db.Column('movie_id', db.Integer, db.ForeignKey('movie.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genre.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_movie_genre_genre_id', 'genre_id', 'movie_id'),
+)
+
+movie_tag = db.Table(
+    'movie_tag',
+    db.Column('movie_id', db.Integer, db.ForeignKey('movie.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_movie_tag_tag_id', 'tag_id', 'movie_id'),
+)
+
+movie_language = db.Table(
+    'movie_language',
+    db.Column('movie_id', db.Integer, db.ForeignKey('movie.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('language_id', db.Integer, db.ForeignKey('language.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_movie_language_language_id', 'language_id', 'movie_id'),
+)
+
+
+class Genre(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    slug = db.Column(db.String(100), unique=True, nullable=False, index=True)  # lowercase lookup key
+
+
+class Tag(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    slug = db.Column(db.String(100), unique=True, nullable=False, index=True)
+
+
+class Language(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    slug = db.Column(db.String(100), unique=True, nullable=False, index=True)
+
+
 class Movie(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+    external_id = db.Column(db.String(100), unique=True, index=True)  # catalog feed id, see app.catalog_io
     title = db.Column(db.String(200), nullable=False)
     genre = db.Column(db.String(100), nullable=True)
     trailer_url = db.Column(db.String(500), nullable=True)
@@ -32,10 +76,54 @@ class Movie(db.Model):
     imdb_rating = db.Column(db.Float)         # 0.0 - 10.0
     tags = db.Column(db.String(300))          # free text: "Trending, Popular"
     poster_path = db.Column(db.String(500))   # uploaded file relative path
+    poster_widths = db.Column(db.String(50))  # renditions ready, set by app.images: "160,320,640"
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Denormalized review aggregates, maintained by app.reviews
+    review_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # reviews per rating, one counter each so a new review increments a single column
+    rating_1 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_2 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_3 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_4 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_5 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_6 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_7 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_8 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_9 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_10 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        # keyset pagination order (newest first)
+        db.Index('ix_movie_created_at_id', 'created_at', 'id'),
+        # Popular / Top Picks shelves, per-genre rows
+        db.Index('ix_movie_imdb_rating_created_at', 'imdb_rating', 'created_at'),
+    )
 
     # relationships
     reviews = db.relationship('Review', backref='movie', lazy=True, cascade="all, delete-orphan")
+    # normalized copies of genre / tags / language, kept in sync by app.taxonomy
+    genre_list = db.relationship('Genre', secondary=movie_genre, lazy=True, backref='movies')
+    tag_list = db.relationship('Tag', secondary=movie_tag, lazy=True, backref='movies')
+    language_list = db.relationship('Language', secondary=movie_language, lazy=True, backref='movies')
+
+    @property
+    def community_rating(self):
+        """Average user rating (1-10), or None without reviews"""
+        if not self.review_count:
+            return None
+        return round(self.rating_sum / self.review_count, 1)
+
+    @property
+    def is_premium(self):
+        """Behind the paywall: badges and subscription_required use this same rule"""
+        from app.taxonomy import is_premium
+        return is_premium(self.tags)
+
+    @property
+    def rating_counts(self):
+        """Number of reviews per rating, index 0 = rating 1"""
+        return [getattr(self, f'rating_{rating}') or 0 for rating in range(1, 11)]
 
 
 class Review(db.Model):
@@ -46,6 +134,13 @@ class Review(db.Model):
     movie_id = db.Column(db.Integer, db.ForeignKey('movie.id'), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # a movie's reviews, newest first (detail page pagination)
+        db.Index('ix_review_movie_id_timestamp', 'movie_id', 'timestamp', 'id'),
+        # a user's reviews (account deletion, collab job)
+        db.Index('ix_review_user_id', 'user_id'),
+    )
+
 
 class Watchlist(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -54,6 +149,13 @@ class Watchlist(db.Model):
     # relationship to movie for convenient access in templates
     movie = db.relationship('Movie', lazy=True)
 
+    __table_args__ = (
+        # one entry per user and movie; also serves "is it saved?" and the user's list
+        db.Index('ix_watchlist_user_id_movie_id', 'user_id', 'movie_id', unique=True),
+        # movie deletion and "viewers also saved"
+        db.Index('ix_watchlist_movie_id', 'movie_id'),
+    )
+
 
 class SubscriptionPlan(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -69,14 +171,89 @@ class UserSubscription(db.Model):
     plan_id = db.Column(db.Integer, db.ForeignKey('subscription_plan.id'), nullable=False)
     start_date = db.Column(db.DateTime, default=datetime.utcnow)
     end_date = db.Column(db.DateTime, nullable=False)
+    stripe_subscription_id = db.Column(db.String(255), index=True)  # recurring Stripe subscriptions only
     # Relationships
     plan = db.relationship('SubscriptionPlan', lazy=True)
 
+    __table_args__ = (
+        # active-subscription lookup: user_id = ? AND end_date > now
+        db.Index('ix_user_subscription_user_id_end_date', 'user_id', 'end_date'),
+    )
+
 
 class Payment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     amount = db.Column(db.Float, nullable=False)
     payment_date = db.Column(db.DateTime, default=datetime.utcnow)
-    status = db.Column(db.String(20), nullable=False)  # e.g., 'Completed', 'Failed'
+    status = db.Column(db.String(20), nullable=False)  # e.g., 'Completed', 'Failed', 'Refunded'
+    # Stripe payment intent / invoice id; unique so a replayed event cannot record a payment twice
+    stripe_id = db.Column(db.String(255), unique=True, index=True)
+    subscription_id = db.Column(db.Integer, db.ForeignKey('user_subscription.id'), nullable=True)
+
+
+
+class StripeEvent(db.Model):
+    """Raw Stripe webhook event, queued by the webhook route and processed by app.webhooks"""
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.String(255), unique=True, nullable=False)  # Stripe's evt_... id
+    type = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending/processing/done/failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    claimed_by = db.Column(db.String(32))
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # the worker's queue scan
+        db.Index('ix_stripe_event_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+
+class CatalogState(db.Model):
+    """Single row (id=1) whose version is bumped on every catalog change, see app.catalog"""
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    content_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # movie details only
+    collab_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # app.collab rails
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class MovieNeighbor(db.Model):
+    """Top-K "viewers also saved" movies per movie, written by the app.collab job"""
+    movie_id = db.Column(db.Integer, db.ForeignKey('movie.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    neighbor_id = db.Column(db.Integer, db.ForeignKey('movie.id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+
+class UserPick(db.Model):
+    """Top-K collaborative-filtering picks per user, written by the app.collab job"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    movie_id = db.Column(db.Integer, db.ForeignKey('movie.id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+
+class CollabState(db.Model):
+    """Single row (id=1) describing the last app.collab run"""
+    id = db.Column(db.Integer, primary_key=True)
+    method = db.Column(db.String(10), nullable=False)
+    factors = db.Column(db.Integer, nullable=False)
+    users = db.Column(db.Integer, nullable=False, default=0)
+    movies = db.Column(db.Integer, nullable=False, default=0)
+    interactions = db.Column(db.Integer, nullable=False, default=0)
+    watchlist_mark = db.Column(db.Integer, nullable=False, default=0)  # highest Watchlist.id seen
+    review_mark = db.Column(db.Integer, nullable=False, default=0)     # highest Review.id seen
+    built_at = db.Column(db.DateTime)      # last full factorization
+    refreshed_at = db.Column(db.DateTime)  # last run of any kind
+
 
+class SchemaVersion(db.Model):
+    """One row per applied migration, see app.migrations"""
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
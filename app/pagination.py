@@ -0,0 +1,78 @@
+"""Keyset (cursor) pagination, newest first
+
+Pages are ordered by (timestamp, id) descending and the cursor is the
+position of the last row served, so fetching page N costs the same as
+page 1 and never needs an OFFSET scan.
+"""
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_
+from app.models import Movie, Review
+
+
+DEFAULT_PAGE_SIZE = 24
+REVIEW_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp, row_id) -> str:
+    """Opaque cursor pointing just after the row at (timestamp, row_id)"""
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor; raises InvalidCursor on garbage"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def clamp_page_size(per_page) -> int:
+    return max(1, min(int(per_page or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+
+
+def keyset_query(query, time_col, id_col, cursor=None, per_page=DEFAULT_PAGE_SIZE):
+    """query (a Query or a select()) narrowed to the page after cursor, ordered by (time_col, id_col) DESC"""
+    per_page = clamp_page_size(per_page)
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            time_col < timestamp,
+            and_(time_col == timestamp, id_col < row_id),
+        ))
+    # One extra row tells us whether there is a next page
+    return query.order_by(time_col.desc(), id_col.desc()).limit(per_page + 1)
+
+
+def keyset_rows(rows, time_col, id_col, per_page=DEFAULT_PAGE_SIZE):
+    """The rows keyset_query returned -> (rows, next_cursor or None)"""
+    per_page = clamp_page_size(per_page)
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        return rows, encode_cursor(getattr(last, time_col.key), getattr(last, id_col.key))
+    return rows, None
+
+
+def keyset_page(query, time_col, id_col, cursor=None, per_page=DEFAULT_PAGE_SIZE):
+    """One page of query ordered by (time_col, id_col) DESC -> (rows, next_cursor or None)"""
+    rows = keyset_query(query, time_col, id_col, cursor, per_page).all()
+    return keyset_rows(rows, time_col, id_col, per_page)
+
+
+def movie_page(query, cursor=None, per_page=DEFAULT_PAGE_SIZE):
+    """Movies, newest first (backed by ix_movie_created_at_id)"""
+    return keyset_page(query, Movie.created_at, Movie.id, cursor, per_page)
+
+
+def review_page(query, cursor=None, per_page=REVIEW_PAGE_SIZE):
+    """Reviews, newest first (backed by ix_review_movie_id_timestamp)"""
+    return keyset_page(query, Review.timestamp, Review.id, cursor, per_page)
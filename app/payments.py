@@ -0,0 +1,163 @@
+"""Stripe API client used by the checkout flow
+
+One pooled HTTP session per app, strict connect/read timeouts and a cap on
+concurrent Stripe calls, so a slow or unreachable payment API costs a
+request at most STRIPE_CONNECT_TIMEOUT + STRIPE_READ_TIMEOUT seconds and
+can never occupy more than STRIPE_MAX_CONCURRENCY worker threads; callers
+beyond that fail fast with PaymentsBusy instead of queueing.
+
+Each SubscriptionPlan is mirrored as a Stripe Product (id "streamverse-plan-<id>")
+with a one-time Price found by lookup key, so checkout refers to a price id
+instead of sending inline price_data every time.  Price ids are cached per
+process; a plan whose name or price changes simply maps to a new lookup key.
+
+STRIPE_API_BASE points the client elsewhere, e.g. at the local stub in
+benchmarks/fake_stripe.py:
+
+    python -m benchmarks.fake_stripe --port 12111 --delay 0.2
+    STRIPE_SECRET_KEY=sk_test_stub STRIPE_API_BASE=http://127.0.0.1:12111 flask --app run run
+"""
+import threading
+import uuid
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+
+
+class PaymentError(Exception):
+    """Stripe could not be reached or rejected the call"""
+
+
+class PaymentsBusy(PaymentError):
+    """Every Stripe call slot is taken; try again shortly"""
+
+
+class StripeClient:
+    """Minimal form-encoded Stripe REST client on a pooled requests.Session"""
+
+    def __init__(self, api_key, api_base='https://api.stripe.com', connect_timeout=3.0,
+                 read_timeout=10.0, max_concurrency=8, acquire_timeout=0.5):
+        self.api_key = api_key
+        self.api_base = api_base.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.acquire_timeout = acquire_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._prices = {}  # lookup key -> price id
+        self._price_locks = {}  # lookup key -> lock held while that price is looked up or created
+        self._prices_lock = threading.Lock()  # guards _price_locks only, never held across a call
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Authorization': f'Bearer {api_key}'})
+
+    def request(self, method, path, params=None, idempotency_key=None):
+        """Call the API and return the decoded JSON object (raises PaymentError)"""
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise PaymentsBusy('too many Stripe calls in flight')
+        try:
+            headers = {'Idempotency-Key': idempotency_key} if idempotency_key else {}
+            form = encode(params or {})
+            url = self.api_base + path
+            try:
+                if method == 'GET':
+                    response = self.session.get(url, params=form, headers=headers, timeout=self.timeout)
+                else:
+                    response = self.session.request(method, url, data=form, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                raise PaymentError(f'{method} {path}: {e.__class__.__name__}') from e
+        finally:
+            self._slots.release()
+
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        if response.status_code >= 400:
+            error = body.get('error') or {}
+            raise PaymentError(f"{method} {path}: {response.status_code} {error.get('message', '')}".strip())
+        return body
+
+    # -- plans ---------------------------------------------------------------
+
+    def price_for(self, plan, currency='usd'):
+        """Stripe Price id for plan (cached; creates the Product/Price on first use)"""
+        cents = int(round(plan.price * 100))
+        lookup_key = f'streamverse-plan-{plan.id}-{cents}-{currency}'
+        price_id = self._prices.get(lookup_key)
+        if price_id:
+            return price_id
+        with self._prices_lock:
+            lock = self._price_locks.setdefault(lookup_key, threading.Lock())
+        with lock:  # one creation per plan, not one per concurrent checkout; other plans aren't held up
+            price_id = self._prices.get(lookup_key)
+            if not price_id:
+                price_id = self._find_price(lookup_key) or self._create_price(plan, cents, currency, lookup_key)
+                self._prices[lookup_key] = price_id
+        return price_id
+
+    def _find_price(self, lookup_key):
+        found = self.request('GET', '/v1/prices', {'lookup_keys': [lookup_key], 'active': 'true', 'limit': 1})
+        data = found.get('data') or []
+        return data[0]['id'] if data else None
+
+    def _create_price(self, plan, cents, currency, lookup_key):
+        product_id = f'streamverse-plan-{plan.id}'
+        try:
+            self.request('POST', f'/v1/products/{product_id}', {'name': plan.name})
+        except PaymentError:
+            self.request('POST', '/v1/products', {'id': product_id, 'name': plan.name},
+                         idempotency_key=f'{product_id}-create')
+        price = self.request('POST', '/v1/prices', {
+            'product': product_id,
+            'currency': currency,
+            'unit_amount': cents,
+            'lookup_key': lookup_key,
+            'transfer_lookup_key': 'true',  # another process may have raced us to it
+            'metadata': {'plan_id': plan.id},
+        }, idempotency_key=f'{lookup_key}-create')
+        return price['id']
+
+    # -- checkout ------------------------------------------------------------
+
+    def create_checkout_session(self, plan, user_id, success_url, cancel_url):
+        """Start a hosted Checkout for plan; returns the session object (with 'url')"""
+        return self.request('POST', '/v1/checkout/sessions', {
+            'mode': 'payment',
+            'payment_method_types': ['card'],
+            'line_items': [{'price': self.price_for(plan), 'quantity': 1}],
+            'success_url': success_url,
+            'cancel_url': cancel_url,
+            'metadata': {'user_id': user_id, 'plan_id': plan.id},
+        }, idempotency_key=str(uuid.uuid4()))
+
+
+def encode(params, prefix=None):
+    """Flatten nested dicts/lists into Stripe's form encoding: a[b][0][c]=v"""
+    pairs = []
+    items = params.items() if isinstance(params, dict) else enumerate(params)
+    for key, value in items:
+        name = f'{prefix}[{key}]' if prefix else str(key)
+        if isinstance(value, (dict, list, tuple)):
+            pairs.extend(encode(value, name))
+        elif value is not None:
+            pairs.append((name, 'true' if value is True else 'false' if value is False else str(value)))
+    return pairs
+
+
+def client():
+    """The app's StripeClient, or None when STRIPE_SECRET_KEY is not set"""
+    config = current_app.config
+    if not config.get('STRIPE_SECRET_KEY'):
+        return None
+    existing = current_app.extensions.get('payments')
+    if existing is None:
+        existing = current_app.extensions.setdefault('payments', StripeClient(
+            config['STRIPE_SECRET_KEY'],
+            api_base=config.get('STRIPE_API_BASE') or 'https://api.stripe.com',
+            connect_timeout=config.get('STRIPE_CONNECT_TIMEOUT', 3.0),
+            read_timeout=config.get('STRIPE_READ_TIMEOUT', 10.0),
+            max_concurrency=config.get('STRIPE_MAX_CONCURRENCY', 8),
+        ))
+    return existing
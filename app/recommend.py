@@ -0,0 +1,266 @@
+"""Content-based "Top Picks for You"
+
+Every movie is encoded as a feature vector: one-hot genres, tags, languages
+and age rating, a runtime bucket and the IMDb rating (each vocabulary is
+capped, so rare tags do not widen the matrix).  Each block is
+normalized and weighted, then the whole row is scaled to unit length, so a
+dot product is a weighted cosine similarity.  The rows live in one float32
+NumPy matrix per process, built on first use; a user's picks are the
+catalog scored against the centroid of their watchlist in a single
+matrix-vector product.
+
+The admin movie routes keep the matrix current with update_movie() /
+remove_movie() (new terms get a new column, up to the per-block caps);
+bulk imports and changes made by other processes call reset() to rebuild
+it.  Picks are cached per user, keyed on the matrix version and the
+watchlist, so they survive unrelated catalog changes such as new reviews.
+"""
+import functools
+import itertools
+import threading
+import numpy as np
+from flask import current_app
+from app import db
+from app.cache import TTLCache
+from app.models import Movie
+from app.taxonomy import GENRE_SEPARATORS, LIST_SEPARATORS, parse_terms, slugify
+
+
+# (block, weight, max columns): genres drive similarity the most
+BLOCKS = (
+    ('genre', 1.0, 64),
+    ('tag', 0.5, 64),
+    ('language', 0.5, 32),
+    ('age_rating', 0.3, 8),
+    ('runtime', 0.3, 5),
+    ('rating', 0.4, 1),
+)
+RUNTIME_BUCKETS = (90, 120, 150)   # minutes: <90, 90-119, 120-149, 150+ (plus unknown)
+RATING_BONUS = 0.05                # tie-breaker: better-rated movies first among equals
+
+_versions = itertools.count(1)  # unique across rebuilt models, for the picks cache
+
+FEATURE_COLUMNS = ('id', 'genre', 'tags', 'language', 'age_rating', 'runtime', 'imdb_rating')
+
+
+def _runtime_bucket(runtime):
+    if not runtime:
+        return 'unknown'
+    for i, limit in enumerate(RUNTIME_BUCKETS):
+        if runtime < limit:
+            return str(i)
+    return str(len(RUNTIME_BUCKETS))
+
+
+@functools.lru_cache(maxsize=8192)
+def _slugs(value, separators=LIST_SEPARATORS):
+    # Catalogs repeat the same genre/tag/language strings, so this is mostly cache hits
+    return tuple(slugify(t) for t in parse_terms(value, separators))
+
+
+def movie_features(movie):
+    """{block: [term, ...]} for a Movie (or a row with the FEATURE_COLUMNS)"""
+    return {
+        'genre': _slugs(movie.genre, GENRE_SEPARATORS),
+        'tag': _slugs(movie.tags),
+        'language': _slugs(movie.language),
+        'age_rating': (slugify(movie.age_rating),) if movie.age_rating else (),
+        'runtime': (_runtime_bucket(movie.runtime),),
+    }
+
+
+class ContentModel:
+    """Movie feature matrix with incremental updates; safe to share between threads"""
+
+    def __init__(self, capacity=1024, width=32):
+        self._sizes = {block: size for block, _, size in BLOCKS}
+        self._vocab = {block: {} for block, _, _ in BLOCKS}  # block -> {term: column}
+        self._columns = 1     # columns handed out; column 0 is the rating
+        self._matrix = np.zeros((capacity, width), dtype=np.float32)
+        self._ratings = np.zeros(capacity, dtype=np.float32)
+        self._active = np.zeros(capacity, dtype=bool)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._row_of = {}     # movie id -> row
+        self._free = []       # rows of removed movies, reused first
+        self._size = 0        # rows in use (including freed ones)
+        self._lock = threading.RLock()
+        self.version = next(_versions)
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def _column(self, block, term):
+        vocab = self._vocab[block]
+        column = vocab.get(term)
+        if column is None:
+            if len(vocab) >= self._sizes[block]:
+                return None  # block is full; rare terms do not get a column
+            column = vocab[term] = self._columns
+            self._columns += 1
+        return column
+
+    def _encode(self, movie):
+        """(columns, values) of a movie's feature vector, before normalization"""
+        columns, values = [], []
+        features = movie_features(movie)
+        for block, weight, _ in BLOCKS:
+            if block == 'rating':
+                if movie.imdb_rating:
+                    columns.append(0)
+                    values.append(weight * min(max(movie.imdb_rating, 0), 10) / 10)
+                continue
+            block_columns = [c for c in (self._column(block, term) for term in features[block]) if c is not None]
+            if block_columns:
+                # Each block weighs the same however many terms it has
+                columns.extend(block_columns)
+                values.extend([weight / len(block_columns) ** 0.5] * len(block_columns))
+        return columns, values
+
+    def _resize(self, rows, columns):
+        for name in ('_matrix', '_ratings', '_active', '_ids'):
+            old = getattr(self, name)
+            shape = (rows, columns) if old.ndim == 2 else (rows,)
+            if old.shape != shape:
+                new = np.zeros(shape, dtype=old.dtype)
+                keep = tuple(slice(0, min(a, b)) for a, b in zip(old.shape, shape))
+                new[keep] = old[keep]
+                setattr(self, name, new)
+
+    def load(self, movies):
+        """Bulk-encode movies into an empty model (one vectorized fill)"""
+        with self._lock:
+            rows, columns, values = [], [], []
+            for row, movie in enumerate(movies):
+                movie_columns, movie_values = self._encode(movie)
+                rows.extend([row] * len(movie_columns))
+                columns.extend(movie_columns)
+                values.extend(movie_values)
+                self._row_of[movie.id] = row
+            n = len(self._row_of)
+            self._resize(n + 1024, self._columns + 8)  # a little room for new movies and terms
+            self._matrix[rows, columns] = values
+            norms = np.linalg.norm(self._matrix[:n], axis=1, keepdims=True)
+            np.divide(self._matrix[:n], norms, out=self._matrix[:n], where=norms > 0)
+            self._ids[:n] = list(self._row_of)
+            self._ratings[:n] = [movie.imdb_rating or 0 for movie in movies]
+            self._active[:n] = True
+            self._size = n
+            self.version = next(_versions)
+
+    def update_movie(self, movie):
+        """Insert or re-encode one movie"""
+        with self._lock:
+            columns, values = self._encode(movie)
+            if self._columns > self._matrix.shape[1]:
+                self._resize(self._matrix.shape[0], self._columns + 16)
+            row = self._row_of.get(movie.id)
+            if row is None:
+                if self._free:
+                    row = self._free.pop()
+                else:
+                    if self._size == self._matrix.shape[0]:
+                        self._resize(self._size + self._size // 2, self._matrix.shape[1])
+                    row = self._size
+                    self._size += 1
+                self._row_of[movie.id] = row
+            vector = np.zeros(self._matrix.shape[1], dtype=np.float32)
+            vector[columns] = values
+            norm = np.linalg.norm(vector)
+            self._matrix[row] = vector / norm if norm else vector
+            self._ratings[row] = movie.imdb_rating or 0
+            self._ids[row] = movie.id
+            self._active[row] = True
+            self.version = next(_versions)
+
+    def remove_movie(self, movie_id):
+        with self._lock:
+            row = self._row_of.pop(movie_id, None)
+            if row is not None:
+                self._matrix[row] = 0
+                self._active[row] = False
+                self._free.append(row)
+                self.version = next(_versions)
+
+    def top_picks(self, seed_ids, limit=10):
+        """Movie ids most similar to the centroid of seed_ids, best first (seeds excluded)"""
+        with self._lock:
+            rows = [self._row_of[i] for i in seed_ids if i in self._row_of]
+            if not rows:
+                return []
+            n = self._size
+            centroid = self._matrix[rows].mean(axis=0)
+            scores = self._matrix[:n] @ centroid
+            scores += RATING_BONUS * self._ratings[:n] / 10
+            scores[~self._active[:n]] = -np.inf
+            scores[rows] = -np.inf
+            k = min(limit, len(self._row_of) - len(rows))
+            if k <= 0:
+                return []
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best], kind='stable')]
+            return [int(self._ids[r]) for r in best if scores[r] > -np.inf]
+
+
+def build_model(movies):
+    model = ContentModel()
+    model.load(movies)
+    return model
+
+
+def _state():
+    return current_app.extensions.setdefault('recommender', {
+        'model': None,
+        'lock': threading.Lock(),
+        'picks': TTLCache(
+            maxsize=current_app.config.get('SHELF_CACHE_USERS', 1024),
+            ttl=current_app.config.get('RECOMMEND_CACHE_TTL', 3600),
+        ),
+    })
+
+
+def get_model():
+    """The app's content model, built from the catalog on first use"""
+    state = _state()
+    if state['model'] is None:
+        with state['lock']:
+            if state['model'] is None:
+                rows = db.session.execute(db.select(*(getattr(Movie, c) for c in FEATURE_COLUMNS))).all()
+                state['model'] = build_model(rows)
+    return state['model']
+
+
+def top_picks(user_id, watchlist_ids, limit=10):
+    """Ids of the movies to recommend to a user with the given watchlist (cached)"""
+    if not watchlist_ids:
+        return []
+    model = get_model()
+    key = (model.version, tuple(sorted(watchlist_ids)), limit)
+    picks = _state()['picks']
+    cached = picks.get(user_id)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    ids = model.top_picks(watchlist_ids, limit)
+    picks.set(user_id, (key, ids))
+    return ids
+
+
+def reset():
+    """Throw the model away; the next get_model() rebuilds it from the database"""
+    state = current_app.extensions.get('recommender')
+    if state:
+        state['model'] = None
+        state['picks'].clear()
+
+
+def update_movie(movie):
+    """Re-encode one movie, if the model has been built"""
+    state = current_app.extensions.get('recommender')
+    if state and state['model'] is not None:
+        state['model'].update_movie(movie)
+
+
+def remove_movie(movie_id):
+    """Drop one movie from the model, if it has been built"""
+    state = current_app.extensions.get('recommender')
+    if state and state['model'] is not None:
+        state['model'].remove_movie(movie_id)
@@ -0,0 +1,85 @@
+"""Per-movie review aggregates (count, rating sum, rating histogram)
+
+Movie.review_count / rating_sum and the histogram counters rating_1 ..
+rating_10 are updated in the same transaction that inserts a Review, so
+pages can show and sort by the community rating without running AVG/COUNT
+over the review table.
+`flask reviews repair` recomputes them in bulk from the review table.
+"""
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func
+from app import db
+from app.models import Movie, Review
+
+
+RATING_MIN = 1
+RATING_MAX = 10
+RATING_COLUMNS = [f'rating_{rating}' for rating in range(RATING_MIN, RATING_MAX + 1)]  # the histogram
+
+
+def rating_column(rating):
+    """The Movie histogram counter for a rating"""
+    if not RATING_MIN <= rating <= RATING_MAX:
+        raise ValueError(f'rating must be between {RATING_MIN} and {RATING_MAX}')
+    return getattr(Movie, RATING_COLUMNS[rating - RATING_MIN])
+
+
+def add_review(movie_id, user_id, content, rating):
+    """Insert a review and bump its movie's aggregates (caller commits)
+
+    Count, sum and the rating's histogram bucket are incremented in one SQL
+    UPDATE, so concurrent reviews of the same title cannot lose an update
+    whatever the caller has loaded, and the cost does not grow with the
+    number of reviews.
+    """
+    bucket = rating_column(rating)
+    review = Review(content=content, rating=rating, user_id=user_id, movie_id=movie_id)
+    db.session.add(review)
+    db.session.execute(
+        db.update(Movie).where(Movie.id == movie_id).values({
+            Movie.review_count: func.coalesce(Movie.review_count, 0) + 1,
+            Movie.rating_sum: func.coalesce(Movie.rating_sum, 0) + rating,
+            bucket: func.coalesce(bucket, 0) + 1,
+        }).execution_options(synchronize_session='fetch')
+    )
+    return review
+
+
+def recompute_review_stats(batch_size=1000):
+    """Rebuild every movie's aggregates from the review table; returns movies updated"""
+    stats = {}
+    rows = db.session.query(Review.movie_id, Review.rating, func.count()).group_by(
+        Review.movie_id, Review.rating
+    )
+    for movie_id, rating, n in rows:
+        counts = stats.setdefault(movie_id, [0] * (RATING_MAX - RATING_MIN + 1))
+        if RATING_MIN <= rating <= RATING_MAX:
+            counts[rating - RATING_MIN] += n
+
+    Movie.query.update(
+        {'review_count': 0, 'rating_sum': 0, **dict.fromkeys(RATING_COLUMNS, 0)},
+        synchronize_session=False
+    )
+    updates = [{
+        'id': movie_id,
+        'review_count': sum(counts),
+        'rating_sum': sum(n * (i + RATING_MIN) for i, n in enumerate(counts)),
+        **dict(zip(RATING_COLUMNS, counts)),
+    } for movie_id, counts in stats.items()]
+    for start in range(0, len(updates), batch_size):
+        db.session.execute(db.update(Movie), updates[start:start + batch_size])
+    db.session.commit()
+    return len(updates)
+
+
+reviews_cli = AppGroup('reviews', help='Review aggregate maintenance.')
+
+
+@reviews_cli.command('repair')
+def repair_command():
+    """Recompute review_count / rating_sum / the rating histogram for all movies."""
+    count = recompute_review_stats()
+    from app import catalog
+    catalog.bump(content=False)
+    click.echo(f"Recomputed review stats for {count} movies")
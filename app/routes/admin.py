@@ -1,24 +1,32 @@
 """Admin routes (dashboard, movie management, subscription management)"""
 import os
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, abort
 from flask_login import login_required, current_user
 from sqlalchemy.orm import joinedload
-from werkzeug.utils import secure_filename
 from datetime import datetime
 from app import db
 from app.models import Movie, SubscriptionPlan, UserSubscription, User
 from app.utils import admin_required, allowed_image
+from app.taxonomy import sync_movie_taxonomy
+from app.pagination import movie_page, InvalidCursor
+from app import search, autocomplete, recommend, shelves, images, catalog
 
 bp = Blueprint('admin', __name__, url_prefix='')
 
+ADMIN_PAGE_SIZE = 48
+
 
 @bp.route('/admin', endpoint='admin_dashboard')
 @login_required
 @admin_required
 def admin_dashboard():
     """Admin dashboard"""
-    movies = Movie.query.all()
-    return render_template('admin_dashboard.html', movies=movies)
+    cursor = request.args.get('cursor', '').strip() or None
+    try:
+        movies, next_cursor = movie_page(Movie.query, cursor, ADMIN_PAGE_SIZE)
+    except InvalidCursor:
+        abort(400)
+    return render_template('admin_dashboard.html', movies=movies, next_cursor=next_cursor, cursor=cursor)
 
 
 @bp.route('/admin/subscription_plans', endpoint='admin_subscription_plans')
@@ -83,8 +91,16 @@ def edit_movie(movie_id):
     movie.trailer_url = request.form.get('trailer_url', movie.trailer_url)
     movie.poster_url = request.form.get('poster_url', movie.poster_url)
     movie.description = request.form.get('description', movie.description)
+    movie.language = request.form.get('language', movie.language or '').strip() or None
+    movie.tags = request.form.get('tags', movie.tags or '').strip() or None
 
+    sync_movie_taxonomy(movie)
+    search.index_movie(movie)
     db.session.commit()
+    autocomplete.update_movie(movie)
+    recommend.update_movie(movie)
+    shelves.invalidate()
+    catalog.bump()
     flash("Movie updated successfully ✅", "success")
     return redirect(url_for('movie_detail', movie_id=movie.id))
 
@@ -95,18 +111,20 @@ def edit_movie(movie_id):
 def delete_movie(movie_id):
     """Delete a movie"""
     movie = Movie.query.get_or_404(movie_id)
+    poster_path, poster_widths = movie.poster_path, movie.poster_widths
 
-    # Remove uploaded poster file if exists
-    if movie.poster_path:
-        try:
-            abs_path = os.path.join(current_app.static_folder, movie.poster_path)
-            if os.path.isfile(abs_path):
-                os.remove(abs_path)
-        except Exception:
-            pass
-
+    search.remove_movie(movie.id)
     db.session.delete(movie)
     db.session.commit()
+
+    # Then remove the uploaded poster and its renditions (best effort), unless another movie shares the file
+    if poster_path and not Movie.query.filter(Movie.poster_path == poster_path).first():
+        folder, name = os.path.split(os.path.join(current_app.static_folder, poster_path))
+        images.remove(folder, name, images.parse_widths(poster_widths))
+    autocomplete.remove_movie(movie_id)
+    recommend.remove_movie(movie_id)
+    shelves.invalidate()
+    catalog.bump()
     flash("Movie deleted successfully 🗑️", "success")
     return redirect(url_for('admin_dashboard'))
 
@@ -136,11 +154,7 @@ def add_movie():
         poster_file = request.files.get('poster_file')
         poster_path = None
         if poster_file and poster_file.filename and allowed_image(poster_file.filename):
-            filename = secure_filename(poster_file.filename)
-            name, ext = os.path.splitext(filename)
-            safe_name = f"poster_{int(datetime.utcnow().timestamp())}{ext.lower()}"
-            save_path = os.path.join(current_app.config['POSTER_FOLDER'], safe_name)
-            poster_file.save(save_path)
+            safe_name = images.save_upload(poster_file, current_app.config['POSTER_FOLDER'])
             poster_path = f"posters/{safe_name}"  # relative to /static/
 
         # Parse numbers safely
@@ -166,7 +180,16 @@ def add_movie():
             created_at=datetime.utcnow()
         )
         db.session.add(new_movie)
+        sync_movie_taxonomy(new_movie)
+        db.session.flush()  # assigns new_movie.id for the search index
+        search.index_movie(new_movie)
         db.session.commit()
+        autocomplete.update_movie(new_movie)
+        recommend.update_movie(new_movie)
+        shelves.invalidate()
+        catalog.bump()
+        if poster_path:
+            images.process_poster(poster_path)  # renditions are built in the background
         flash("Movie added successfully!", "success")
         return redirect(url_for('admin_dashboard'))
 
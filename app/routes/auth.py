@@ -4,6 +4,7 @@ from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
 from app.models import User
+from app import users
 
 bp = Blueprint('auth', __name__, url_prefix='')
 
@@ -47,6 +48,7 @@ def login():
 
         if user and check_password_hash(user.password, password):
             login_user(user)
+            users.remember(user)
             flash("Logged in successfully!", "success")
             return redirect(url_for('admin_dashboard') if user.is_admin else url_for('dashboard'))
         else:
@@ -1,12 +1,26 @@
 """Main routes (landing, home/browse)"""
-from flask import Blueprint, render_template, request, jsonify, url_for
+from flask import Blueprint, render_template, request, jsonify, url_for, abort
 from flask_login import current_user
-from app.models import Movie, Watchlist
+from app.models import Movie, Genre, movie_genre
 from app import db
-from sqlalchemy.orm import joinedload
+from app.search import search_movies
+from app.autocomplete import get_index as get_autocomplete_index
+from app.shelves import get_global_shelves, get_user_shelves, cache_token
+from app.taxonomy import has_genre
+from app.pagination import movie_page, InvalidCursor
+from app.images import poster_src, poster_srcset
+from app.catalog import conditional
 
 bp = Blueprint('main', __name__, url_prefix='')
 
+# Relevance-ranked search results are not paginated, only capped
+SEARCH_RESULTS_LIMIT = 100
+
+# The "popular searches" chips: genres with the most movies
+POPULAR_GENRES = db.select(Genre.name).join(
+    movie_genre, movie_genre.c.genre_id == Genre.id
+).group_by(Genre.id, Genre.name).order_by(db.func.count().desc()).limit(8)
+
 
 @bp.route('/', endpoint='landing')
 def landing():
@@ -14,37 +28,37 @@ def landing():
     return render_template('landing.html')
 
 
+def _shelf_token():
+    """Which cached shelves /home would be built from (None until they are cached)"""
+    token = cache_token()
+    if token is None or not current_user.is_authenticated:
+        return token
+    if request.args.get('q', '').strip() or request.args.get('genre', '').strip():
+        return token  # personal shelves are only shown on the unfiltered page
+    user_token = cache_token(current_user.id)
+    return user_token and token + user_token
+
+
 @bp.route('/home', endpoint='home')
+@conditional(_shelf_token, personal=True)
 def home():
     """Home/Browse page with search and filtering - Crunchyroll-style"""
     q = request.args.get('q', '').strip()
     genre = request.args.get('genre', '').strip()
 
-    query = Movie.query
-    if q:
-        # Search in title, description, and genre
-        query = query.filter(
-            (Movie.title.ilike(f"%{q}%")) |
-            (Movie.description.ilike(f"%{q}%")) |
-            (Movie.genre.ilike(f"%{q}%"))
-        )
-    if genre:
-        # Exact genre match or partial match
-        query = query.filter(Movie.genre.ilike(f"%{genre}%"))
+    # Shelves shared by every visitor come from the shelf cache
+    shelves = get_global_shelves()
 
-    movies = query.order_by(Movie.created_at.desc()).all()
-    
-    # Get featured movies for carousel (movies with "Trending" or "Featured" tags, or latest 5)
-    featured_query = Movie.query
-    featured_movies = featured_query.filter(
-        (Movie.tags.ilike('%Trending%')) | 
-        (Movie.tags.ilike('%Featured%')) |
-        (Movie.tags.ilike('%Popular%'))
-    ).order_by(Movie.created_at.desc()).limit(5).all()
-    
-    # If no tagged movies or less than 3, use latest 5 movies
-    if not featured_movies or len(featured_movies) < 3:
-        featured_movies = Movie.query.order_by(Movie.created_at.desc()).limit(5).all()
+    next_cursor = None
+    if q:
+        # Full-text search over title, description, genre, tags and language
+        movies = search_movies(q, genre, limit=SEARCH_RESULTS_LIMIT)
+    elif genre:
+        # First page of the genre; the grid scrolls in the rest from /api/movies
+        movies, next_cursor = movie_page(Movie.query.filter(has_genre(genre)))
+    else:
+        movies = shelves['movies']
+        next_cursor = shelves['movies_next_cursor']
     
     # Crunchyroll-style content sections (only if not searching/filtering)
     continue_watching = []
@@ -54,56 +68,24 @@ def home():
     popular_this_week = []
     
     if not q and not genre:
-        # Continue Watching (user's watchlist)
+        recently_added = shelves['recently_added']
+        popular_this_week = shelves['popular_this_week']
+        genre_sections = shelves['genre_sections']
+
+        # Continue Watching and Top Picks are personal, cached per user
         if current_user.is_authenticated:
-            watchlist_entries = Watchlist.query.options(joinedload(Watchlist.movie)).filter_by(
-                user_id=current_user.id
-            ).order_by(Watchlist.id.desc()).limit(10).all()
-            continue_watching = [entry.movie for entry in watchlist_entries if entry.movie]
-        
-        # Recently Added (latest movies)
-        recently_added = Movie.query.order_by(Movie.created_at.desc()).limit(10).all()
-        
-        # Popular This Week (high-rated movies)
-        popular_this_week = Movie.query.filter(
-            Movie.imdb_rating.isnot(None)
-        ).order_by(Movie.imdb_rating.desc()).limit(10).all()
-        
-        # Top Picks for You (based on user's watchlist genres or popular movies)
-        if current_user.is_authenticated and continue_watching:
-            # Get genres from user's watchlist
-            user_genres = set()
-            for movie in continue_watching:
-                if movie.genre:
-                    user_genres.update([g.strip() for g in movie.genre.split('/')])
-            
-            if user_genres:
-                # Find movies in user's preferred genres
-                genre_filter = Movie.genre.ilike('%' + '%'.join(list(user_genres)[:2]) + '%')
-                top_picks = Movie.query.filter(genre_filter).order_by(
-                    Movie.imdb_rating.desc()
-                ).limit(10).all()
-        
+            personal = get_user_shelves(current_user.id)
+            continue_watching = personal['continue_watching']
+            top_picks = personal['top_picks']
+
         if not top_picks:
             # Fallback: high-rated recent movies
-            top_picks = Movie.query.filter(
-                Movie.imdb_rating.isnot(None)
-            ).order_by(Movie.imdb_rating.desc(), Movie.created_at.desc()).limit(10).all()
-        
-        # Genre-based sections
-        all_genres = db.session.query(Movie.genre).distinct().all()
-        genres_list = [g[0] for g in all_genres if g[0]]
-        
-        for genre_name in genres_list[:6]:  # Top 6 genres
-            genre_movies = Movie.query.filter(
-                Movie.genre.ilike(f'%{genre_name}%')
-            ).order_by(Movie.imdb_rating.desc(), Movie.created_at.desc()).limit(10).all()
-            if genre_movies:
-                genre_sections[genre_name] = genre_movies
+            top_picks = shelves['top_picks']
     
     return render_template('browse.html', 
                          movies=movies, 
-                         featured_movies=featured_movies, 
+                         next_cursor=next_cursor,
+                         featured_movies=shelves['featured_movies'], 
                          q=q, 
                          genre=genre,
                          continue_watching=continue_watching,
@@ -113,41 +95,124 @@ def home():
                          popular_this_week=popular_this_week)
 
 
+def movie_json(m):
+    """Search-result payload for a Movie (or a MovieCard / autocomplete MovieSnapshot)"""
+    return {
+        'id': m.id,
+        'title': m.title,
+        'genre': m.genre,
+        'poster_url': poster_src(m),
+        'poster_srcset': poster_srcset(m),
+        'imdb_rating': float(m.imdb_rating) if m.imdb_rating else None,
+        'community_rating': getattr(m, 'community_rating', None),
+        'review_count': getattr(m, 'review_count', None) or 0,
+        'description': m.description[:150] + '...' if m.description and len(m.description) > 150 else (m.description or '')
+    }
+
+
+def grid_movie_json(m):
+    """Browse-grid payload for a Movie: the search payload plus trailer and premium flag"""
+    return {
+        **movie_json(m),
+        'trailer_url': m.trailer_url,
+        'premium': m.is_premium
+    }
+
+
+def catalog_statement(genre='', sort=''):
+    """SELECT of the catalog for the search API without a query: genre filter and community sort"""
+    statement = db.select(Movie)
+    if genre:
+        statement = statement.where(has_genre(genre))
+    if sort == 'community':
+        # Average from the denormalized aggregates: no join against reviews
+        avg = Movie.rating_sum * 1.0 / db.func.nullif(Movie.review_count, 0)
+        statement = statement.order_by(avg.desc().nulls_last(), Movie.review_count.desc())
+    return statement
+
+
 @bp.route('/api/search', endpoint='api_search')
+@conditional()
 def api_search():
     """API endpoint for real-time search"""
     q = request.args.get('q', '').strip()
     genre = request.args.get('genre', '').strip()
     limit = request.args.get('limit', 20, type=int)
-    
-    query = Movie.query
+    mode = request.args.get('mode', '').strip()
+
+    if mode == 'suggest':
+        # Typeahead: answered from the in-memory index, no SQL
+        index = get_autocomplete_index()
+        suggestions, movies = index.suggest(q, limit=min(limit, 10), genre=genre)
+        return jsonify({
+            'movies': [movie_json(m) for m in movies],
+            'count': len(movies),
+            'suggestions': suggestions,
+            'popular_genres': index.popular_genres()
+        })
+
+    sort = request.args.get('sort', '').strip()
+
     if q:
-        query = query.filter(
-            (Movie.title.ilike(f"%{q}%")) |
-            (Movie.description.ilike(f"%{q}%")) |
-            (Movie.genre.ilike(f"%{q}%"))
-        )
-    if genre:
-        query = query.filter(Movie.genre.ilike(f"%{genre}%"))
-    
-    movies = query.order_by(Movie.created_at.desc()).limit(limit).all()
+        # Ranked by relevance (BM25, title hits weighted highest)
+        movies = search_movies(q, genre, limit=limit)
+        if sort == 'community':
+            movies.sort(key=lambda m: m.community_rating or 0, reverse=True)
+    else:
+        statement = catalog_statement(genre, sort).order_by(Movie.created_at.desc()).limit(limit)
+        movies = db.session.scalars(statement).all()
     
     # Get popular searches (most searched genres)
-    popular_genres = db.session.query(Movie.genre).distinct().limit(8).all()
-    popular_genres = [g[0] for g in popular_genres if g[0]]
+    popular_genres = db.session.scalars(POPULAR_GENRES).all()
     
     results = {
-        'movies': [{
-            'id': m.id,
-            'title': m.title,
-            'genre': m.genre,
-            'poster_url': m.poster_url or url_for('static', filename='images/default_poster.jpg'),
-            'imdb_rating': float(m.imdb_rating) if m.imdb_rating else None,
-            'description': m.description[:150] + '...' if m.description and len(m.description) > 150 else (m.description or '')
-        } for m in movies],
+        'movies': [movie_json(m) for m in movies],
         'count': len(movies),
         'popular_genres': popular_genres
     }
     
     return jsonify(results)
 
+
+@bp.route('/api/movies', endpoint='api_movies')
+@conditional()
+def api_movies():
+    """Infinite-scroll pages of the browse grid (keyset on created_at, id)"""
+    genre = request.args.get('genre', '').strip()
+    cursor = request.args.get('cursor', '').strip() or None
+    per_page = request.args.get('per_page', 24, type=int)
+
+    query = Movie.query
+    if genre:
+        query = query.filter(has_genre(genre))
+    try:
+        movies, next_cursor = movie_page(query, cursor, per_page)
+    except InvalidCursor:
+        abort(400)
+
+    return jsonify({
+        'movies': [grid_movie_json(m) for m in movies],
+        'next_cursor': next_cursor
+    })
+
+
+def shelves_json(shelves):
+    """Payload of /api/shelves from get_global_shelves()"""
+    return {
+        'featured_movies': [movie_json(m) for m in shelves['featured_movies']],
+        'recently_added': [movie_json(m) for m in shelves['recently_added']],
+        'popular_this_week': [movie_json(m) for m in shelves['popular_this_week']],
+        'top_picks': [movie_json(m) for m in shelves['top_picks']],
+        'genre_sections': {
+            genre: [movie_json(m) for m in movies] for genre, movies in shelves['genre_sections'].items()
+        },
+        'movies': [movie_json(m) for m in shelves['movies']],
+        'movies_next_cursor': shelves['movies_next_cursor'],
+    }
+
+
+@bp.route('/api/shelves', endpoint='api_shelves')
+@conditional(cache_token)
+def api_shelves():
+    """The home page shelves shared by every visitor, as JSON"""
+    return jsonify(shelves_json(get_global_shelves()))
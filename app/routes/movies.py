@@ -1,21 +1,62 @@
 """Movie-related routes (detail, reviews, watchlist)"""
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort
 from flask_login import login_required, current_user
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
 from app import db
 from app.models import Movie, Review, Watchlist
-from app.utils import subscription_required
+from app.utils import subscription_required, get_movie_or_404, is_subscribed
+from app import shelves, reviews, catalog, collab
+from app.pagination import review_page, InvalidCursor, REVIEW_PAGE_SIZE
 
 bp = Blueprint('movies', __name__, url_prefix='')
 
 
+def _viewer_access():
+    """Whether the viewer may open premium titles; part of the detail page's ETag
+    so a lapsed subscription never revalidates a cached premium page"""
+    if not current_user.is_authenticated:
+        return 'anon'
+    return 'full' if current_user.is_admin or is_subscribed(current_user) else 'free'
+
+
 @bp.route('/movie/<int:movie_id>', endpoint='movie_detail')
+@catalog.conditional(_viewer_access, catalog.collab_version, personal=True)
 @subscription_required
 def movie_detail(movie_id):
     """Movie detail page"""
-    movie = Movie.query.get_or_404(movie_id)
-    reviews = Review.query.filter_by(movie_id=movie.id).order_by(Review.timestamp.desc()).all()
-    return render_template('movie_detail.html', movie=movie, reviews=reviews)
+    movie = get_movie_or_404(movie_id)
+    # First page inline, reviewers loaded in the same query; the rest via movie_reviews
+    reviews, next_cursor = review_page(
+        Review.query.options(joinedload(Review.user)).filter_by(movie_id=movie.id)
+    )
+    also_saved = collab.also_saved(movie.id)  # precomputed by `flask collab refresh`
+    return render_template('movie_detail.html', movie=movie, reviews=reviews, next_cursor=next_cursor,
+                           also_saved=also_saved)
+
+
+@bp.route('/movie/<int:movie_id>/reviews', endpoint='movie_reviews')
+@subscription_required
+def movie_reviews(movie_id):
+    """Further pages of a movie's reviews (JSON)"""
+    cursor = request.args.get('cursor', '').strip() or None
+    per_page = request.args.get('per_page', REVIEW_PAGE_SIZE, type=int)
+    try:
+        reviews, next_cursor = review_page(
+            Review.query.options(joinedload(Review.user)).filter_by(movie_id=movie_id), cursor, per_page
+        )
+    except InvalidCursor:
+        abort(400)
+    return jsonify({
+        'reviews': [{
+            'id': r.id,
+            'username': r.user.username if r.user else 'User',
+            'rating': r.rating,
+            'content': r.content,
+            'timestamp': r.timestamp.strftime('%B %d, %Y at %I:%M %p')
+        } for r in reviews],
+        'next_cursor': next_cursor
+    })
 
 
 @bp.route('/add_review/<int:movie_id>', methods=['GET', 'POST'], endpoint='add_review')
@@ -41,9 +82,10 @@ def add_review(movie_id):
             flash('Rating must be between 1 and 10.', 'warning')
             return redirect(url_for('movies.add_review', movie_id=movie.id))
 
-        new_review = Review(content=content, rating=rating_val, user_id=current_user.id, movie_id=movie.id)
-        db.session.add(new_review)
+        # Inserts the review and updates the movie's rating aggregates in one transaction
+        reviews.add_review(movie.id, current_user.id, content, rating_val)
         db.session.commit()
+        catalog.bump(content=False)
         flash('Your review has been added!', 'success')
         return redirect(url_for('movie_detail', movie_id=movie.id))
 
@@ -60,7 +102,14 @@ def add_to_watchlist(movie_id):
     if not exists:
         entry = Watchlist(user_id=current_user.id, movie_id=movie_id)
         db.session.add(entry)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # a concurrent request (double click) saved it first
+            db.session.rollback()
+            exists = True
+    if not exists:
+        shelves.invalidate_user(current_user.id)
         flash("Added to Watchlist!", "success")
     else:
         flash("Already in watchlist!", "info")
@@ -76,6 +125,7 @@ def remove_from_watchlist(movie_id):
     if item:
         db.session.delete(item)
         db.session.commit()
+        shelves.invalidate_user(current_user.id)
         flash("Removed from watchlist!", "success")
 
     return redirect(url_for('watchlist'))
@@ -2,10 +2,11 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
-import stripe
+import json
 from app import db
 from app.models import SubscriptionPlan, UserSubscription, Payment
 from app.utils import get_active_subscription
+from app import entitlements, payments, webhooks
 
 bp = Blueprint('subscriptions', __name__, url_prefix='')
 
@@ -25,33 +26,25 @@ def subscribe(plan_id):
     """Subscribe to a plan"""
     plan = SubscriptionPlan.query.get_or_404(plan_id)
     if request.method == 'POST':
-        # If Stripe is configured, start checkout
-        stripe_secret_key = current_app.config.get('STRIPE_SECRET_KEY')
-        if stripe_secret_key:
-            stripe.api_key = stripe_secret_key
+        # If Stripe is configured, start checkout; access is granted by the webhook
+        stripe_client = payments.client()
+        if stripe_client is not None:
             try:
-                session = stripe.checkout.Session.create(
-                    payment_method_types=['card'],
-                    line_items=[{
-                        'price_data': {
-                            'currency': 'usd',
-                            'product_data': {
-                                'name': plan.name
-                            },
-                            'unit_amount': int(plan.price * 100)
-                        },
-                        'quantity': 1
-                    }],
-                    mode='payment',
-                    success_url=url_for('subscriptions.subscriptions', _external=True) + '?session_id={CHECKOUT_SESSION_ID}',
-                    cancel_url=url_for('subscriptions.subscriptions', _external=True),
-                    metadata={'user_id': current_user.id, 'plan_id': plan.id}
+                session = stripe_client.create_checkout_session(
+                    plan, current_user.id,
+                    success_url=url_for('subscriptions', _external=True) + '?session_id={CHECKOUT_SESSION_ID}',
+                    cancel_url=url_for('subscriptions', _external=True),
                 )
-                return redirect(session.url)
-            except Exception as e:
-                print('Stripe error:', e)
+            except payments.PaymentsBusy:
+                flash('Payments are busy right now, please try again in a moment.', 'warning')
+                return redirect(url_for('subscribe', plan_id=plan.id))
+            except payments.PaymentError as e:
+                current_app.logger.warning('Stripe checkout failed: %s', e)
+                flash('We could not reach the payment provider. You have not been charged; please try again.', 'danger')
+                return redirect(url_for('subscribe', plan_id=plan.id))
+            return redirect(session['url'], code=303)
 
-        # Fallback (mock) subscription mode if stripe not configured
+        # Mock subscription mode when Stripe is not configured (development)
         now = datetime.utcnow()
         end = now + timedelta(days=plan.duration_days)
         sub = UserSubscription(user_id=current_user.id, plan_id=plan.id, start_date=now, end_date=end)
@@ -60,6 +53,7 @@ def subscribe(plan_id):
         payment = Payment(user_id=current_user.id, amount=plan.price, status='Completed')
         db.session.add(payment)
         db.session.commit()
+        entitlements.invalidate(current_user.id)
         flash(f'Subscribed to {plan.name} successfully! 🎉', 'success')
         return redirect(url_for('dashboard'))
     return render_template('subscribe_confirm.html', plan=plan)
@@ -71,12 +65,14 @@ def cancel_subscription():
     """Cancel active subscription"""
     active = get_active_subscription(current_user)
     if active:
-        active.end_date = datetime.utcnow()
+        # active is a cached snapshot; end the underlying row
+        UserSubscription.query.filter_by(id=active.id).update({UserSubscription.end_date: datetime.utcnow()})
         db.session.commit()
+        entitlements.invalidate(current_user.id)
         flash('Subscription canceled. You will continue to have access until the period ends.', 'info')
     else:
         flash('No active subscription found.', 'warning')
-    return redirect(url_for('subscriptions.subscriptions'))
+    return redirect(url_for('subscriptions'))
 
 
 @bp.route('/stripe/webhook', methods=['POST'])
@@ -85,39 +81,21 @@ def stripe_webhook():
     webhook_secret = current_app.config.get('STRIPE_WEBHOOK_SECRET')
     if not webhook_secret:
         return 'Webhook not configured', 400
-    
-    stripe_secret_key = current_app.config.get('STRIPE_SECRET_KEY')
-    if stripe_secret_key:
-        stripe.api_key = stripe_secret_key
-    
-    payload = request.data
-    sig_header = request.headers.get('Stripe-Signature')
+
+    import stripe  # the SDK is only loaded once a webhook secret is configured and an event arrives
+    payload = request.get_data(as_text=True)
+    sig_header = request.headers.get('Stripe-Signature', '')
     try:
-        event = stripe.Webhook.construct_event(payload, sig_header, webhook_secret)
-    except ValueError as e:
-        return '', 400
-    except stripe.error.SignatureVerificationError:
+        stripe.WebhookSignature.verify_header(
+            payload, sig_header, webhook_secret, stripe.Webhook.DEFAULT_TOLERANCE
+        )
+        event = json.loads(payload)
+        event_id, event_type = event['id'], event['type']
+    except (ValueError, KeyError, TypeError, stripe.error.SignatureVerificationError):
         return '', 400
 
-    # Handle the checkout.session.completed event
-    if event['type'] == 'checkout.session.completed':
-        session = event['data']['object']
-        metadata = session.get('metadata', {}) or {}
-        user_id = int(metadata.get('user_id', 0))
-        plan_id = int(metadata.get('plan_id', 0))
-        # Create the UserSubscription and Payment records
-        try:
-            plan = SubscriptionPlan.query.get(plan_id)
-            if plan and user_id:
-                now = datetime.utcnow()
-                end = now + timedelta(days=plan.duration_days)
-                s = UserSubscription(user_id=user_id, plan_id=plan.id, start_date=now, end_date=end)
-                db.session.add(s)
-                p = Payment(user_id=user_id, amount=plan.price, status='Completed')
-                db.session.add(p)
-                db.session.commit()
-        except Exception as e:
-            print('Error creating subscription from webhook:', e)
-
+    # Acknowledge fast: the event is applied by the webhook worker (app/webhooks.py).
+    # A redelivered event id is already stored and is simply acknowledged again.
+    webhooks.enqueue(event_id, event_type, payload)
     return '', 200
 
@@ -1,13 +1,11 @@
 """User-related routes (dashboard, profile, edit profile)"""
-import os
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
 from sqlalchemy.orm import joinedload
-from werkzeug.utils import secure_filename
-from datetime import datetime
 from app import db
 from app.models import Watchlist
 from app.utils import get_active_subscription, allowed_file
+from app import shelves, users, images
 
 bp = Blueprint('user', __name__, url_prefix='')
 
@@ -36,7 +34,9 @@ def profile(username):
     entries = Watchlist.query.options(joinedload(Watchlist.movie)).filter_by(user_id=current_user.id).all()
     movies = [e.movie for e in entries if e.movie]
     active = get_active_subscription(current_user)
-    return render_template('profile.html', user=current_user, watchlist=movies, active=active)
+    # profile.html lists user.reviews, so it needs the real row
+    user = users.get_user(current_user.id)
+    return render_template('profile.html', user=user, watchlist=movies, active=active)
 
 
 @bp.route('/edit_profile', methods=['GET', 'POST'])
@@ -44,22 +44,28 @@ def profile(username):
 def edit_profile():
     """Edit user profile"""
     if request.method == 'POST':
-        username = request.form.get('username', current_user.username).strip()
+        user = users.get_user(current_user.id)
+        username = request.form.get('username', user.username).strip()
         file = request.files.get('profile_pic')
 
         if username:
-            current_user.username = username
+            user.username = username
 
+        new_pic = None
         if file and file.filename != '' and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            _, ext = os.path.splitext(filename)
-            filename = f"user_{current_user.id}_{int(datetime.utcnow().timestamp())}{ext.lower()}"
-            file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
-            current_user.profile_pic = filename
+            new_pic = images.save_upload(file, current_app.config['UPLOAD_FOLDER'])
+            if new_pic != user.profile_pic:
+                user.profile_pic = new_pic
+                user.profile_pic_widths = None
+            else:
+                new_pic = None  # same picture uploaded again, renditions already exist
 
         db.session.commit()
+        users.invalidate(user.id)
+        if new_pic:
+            images.process_avatar(user.id, new_pic)
         flash('Profile updated!', 'success')
-        return redirect(url_for('profile', username=current_user.username))
+        return redirect(url_for('profile', username=user.username))
 
     return render_template('edit_profile.html', user=current_user)
 
@@ -72,5 +78,6 @@ def remove_watchlist(movie_id):
     if item:
         db.session.delete(item)
         db.session.commit()
+        shelves.invalidate_user(current_user.id)
     return redirect(url_for('profile', username=current_user.username))
 
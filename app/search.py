@@ -0,0 +1,168 @@
+"""Full-text search over the movie catalog (SQLite FTS5 with an ILIKE fallback)"""
+import re
+from flask import current_app
+from app import db
+from app.models import Movie
+from app.taxonomy import has_genre, slugify
+
+
+FTS_TABLE = 'movie_fts'
+FTS_COLUMNS = ('title', 'description', 'genre', 'tags', 'language')
+
+# bm25() weights, in FTS_COLUMNS order - a hit in the title counts the most
+FTS_WEIGHTS = (10.0, 1.0, 4.0, 2.0, 2.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _state():
+    """Per-app search state (whether the FTS table is usable)"""
+    return current_app.extensions.setdefault('search_index', {'fts': None})
+
+
+def fts_enabled() -> bool:
+    """True when the database is SQLite and the FTS5 index table exists"""
+    state = _state()
+    if state['fts'] is None:
+        if db.engine.dialect.name != 'sqlite':
+            state['fts'] = False
+        else:
+            row = db.session.execute(
+                db.text("SELECT name FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': FTS_TABLE}
+            ).first()
+            state['fts'] = row is not None
+    return state['fts']
+
+
+def ensure_search_index():
+    """Create the FTS5 table if missing and backfill it from the movie table"""
+    if db.engine.dialect.name != 'sqlite':
+        _state()['fts'] = False
+        return
+    exists = db.session.execute(
+        db.text("SELECT name FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': FTS_TABLE}
+    ).first()
+    if not exists:
+        try:
+            db.session.execute(db.text(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                f"{', '.join(FTS_COLUMNS)}, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            ))
+        except Exception as e:
+            # SQLite builds without FTS5 keep using the ILIKE path
+            db.session.rollback()
+            current_app.logger.warning('Full-text search unavailable: %s', e)
+            _state()['fts'] = False
+            return
+        db.session.commit()
+        _state()['fts'] = True
+        rebuild_search_index()
+    else:
+        _state()['fts'] = True
+
+
+def rebuild_search_index():
+    """Re-populate the whole FTS table from the movie table"""
+    if not fts_enabled():
+        return
+    db.session.execute(db.text(f"DELETE FROM {FTS_TABLE}"))
+    db.session.execute(db.text(
+        f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) "
+        f"SELECT id, {', '.join(FTS_COLUMNS)} FROM movie"
+    ))
+    db.session.commit()
+
+
+def index_movie(movie):
+    """Add or refresh one movie in the index (caller commits)"""
+    if not fts_enabled():
+        return
+    remove_movie(movie.id)
+    db.session.execute(
+        db.text(
+            f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) "
+            f"VALUES (:id, {', '.join(':' + c for c in FTS_COLUMNS)})"
+        ),
+        {'id': movie.id, **{c: getattr(movie, c) or '' for c in FTS_COLUMNS}}
+    )
+
+
+def remove_movie(movie_id):
+    """Drop one movie from the index (caller commits)"""
+    if not fts_enabled():
+        return
+    db.session.execute(db.text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {'id': movie_id})
+
+
+def build_match_query(q: str):
+    """Turn user input into a safe FTS5 MATCH expression, prefix-matching the last word"""
+    tokens = _TOKEN_RE.findall(q.lower())
+    if not tokens:
+        return None
+    terms = [f'"{t}"' for t in tokens[:-1]]
+    terms.append(f'"{tokens[-1]}"*')
+    return ' '.join(terms)
+
+
+def _ilike_filter(query, q):
+    return query.filter(
+        (Movie.title.ilike(f"%{q}%")) |
+        (Movie.description.ilike(f"%{q}%")) |
+        (Movie.genre.ilike(f"%{q}%"))
+    )
+
+
+def search_statement(q: str, genre: str = '', limit=None, fts=True):
+    """(statement, ranked) behind search_movies
+
+    With ranked=True the statement selects the matching movie ids from the
+    FTS index, best first (see movies_by_id); otherwise it selects Movie rows.
+    """
+    match = build_match_query(q) if fts else None
+    if match is None:
+        # Non-SQLite databases (or no indexable words): plain substring search
+        query = _ilike_filter(db.select(Movie), q)
+        if genre:
+            query = query.filter(has_genre(genre))
+        query = query.order_by(Movie.created_at.desc())
+        if limit:
+            query = query.limit(limit)
+        return query, False
+
+    weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+    sql = (
+        f"SELECT m.id FROM {FTS_TABLE} f JOIN movie m ON m.id = f.rowid "
+        f"WHERE {FTS_TABLE} MATCH :match"
+    )
+    params = {'match': match}
+    if genre:
+        sql += (
+            " AND EXISTS (SELECT 1 FROM movie_genre mg JOIN genre g ON g.id = mg.genre_id"
+            " WHERE mg.movie_id = m.id AND g.slug = :genre)"
+        )
+        params['genre'] = slugify(genre)
+    sql += f" ORDER BY bm25({FTS_TABLE}, {weights}), m.created_at DESC"
+    if limit:
+        sql += " LIMIT :limit"
+        params['limit'] = int(limit)
+    return db.text(sql).bindparams(**params), True
+
+
+def movies_by_id(ids, movies):
+    """movies (loaded for ids) in the order of ids"""
+    by_id = {m.id: m for m in movies}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def search_movies(q: str, genre: str = '', limit=None):
+    """Movies matching q (and optional genre), best matches first"""
+    statement, ranked = search_statement(q, genre, limit, fts_enabled())
+    if not ranked:
+        return db.session.scalars(statement).all()
+    ids = db.session.scalars(statement).all()
+    if not ids:
+        return []
+    return movies_by_id(ids, db.session.scalars(db.select(Movie).where(Movie.id.in_(ids))))
@@ -0,0 +1,302 @@
+"""Pre-fork production server
+
+    python run.py --bind 0.0.0.0:8000 --workers 4 --threads 4
+
+The master process builds the app once (create_app() in run.py), warms it
+with startup.warm() and only then forks the workers.  Every worker starts
+with the route modules imported and the search state, autocomplete index,
+home page shelves and static manifest built, and shares that memory with
+the master copy-on-write (gc.freeze() keeps the collector from touching
+it).  Workers accept from one shared listening socket and serve up to
+--threads requests at a time.  After --max-requests requests, plus up to
+--max-requests-jitter so they don't all restart together, a worker finishes
+what it is serving and exits, and the master forks a fresh one.
+
+Signals to the master:
+
+- HUP: graceful reload.  The new code is first built in a throwaway
+  interpreter (run.py --check); if that fails the old workers keep serving.
+  Otherwise the master re-executes itself with the same pid and listening
+  socket, warms up, forks new workers and only then tells the old ones to
+  finish their requests and exit.
+- TERM, INT: graceful shutdown; workers get --graceful-timeout seconds to
+  finish their requests before they are killed.  A second INT kills them.
+
+Each worker also starts the Stripe webhook thread (WEBHOOK_WORKER=thread)
+right away, so queued events and due retries are picked up even after the
+worker that received them was recycled.
+
+Connections are closed after each response (HTTP/1.0), so a slow or idle
+client only holds a thread for one request; keep-alive belongs in the proxy.
+"""
+import argparse
+import gc
+import os
+import random
+import select
+import signal
+import socket
+import subprocess
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+from app import db, webhooks
+from app.startup import warm
+
+LISTEN_FD = 'STREAMVERSE_LISTEN_FD'      # set across a reload: the inherited listening socket
+OLD_WORKERS = 'STREAMVERSE_OLD_WORKERS'  # and the old workers to retire once the new ones run
+CLIENT_TIMEOUT = 30  # seconds a client gets to send its request
+BACKLOG = 2048
+
+
+def _log(message):
+    print(f'[{os.getpid()}] {message}', flush=True)
+
+
+def listen(bind):
+    """The listening socket for "host:port", or the one inherited across a reload"""
+    fd = os.environ.pop(LISTEN_FD, None)
+    if fd is not None:
+        sock = socket.socket(fileno=int(fd))
+    else:
+        host, _, port = bind.rpartition(':')
+        host = host.strip('[]') or '0.0.0.0'
+        family = socket.AF_INET6 if ':' in host else socket.AF_INET
+        sock = socket.create_server((host, int(port)), family=family, backlog=BACKLOG)
+    sock.setblocking(False)  # workers race for each connection; the losers get EAGAIN
+    return sock
+
+
+# -- worker ---------------------------------------------------------------------
+
+class _RequestHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.0'  # one request per connection
+    timeout = CLIENT_TIMEOUT
+
+    def log_request(self, code='-', size='-'):
+        if self.server.access_log:
+            super().log_request(code, size)
+
+
+def _handle(server, conn, address, slots):
+    try:
+        conn.setblocking(True)
+        server.finish_request(conn, address)
+    except Exception:
+        server.handle_error(conn, address)
+    finally:
+        server.shutdown_request(conn)
+        slots.release()
+
+
+def work(app, sock, threads, limit, access_log):
+    """A worker's accept loop; returns once told to stop, after `limit` requests (0: no limit) or without a master"""
+    master = os.getppid()
+    stopping = []
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda signum, frame: stopping.append(signum))
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    if 'metrics' in app.extensions:
+        app.extensions['metrics'].reset()  # this process's numbers, not the master's warm-up
+    webhooks.start_worker(app)  # threads don't survive fork; poll for due events from the start
+
+    host, port = sock.getsockname()[:2]
+    server = BaseWSGIServer(host, port, app, handler=_RequestHandler, fd=sock.fileno())
+    server.multithread, server.multiprocess = threads > 1, True
+    server.access_log = access_log
+    slots = BoundedSemaphore(threads)  # a worker with every thread busy leaves connections to the others
+    served = 0
+    with ThreadPoolExecutor(threads, thread_name_prefix='request') as pool:
+        while not stopping and os.getppid() == master and not (limit and served >= limit):
+            if not slots.acquire(timeout=1):
+                continue
+            conn = None
+            try:
+                if select.select([server.socket], [], [], 1)[0]:
+                    conn, address = server.socket.accept()
+            except (BlockingIOError, ConnectionAbortedError, InterruptedError):
+                pass  # another worker took it
+            if conn is None:
+                slots.release()
+                continue
+            served += 1
+            pool.submit(_handle, server, conn, address, slots)
+        server.socket.close()
+    return served
+
+
+# -- master ---------------------------------------------------------------------
+
+class PreforkServer:
+    """The master process: forks the workers, replaces those that exit, reloads and shuts down"""
+
+    def __init__(self, app, sock, workers, threads=4, max_requests=0, max_requests_jitter=0,
+                 graceful_timeout=30, access_log=False):
+        self.app = app
+        self.sock = sock
+        self.size = workers
+        self.threads = threads
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.access_log = access_log
+        self.workers = set()
+        self.retiring = {}  # pid -> when to SIGKILL it
+        self.signals = []
+        self.reload_check = None  # the `run.py --check` process while a reload is pending
+        self.stopping = False
+
+    def run(self):
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_w, False)
+        signal.set_wakeup_fd(self._wake_w)
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(signum, lambda signum, frame: self.signals.append(signum))
+
+        # Forked workers share what is allocated so far; keep the collector off it, and no pooled connections
+        with self.app.app_context():
+            for engine in db.engines.values():
+                engine.dispose()
+        gc.collect()
+        gc.freeze()
+
+        while len(self.workers) < self.size:
+            self._spawn()
+        old = [int(pid) for pid in os.environ.pop(OLD_WORKERS, '').split(',') if pid]
+        if old:
+            self._retire(old)
+            _log(f"✅ Reloaded; retiring {len(old)} old workers")
+
+        while self.workers or self.retiring or not self.stopping:
+            if select.select([self._wake_r], [], [], 1)[0]:
+                os.read(self._wake_r, 512)
+            while self.signals:
+                self._on_signal(self.signals.pop(0))
+            self._reap()
+            if not self.stopping:
+                while len(self.workers) < self.size:
+                    self._spawn()
+                self._check_reload()
+            self._kill_overdue()
+        self.sock.close()
+        _log("✅ Stopped")
+
+    def _spawn(self):
+        limit = self.max_requests + random.randint(0, self.max_requests_jitter) if self.max_requests else 0
+        pid = os.fork()
+        if pid:
+            self.workers.add(pid)
+            return
+        code = 1
+        try:
+            signal.set_wakeup_fd(-1)
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            work(self.app, self.sock, self.threads, limit, self.access_log)
+            code = 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def _retire(self, pids):
+        """Ask workers to finish their requests and exit"""
+        deadline = time.monotonic() + self.graceful_timeout
+        for pid in pids:
+            self.workers.discard(pid)
+            self.retiring.setdefault(pid, deadline)
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _kill_overdue(self, force=False):
+        now = time.monotonic()
+        for pid, deadline in self.retiring.items():
+            if force or now >= deadline:
+                self.retiring[pid] = float('inf')
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    def _reap(self):
+        # Only our workers: waiting on any child would also reap the reload check
+        for pid in [*self.workers, *self.retiring]:
+            try:
+                done, status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done, status = pid, 0
+            if not done:
+                continue
+            self.workers.discard(pid)
+            self.retiring.pop(pid, None)
+            code = os.waitstatus_to_exitcode(status)
+            if code and not self.stopping:
+                _log(f"Worker {pid} exited with status {code}")
+
+    def _on_signal(self, signum):
+        if signum == signal.SIGHUP and not self.stopping and self.reload_check is None:
+            _log("Reloading: building the new code")
+            self.reload_check = subprocess.Popen([sys.executable, *sys.orig_argv[1:], '--check'])
+        elif signum in (signal.SIGTERM, signal.SIGINT):
+            if self.stopping and signum == signal.SIGINT:
+                self._kill_overdue(force=True)
+            elif not self.stopping:
+                _log("Shutting down")
+                self.stopping = True
+                self._retire(list(self.workers))
+
+    def _check_reload(self):
+        if self.reload_check is None or self.reload_check.poll() is None:
+            return
+        code, self.reload_check = self.reload_check.returncode, None
+        if code:
+            _log(f"Reload aborted: the new code failed to start (exit {code}); still serving the old code")
+            return
+        # Same pid, so the old workers stay our children; the new master retires them once it has its own
+        os.environ[LISTEN_FD] = str(self.sock.fileno())
+        os.environ[OLD_WORKERS] = ','.join(str(pid) for pid in [*self.workers, *self.retiring])
+        self.sock.set_inheritable(True)
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)  # ignored until the new master is ready for it
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.execv(sys.executable, [sys.executable, *sys.orig_argv[1:]])
+
+
+def main(app, argv=None):
+    """Command line of run.py"""
+    env = os.environ.get
+    parser = argparse.ArgumentParser(description='Serve StreamVerse from pre-forked worker processes')
+    parser.add_argument('--bind', default=env('BIND', '127.0.0.1:8000'), help='host:port to listen on')
+    parser.add_argument('--workers', type=int, default=int(env('WEB_WORKERS', os.cpu_count() or 1)),
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--threads', type=int, default=int(env('WEB_THREADS', 4)),
+                        help='requests each worker serves at a time')
+    parser.add_argument('--max-requests', type=int, default=int(env('MAX_REQUESTS', 10000)),
+                        help='recycle a worker after this many requests; 0 never')
+    parser.add_argument('--max-requests-jitter', type=int, default=int(env('MAX_REQUESTS_JITTER', 1000)),
+                        help='random extra requests per worker, so they are not all recycled at once')
+    parser.add_argument('--graceful-timeout', type=float, default=float(env('GRACEFUL_TIMEOUT', 30)),
+                        help='seconds a stopping worker gets to finish its requests')
+    parser.add_argument('--access-log', action='store_true', help='log every request')
+    parser.add_argument('--check', action='store_true', help='only build the app, then exit (used by reloads)')
+    args = parser.parse_args(argv)
+    if args.check:
+        print("✅ App builds")
+        return
+
+    sock = listen(args.bind)
+    started = time.perf_counter()
+    warm(app)
+    _log(f"✅ Warmed up in {(time.perf_counter() - started) * 1000:.0f} ms; serving http://{args.bind} "
+         f"with {args.workers} workers x {args.threads} threads")
+    PreforkServer(app, sock, args.workers, args.threads, args.max_requests, args.max_requests_jitter,
+                  args.graceful_timeout, args.access_log).run()
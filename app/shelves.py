@@ -0,0 +1,238 @@
+"""Cached home page shelves
+
+Global shelves (featured, recently added, popular, genre rows, the first
+page of the grid) are built once and shared by every visitor until the TTL expires or
+an admin movie route calls invalidate().  Per-user shelves (continue
+watching, personal top picks from app.collab / app.recommend) live in a separate,
+bounded LRU keyed by user id and are dropped by the watchlist routes via
+invalidate_user().
+
+Rows are stored as MovieCard tuples rather than ORM objects so they can
+outlive the request session that loaded them.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+from app import db, collab, recommend
+from app.models import Movie, Watchlist, Genre, movie_genre
+from app.pagination import movie_page
+from app.taxonomy import FEATURED_TAGS, has_any_tag
+
+
+class MovieCard(namedtuple('MovieCard', [c.key for c in Movie.__table__.columns])):
+    __slots__ = ()
+
+    community_rating = Movie.community_rating
+    is_premium = Movie.is_premium
+
+SHELF_SIZE = 10
+GENRE_SHELVES = 6
+
+
+def to_card(movie):
+    """Detached, immutable copy of a Movie for templates"""
+    return MovieCard(*(getattr(movie, f) for f in MovieCard._fields))
+
+
+def _cards(movies):
+    return [to_card(m) for m in movies]
+
+
+def _cache():
+    return current_app.extensions.setdefault('shelf_cache', {
+        'global': None,          # (built_at, shelves, token)
+        'users': OrderedDict(),  # user_id -> (built_at, shelves, token)
+        'lock': threading.Lock(),
+    })
+
+
+def _fresh(entry, ttl):
+    return entry is not None and time.monotonic() - entry[0] < ttl
+
+
+def genre_shelves(per_genre=SHELF_SIZE, max_genres=GENRE_SHELVES):
+    """Top movies for the largest genres, in one query
+
+    ROW_NUMBER() over each movie_genre partition keeps the best per_genre
+    titles of every genre.  Returns {genre: [Movie, ...]} ordered by genre size.
+    """
+    ranked = select(
+        movie_genre.c.movie_id,
+        movie_genre.c.genre_id,
+        func.row_number().over(
+            partition_by=movie_genre.c.genre_id,
+            order_by=(Movie.imdb_rating.desc().nulls_last(), Movie.created_at.desc()),
+        ).label('rn'),
+        func.count().over(partition_by=movie_genre.c.genre_id).label('genre_size'),
+    ).select_from(movie_genre.join(Movie, Movie.id == movie_genre.c.movie_id)).subquery()
+
+    rows = db.session.query(Movie, Genre.name, ranked.c.genre_size).join(
+        ranked, Movie.id == ranked.c.movie_id
+    ).join(
+        Genre, Genre.id == ranked.c.genre_id
+    ).filter(ranked.c.rn <= per_genre).order_by(
+        ranked.c.genre_size.desc(), Genre.name, ranked.c.rn
+    ).all()
+
+    shelves = {}
+    for movie, genre_name, _ in rows:
+        if genre_name not in shelves and len(shelves) >= max_genres:
+            break
+        shelves.setdefault(genre_name, []).append(movie)
+    return shelves
+
+
+def build_global_shelves():
+    """Run the shelf queries shared by every visitor"""
+    # First page of the "All Movies" grid; the rest is fetched via /api/movies
+    first_page, next_cursor = movie_page(Movie.query)
+
+    # Featured carousel: movies tagged Trending/Featured/Popular, or the latest 5
+    featured = Movie.query.filter(
+        has_any_tag(*FEATURED_TAGS)
+    ).order_by(Movie.created_at.desc()).limit(5).all()
+    if not featured or len(featured) < 3:
+        featured = first_page[:5]
+
+    # Popular This Week (high-rated movies)
+    popular_this_week = Movie.query.filter(
+        Movie.imdb_rating.isnot(None)
+    ).order_by(Movie.imdb_rating.desc()).limit(SHELF_SIZE).all()
+
+    # Generic Top Picks: high-rated recent movies
+    top_picks = Movie.query.filter(
+        Movie.imdb_rating.isnot(None)
+    ).order_by(Movie.imdb_rating.desc(), Movie.created_at.desc()).limit(SHELF_SIZE).all()
+
+    # Genre-based sections, all fetched in a single query
+    genre_sections = {
+        genre_name: _cards(genre_movies)
+        for genre_name, genre_movies in genre_shelves().items()
+    }
+
+    return {
+        'movies': _cards(first_page),
+        'movies_next_cursor': next_cursor,
+        'featured_movies': _cards(featured),
+        'recently_added': _cards(first_page[:SHELF_SIZE]),
+        'popular_this_week': _cards(popular_this_week),
+        'top_picks': _cards(top_picks),
+        'genre_sections': genre_sections,
+    }
+
+
+def build_user_shelves(user_id):
+    """Shelves that depend on who is looking"""
+    watchlist_entries = Watchlist.query.options(joinedload(Watchlist.movie)).filter_by(
+        user_id=user_id
+    ).order_by(Watchlist.id.desc()).limit(SHELF_SIZE).all()
+    continue_watching = [entry.movie for entry in watchlist_entries if entry.movie]
+
+    # Top Picks for You: what similar viewers saved (app.collab), then the
+    # catalog scored against the whole watchlist (app.recommend)
+    watchlist_ids = [movie_id for movie_id, in db.session.query(Watchlist.movie_id).filter_by(user_id=user_id)]
+    saved = set(watchlist_ids)
+    pick_ids = [i for i in collab.picks_for(user_id, SHELF_SIZE) if i not in saved]
+    for movie_id in recommend.top_picks(user_id, watchlist_ids, limit=SHELF_SIZE):
+        if len(pick_ids) >= SHELF_SIZE:
+            break
+        if movie_id not in pick_ids:
+            pick_ids.append(movie_id)
+    by_id = {m.id: m for m in Movie.query.filter(Movie.id.in_(pick_ids))} if pick_ids else {}
+    top_picks = [by_id[i] for i in pick_ids if i in by_id]
+
+    return {
+        'continue_watching': _cards(continue_watching),
+        'top_picks': _cards(top_picks),
+    }
+
+
+def _token(shelves):
+    """Digest of which movies are on which shelf: equal in every process that built the same shelves
+
+    Together with the catalog version (which changes with any movie's
+    details) it identifies the page, so ETags match across workers.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+
+    def feed(name, value):
+        digest.update(f'|{name}:'.encode())
+        if isinstance(value, dict):
+            for key, cards in value.items():
+                feed(f'{name}/{key}', cards)
+        elif isinstance(value, list):
+            digest.update(','.join(str(card.id) for card in value).encode())
+        else:
+            digest.update(str(value).encode())
+
+    for name, value in shelves.items():
+        feed(name, value)
+    return digest.hexdigest()
+
+
+def get_global_shelves():
+    """Global shelves, rebuilt at most once per SHELF_CACHE_TTL seconds"""
+    cache = _cache()
+    ttl = current_app.config.get('SHELF_CACHE_TTL', 300)
+    entry = cache['global']
+    if not _fresh(entry, ttl):
+        with cache['lock']:
+            entry = cache['global']
+            if not _fresh(entry, ttl):
+                shelves = build_global_shelves()
+                entry = (time.monotonic(), shelves, _token(shelves))
+                cache['global'] = entry
+    return entry[1]
+
+
+def get_user_shelves(user_id):
+    """Per-user shelves from a bounded LRU"""
+    cache = _cache()
+    ttl = current_app.config.get('SHELF_CACHE_TTL', 300)
+    max_users = current_app.config.get('SHELF_CACHE_USERS', 1024)
+    with cache['lock']:
+        entry = cache['users'].get(user_id)
+        if _fresh(entry, ttl):
+            cache['users'].move_to_end(user_id)
+            return entry[1]
+    shelves = build_user_shelves(user_id)
+    with cache['lock']:
+        cache['users'][user_id] = (time.monotonic(), shelves, _token(shelves))
+        cache['users'].move_to_end(user_id)
+        while len(cache['users']) > max_users:
+            cache['users'].popitem(last=False)
+    return shelves
+
+
+def cache_token(user_id=None):
+    """Identifies the cached global (or one user's) shelves; None when not cached"""
+    cache = _cache()
+    ttl = current_app.config.get('SHELF_CACHE_TTL', 300)
+    entry = cache['global'] if user_id is None else cache['users'].get(user_id)
+    return entry[2] if _fresh(entry, ttl) else None
+
+
+def invalidate():
+    """Drop every cached shelf (call after the catalog changes)"""
+    cache = _cache()
+    with cache['lock']:
+        cache['global'] = None
+        cache['users'].clear()
+
+
+def invalidate_users():
+    """Drop every user's personal shelves (call after the collaborative-filtering picks change)"""
+    cache = _cache()
+    with cache['lock']:
+        cache['users'].clear()
+
+
+def invalidate_user(user_id):
+    """Drop one user's personal shelves (call after their watchlist changes)"""
+    cache = _cache()
+    with cache['lock']:
+        cache['users'].pop(user_id, None)
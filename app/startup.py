@@ -0,0 +1,80 @@
+"""Cold start: lazily loaded views and CLI groups, and startup timing
+
+create_app() registers every URL with a LazyView, so a worker process only
+imports a route module (and what it pulls in: numpy, the payment client,
+search...) when the first request for one of its endpoints arrives.  CLI
+groups are LazyGroups for the same reason.  create_app() records how long
+each of its phases took in app.extensions['startup']; benchmarks/startup.py
+reports them.
+
+warm() pays those costs up front instead, for servers that start their
+workers from one preloaded app (app/server.py, app/asgi.py).
+"""
+import time
+import click
+from werkzeug.utils import cached_property, import_string
+
+
+class LazyView:
+    """A view function imported from "module.function" on its first call"""
+
+    def __init__(self, import_name):
+        self.__module__, self.__name__ = import_name.rsplit('.', 1)
+        self.import_name = import_name
+
+    @cached_property
+    def view(self):
+        return import_string(self.import_name)
+
+    def __call__(self, *args, **kwargs):
+        return self.view(*args, **kwargs)
+
+
+class LazyGroup(click.Group):
+    """A CLI group whose commands are imported from "module:group" when it is used"""
+
+    def __init__(self, name, import_name, help=None):
+        super().__init__(name, help=help)
+        self.import_name = import_name
+
+    @cached_property
+    def group(self):
+        return import_string(self.import_name)
+
+    def list_commands(self, ctx):
+        return self.group.list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self.group.get_command(ctx, name)
+
+
+class StartupTimer:
+    """Seconds spent in each phase of create_app(), in order"""
+
+    def __init__(self):
+        self.phases = []
+        self._last = time.perf_counter()
+
+    def mark(self, phase):
+        """Close the phase that ends here"""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+
+def warm(app, views=True):
+    """Import the route modules and compile the templates (views=True), and build the caches the first
+    requests would otherwise build"""
+    from app import assets, autocomplete, catalog, search, shelves
+    if views:
+        for view in app.view_functions.values():
+            if isinstance(view, LazyView):
+                view.view
+        for name in app.jinja_env.list_templates(extensions=('html',)):
+            app.jinja_env.get_template(name)  # compiled once, not per worker
+    with app.app_context():
+        search.fts_enabled()
+        catalog.current()
+        autocomplete.get_index()
+        shelves.get_global_shelves()
+    assets.load_manifest(app)
@@ -0,0 +1,147 @@
+"""Normalized genre / tag / language lookups
+
+Movie.genre, Movie.tags and Movie.language stay the display strings the
+admin types in.  Every write also mirrors them into the Genre / Tag /
+Language tables and their join tables, which is what filters query.
+"""
+import re
+from sqlalchemy import exists, and_
+from app import db
+from app.models import Movie, Genre, Tag, Language, movie_genre, movie_tag, movie_language
+
+
+# Genres are written as "Action/Sci-Fi" or "Action, Drama"; tags and languages are comma separated
+GENRE_SEPARATORS = r'[/,]'
+LIST_SEPARATORS = r','
+
+FEATURED_TAGS = ('trending', 'featured', 'popular')
+PREMIUM_TAG = 'premium'
+
+
+def slugify(name: str) -> str:
+    return ' '.join(name.lower().split())
+
+
+def parse_terms(value, separators=LIST_SEPARATORS):
+    """Split a free-text list into unique, trimmed names (first spelling wins)"""
+    names = {}
+    for part in re.split(separators, value or ''):
+        part = part.strip()
+        if part and slugify(part) not in names:
+            names[slugify(part)] = part
+    return list(names.values())
+
+
+def is_premium(tags) -> bool:
+    """Whether a tags string carries the Premium tag, by the same slug rule as has_any_tag(PREMIUM_TAG)"""
+    return any(slugify(name) == PREMIUM_TAG for name in parse_terms(tags))
+
+
+def _get_or_create(model, names, cache=None):
+    """Look up (or insert) one row per name, matched on slug"""
+    cache = {} if cache is None else cache
+    wanted = {slugify(n): n for n in names}
+    missing = [slug for slug in wanted if slug not in cache]
+    if missing:
+        for row in model.query.filter(model.slug.in_(missing)).all():
+            cache[row.slug] = row
+    rows = []
+    for slug, name in wanted.items():
+        if slug not in cache:
+            cache[slug] = model(name=name, slug=slug)
+            db.session.add(cache[slug])
+        rows.append(cache[slug])
+    return rows
+
+
+def sync_movie_taxonomy(movie, caches=None):
+    """Mirror a movie's genre/tags/language strings into the join tables (caller commits)"""
+    caches = caches if caches is not None else {}
+    movie.genre_list = _get_or_create(Genre, parse_terms(movie.genre, GENRE_SEPARATORS), caches.setdefault(Genre, {}))
+    movie.tag_list = _get_or_create(Tag, parse_terms(movie.tags), caches.setdefault(Tag, {}))
+    movie.language_list = _get_or_create(Language, parse_terms(movie.language), caches.setdefault(Language, {}))
+
+
+def _term_ids(model, names, cache):
+    """slug -> id for names, inserting missing terms (cache maps slug -> id)"""
+    wanted = {slugify(n): n for n in names}
+    missing = [slug for slug in wanted if slug not in cache]
+    if missing:
+        for row_id, slug in db.session.query(model.id, model.slug).filter(model.slug.in_(missing)):
+            cache[slug] = row_id
+        new = [model(name=wanted[slug], slug=slug) for slug in missing if slug not in cache]
+        if new:
+            db.session.add_all(new)
+            db.session.flush()
+            cache.update((row.slug, row.id) for row in new)
+    return cache
+
+
+def link_movies(rows, caches=None):
+    """Bulk sync_movie_taxonomy for imports: rows are (movie_id, genre, tags, language) (caller commits)"""
+    caches = caches if caches is not None else {}
+    movie_ids = [row[0] for row in rows]
+    for index, model, table, key, separators in (
+        (1, Genre, movie_genre, 'genre_id', GENRE_SEPARATORS),
+        (2, Tag, movie_tag, 'tag_id', LIST_SEPARATORS),
+        (3, Language, movie_language, 'language_id', LIST_SEPARATORS),
+    ):
+        terms = [(row[0], parse_terms(row[index], separators)) for row in rows]
+        ids = _term_ids(model, {name for _, names in terms for name in names}, caches.setdefault(model, {}))
+        db.session.execute(table.delete().where(table.c.movie_id.in_(movie_ids)))
+        links = [{'movie_id': movie_id, key: ids[slugify(name)]} for movie_id, names in terms for name in names]
+        if links:
+            db.session.execute(table.insert(), links)
+
+
+def backfill_taxonomy(batch_size=500):
+    """Populate the join tables from the existing free-text columns"""
+    caches = {}
+    count = 0
+    last_id = 0
+    while True:
+        batch = Movie.query.filter(Movie.id > last_id).order_by(Movie.id).limit(batch_size).all()
+        if not batch:
+            break
+        for movie in batch:
+            sync_movie_taxonomy(movie, caches)
+        db.session.commit()
+        count += len(batch)
+        last_id = batch[-1].id
+    return count
+
+
+def needs_backfill() -> bool:
+    """True when movies carry genre/tag/language text but no join rows exist yet"""
+    has_links = db.session.query(movie_genre).first() or db.session.query(movie_tag).first() \
+        or db.session.query(movie_language).first()
+    if has_links:
+        return False
+    return db.session.query(Movie.id).filter(
+        Movie.genre.isnot(None) | Movie.tags.isnot(None) | Movie.language.isnot(None)
+    ).first() is not None
+
+
+# -- indexed filters ----------------------------------------------------------
+
+def has_any_genre(*names):
+    """Filter clause: movie is in at least one of the given genres (indexed join, exact names)"""
+    return exists().where(and_(
+        movie_genre.c.movie_id == Movie.id,
+        movie_genre.c.genre_id == Genre.id,
+        Genre.slug.in_([slugify(n) for n in names]),
+    ))
+
+
+def has_genre(name: str):
+    return has_any_genre(name)
+
+
+def has_any_tag(*names):
+    """Filter clause: movie carries at least one of the given tags"""
+    return exists().where(and_(
+        movie_tag.c.movie_id == Movie.id,
+        movie_tag.c.tag_id == Tag.id,
+        Tag.slug.in_([slugify(n) for n in names]),
+    ))
+
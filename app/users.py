@@ -0,0 +1,80 @@
+"""Cached Flask-Login user loader
+
+Every authenticated request used to start with a SELECT on the user
+table just to render the navbar.  load_user() now answers from a bounded
+TTL cache of immutable CachedUser snapshots.  Views that need the ORM row
+(relationships, writes) load it explicitly with get_user() and call
+invalidate() after committing.
+
+Other worker processes cannot reach this cache, so profile changes show
+up there once USER_CACHE_TTL expires.  is_admin is an authorization
+field and is not part of the snapshot: it is read from the database the
+first time a request asks for it, so revoking admin takes effect at once.
+"""
+from collections import namedtuple
+from flask import current_app, g
+from flask_login import UserMixin
+from app import db
+from app.cache import TTLCache
+from app.models import User
+
+
+class CachedUser(UserMixin, namedtuple('CachedUser', 'id email username profile_pic profile_pic_widths')):
+    """Read-only stand-in for User, safe to share between requests"""
+    __slots__ = ()
+
+    @property
+    def is_admin(self):
+        """Fresh from the database, once per request"""
+        flags = g.setdefault('user_is_admin', {})
+        if self.id not in flags:
+            flags[self.id] = bool(db.session.scalar(db.select(User.is_admin).where(User.id == self.id)))
+        return flags[self.id]
+
+
+def _cache():
+    cache = current_app.extensions.get('user_cache')
+    if cache is None:
+        cache = current_app.extensions['user_cache'] = TTLCache(
+            maxsize=current_app.config.get('USER_CACHE_SIZE', 4096),
+            ttl=current_app.config.get('USER_CACHE_TTL', 300),
+        )
+    return cache
+
+
+def snapshot(user):
+    return CachedUser(
+        user.id, user.email, user.username, user.profile_pic, user.profile_pic_widths
+    )
+
+
+def remember(user):
+    """Cache a freshly loaded User (e.g. right after login) and return its snapshot"""
+    snap = snapshot(user)
+    _cache().set(user.id, snap)
+    return snap
+
+
+def load_user(user_id):
+    """Flask-Login user_loader: CachedUser for user_id, or None"""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    snap = _cache().get(user_id)
+    if snap is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        snap = remember(user)
+    return snap
+
+
+def get_user(user_id):
+    """The real User row, for views that write to it or walk its relationships"""
+    return db.session.get(User, user_id)
+
+
+def invalidate(user_id):
+    """Forget a cached user (call after their row changes)"""
+    _cache().pop(user_id)
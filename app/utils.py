@@ -2,10 +2,13 @@
 import os
 from datetime import datetime, timedelta
 from functools import wraps
-from flask import flash, redirect, url_for, request, current_app
+from flask import flash, redirect, url_for, request, current_app, g
 from flask_login import current_user
 from werkzeug.utils import secure_filename
-from app.models import UserSubscription, Movie
+from app import db
+from app.models import Movie
+from app.taxonomy import has_any_tag, PREMIUM_TAG
+from app.entitlements import active_entitlement
 
 
 # File upload settings
@@ -24,14 +27,10 @@ def allowed_image(filename: str) -> bool:
 
 
 def get_active_subscription(user):
-    """Get the active subscription for a user"""
-    if not user:
+    """Get the active subscription for a user (cached, see app.entitlements)"""
+    if not user or not getattr(user, 'is_authenticated', True):
         return None
-    now = datetime.utcnow()
-    return UserSubscription.query.filter(
-        UserSubscription.user_id == user.id,
-        UserSubscription.end_date > now
-    ).order_by(UserSubscription.end_date.desc()).first()
+    return active_entitlement(user.id)
 
 
 def is_subscribed(user):
@@ -39,6 +38,14 @@ def is_subscribed(user):
     return bool(get_active_subscription(user))
 
 
+def get_movie_or_404(movie_id):
+    """The movie subscription_required already loaded for this request, else query it"""
+    movie = g.get('movie')
+    if movie is not None and movie.id == movie_id:
+        return movie
+    return Movie.query.get_or_404(movie_id)
+
+
 def subscription_required(f):
     """Decorator to require subscription for premium content"""
     @wraps(f)
@@ -51,12 +58,14 @@ def subscription_required(f):
             flash('Please login to access this content.', 'warning')
             return redirect(url_for('login'))
 
-        # If the view has a movie object or movie_id, inspect tags
+        # If the view has a movie_id, load the movie and its Premium flag in one query
         movie_id = kwargs.get('movie_id') or request.view_args.get('movie_id')
         if movie_id:
-            movie = Movie.query.get(int(movie_id))
-            if movie and movie.tags and 'premium' in (movie.tags or '').lower():
-                if not is_subscribed(current_user):
+            row = db.session.query(Movie, has_any_tag(PREMIUM_TAG)).filter(Movie.id == int(movie_id)).first()
+            if row:
+                movie, premium = row
+                g.movie = movie  # reused by the view via get_movie_or_404
+                if premium and not is_subscribed(current_user):
                     flash('This content requires a subscription. Please subscribe to view.', 'warning')
                     return redirect(url_for('subscriptions'))
         return f(*args, **kwargs)
@@ -69,36 +78,6 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         if not current_user.is_authenticated or not current_user.is_admin:
             flash("Access denied. Admins only.", "danger")
-            return redirect(url_for('main.home'))
+            return redirect(url_for('home'))
         return f(*args, **kwargs)
     return decorated_function
-
-
-def bootstrap_migration(app):
-    """Add new columns to the Movie table if they don't exist (SQLite-safe)."""
-    with app.app_context():
-        from app import db
-        # read existing columns
-        cols = {row[1] for row in db.session.execute(db.text("PRAGMA table_info('movie')")).fetchall()}
-        to_add = []
-
-        if 'language' not in cols:
-            to_add.append("ALTER TABLE movie ADD COLUMN language VARCHAR(200)")
-        if 'runtime' not in cols:
-            to_add.append("ALTER TABLE movie ADD COLUMN runtime INTEGER")
-        if 'age_rating' not in cols:
-            to_add.append("ALTER TABLE movie ADD COLUMN age_rating VARCHAR(20)")
-        if 'imdb_rating' not in cols:
-            to_add.append("ALTER TABLE movie ADD COLUMN imdb_rating FLOAT")
-        if 'tags' not in cols:
-            to_add.append("ALTER TABLE movie ADD COLUMN tags VARCHAR(300)")
-        if 'poster_path' not in cols:
-            to_add.append("ALTER TABLE movie ADD COLUMN poster_path VARCHAR(500)")
-        if 'created_at' not in cols:
-            to_add.append("ALTER TABLE movie ADD COLUMN created_at DATETIME")
-
-        for sql in to_add:
-            db.session.execute(db.text(sql))
-        if to_add:
-            db.session.commit()
-
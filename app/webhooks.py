@@ -0,0 +1,368 @@
+"""Queued, idempotent Stripe webhook processing
+
+The webhook route only verifies the signature and stores the raw event
+(StripeEvent, unique on Stripe's event id), so Stripe gets its 200 in a
+few milliseconds and redelivered events are dropped at the door.  A
+worker then claims due events in batches and applies them:
+
+    checkout.session.completed      start (or extend) a subscription, record the payment
+    invoice.paid                    renewal: extend the subscription, record the payment
+    charge.refunded                 mark the payment refunded; a full refund ends access
+    customer.subscription.deleted   end the subscription
+
+Payments are also unique on their Stripe id, so two different events about
+the same payment cannot record it twice.  A failing event is retried with
+exponential backoff up to WEBHOOK_MAX_ATTEMPTS times and then parked as
+'failed' (`flask webhooks retry` queues it again).
+
+By default the worker is a thread inside the web process
+(WEBHOOK_WORKER=thread), started by the first event it receives, or by
+start_worker() as soon as a process starts serving (app/server.py does that
+in every worker it forks, so events queued before a recycle or reload are
+not left waiting).  Set WEBHOOK_WORKER=off and run `flask webhooks work` to
+process events in a separate process instead.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import StripeEvent, SubscriptionPlan, UserSubscription, Payment
+from app import entitlements
+
+
+LEASE = timedelta(minutes=5)   # a claimed event is re-queued if its worker dies
+MAX_BACKOFF = 3600             # seconds between retries, at most
+
+
+class EventError(Exception):
+    """An event that can never be applied (bad metadata etc.); not retried"""
+
+
+_HANDLERS = {}
+
+
+def handles(*event_types):
+    def decorator(fn):
+        for event_type in event_types:
+            _HANDLERS[event_type] = fn
+        return fn
+    return decorator
+
+
+# -- acknowledge path ----------------------------------------------------------
+
+def enqueue(event_id, event_type, payload):
+    """Store a verified event for the worker; False if it was already received"""
+    db.session.add(StripeEvent(event_id=event_id, type=event_type, payload=payload))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    wake()
+    return True
+
+
+def _worker_state():
+    return current_app.extensions.setdefault('webhook_worker', {
+        'thread': None, 'wake': threading.Event(), 'lock': threading.Lock(),
+    })
+
+
+def wake():
+    """Nudge the in-process worker thread, starting it on first use"""
+    if current_app.config.get('WEBHOOK_WORKER', 'thread') != 'thread':
+        return
+    state = _worker_state()
+    if state['thread'] is None or not state['thread'].is_alive():
+        with state['lock']:
+            if state['thread'] is None or not state['thread'].is_alive():
+                state['thread'] = threading.Thread(
+                    target=_run_worker, args=(current_app._get_current_object(), state['wake']),
+                    name='stripe-webhooks', daemon=True
+                )
+                state['thread'].start()
+    state['wake'].set()
+
+
+def start_worker(app):
+    """Start this process's worker thread now (if WEBHOOK_WORKER=thread) and have it look for due events"""
+    with app.app_context():
+        wake()
+
+
+def _run_worker(app, wake_event):
+    interval = app.config.get('WEBHOOK_POLL_INTERVAL', 5)
+    while True:
+        wake_event.wait(timeout=interval)  # also picks up retries that came due
+        wake_event.clear()
+        with app.app_context():
+            try:
+                while process_batch():
+                    pass
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Stripe webhook worker error')
+
+
+# -- worker ----------------------------------------------------------------------
+
+def _backoff(attempts):
+    return timedelta(seconds=min(MAX_BACKOFF, 5 * 2 ** (attempts - 1)))
+
+
+def _claim(limit):
+    """Mark up to limit due events as ours; returns them"""
+    now = datetime.utcnow()
+    due = (
+        StripeEvent.status.in_(('pending', 'processing')),  # 'processing' past its lease = abandoned
+        StripeEvent.next_attempt_at <= now,
+    )
+    ids = [row[0] for row in db.session.query(StripeEvent.id).filter(*due)
+           .order_by(StripeEvent.id).limit(limit)]
+    if not ids:
+        return []
+    token = os.urandom(8).hex()
+    # Re-checking `due` makes a concurrent worker's claim on the same rows a no-op
+    StripeEvent.query.filter(StripeEvent.id.in_(ids), *due).update(
+        {StripeEvent.status: 'processing', StripeEvent.claimed_by: token,
+         StripeEvent.next_attempt_at: now + LEASE},
+        synchronize_session=False
+    )
+    db.session.commit()
+    return StripeEvent.query.filter_by(claimed_by=token, status='processing').order_by(StripeEvent.id).all()
+
+
+def process_batch(limit=None):
+    """Apply one batch of due events; returns how many were attempted"""
+    limit = limit or current_app.config.get('WEBHOOK_BATCH_SIZE', 100)
+    max_attempts = current_app.config.get('WEBHOOK_MAX_ATTEMPTS', 8)
+    events = _claim(limit)
+    touched_users = set()
+    for event in events:
+        event.attempts += 1
+        try:
+            # A savepoint per event: one bad event does not undo the rest of the batch
+            with db.session.begin_nested():
+                touched_users.update(apply_event(event))
+        except Exception as e:
+            event.last_error = f"{type(e).__name__}: {e}"
+            if isinstance(e, EventError) or event.attempts >= max_attempts:
+                event.status = 'failed'
+            else:
+                event.status = 'pending'
+                event.next_attempt_at = datetime.utcnow() + _backoff(event.attempts)
+        else:
+            event.status = 'done'
+            event.last_error = None
+            event.processed_at = datetime.utcnow()
+        event.claimed_by = None
+    db.session.commit()
+    for user_id in touched_users:
+        entitlements.invalidate(user_id)
+    return len(events)
+
+
+def apply_event(event):
+    """Run the handler for one StripeEvent; returns the ids of users it changed"""
+    handler = _HANDLERS.get(event.type)
+    if handler is None:
+        return ()  # not an event we act on
+    data = json.loads(event.payload)
+    return handler(data['data']['object']) or ()
+
+
+# -- handlers --------------------------------------------------------------------
+
+def _metadata_ids(*metadatas):
+    for metadata in metadatas:
+        if metadata and metadata.get('user_id') and metadata.get('plan_id'):
+            try:
+                return int(metadata['user_id']), int(metadata['plan_id'])
+            except (TypeError, ValueError):
+                break
+    raise EventError('missing user_id/plan_id metadata')
+
+
+def _plan(plan_id):
+    plan = db.session.get(SubscriptionPlan, plan_id)
+    if plan is None:
+        raise EventError(f'unknown plan {plan_id}')
+    return plan
+
+
+def _start_or_extend(user_id, plan, stripe_subscription_id=None):
+    """Add one plan period to the user's current subscription, or start a new one"""
+    now = datetime.utcnow()
+    query = UserSubscription.query.filter(
+        UserSubscription.user_id == user_id,
+        UserSubscription.plan_id == plan.id,
+        UserSubscription.end_date > now,
+    )
+    if stripe_subscription_id:
+        query = query.filter(UserSubscription.stripe_subscription_id == stripe_subscription_id)
+    current = query.order_by(UserSubscription.end_date.desc()).first()
+    if current:
+        current.end_date += timedelta(days=plan.duration_days)
+        return current
+    sub = UserSubscription(
+        user_id=user_id, plan_id=plan.id, start_date=now,
+        end_date=now + timedelta(days=plan.duration_days),
+        stripe_subscription_id=stripe_subscription_id,
+    )
+    db.session.add(sub)
+    db.session.flush()
+    return sub
+
+
+def _record_payment(user_id, amount_cents, stripe_id, subscription):
+    db.session.add(Payment(
+        user_id=user_id, amount=amount_cents / 100, status='Completed',
+        stripe_id=stripe_id, subscription_id=subscription.id,
+    ))
+
+
+def _already_paid(stripe_id):
+    return db.session.query(Payment.id).filter_by(stripe_id=stripe_id).first() is not None
+
+
+@handles('checkout.session.completed')
+def _checkout_completed(session):
+    if session.get('payment_status') == 'unpaid':
+        return ()  # delayed payment methods: wait for the invoice/charge events
+    user_id, plan_id = _metadata_ids(session.get('metadata'))
+    plan = _plan(plan_id)
+    stripe_id = session.get('payment_intent') or session.get('invoice') or session['id']
+    if _already_paid(stripe_id):
+        return ()
+    sub = _start_or_extend(user_id, plan, session.get('subscription'))
+    amount = session.get('amount_total')
+    _record_payment(user_id, int(plan.price * 100) if amount is None else amount, stripe_id, sub)
+    return (user_id,)
+
+
+@handles('invoice.paid', 'invoice.payment_succeeded')
+def _invoice_paid(invoice):
+    if invoice.get('billing_reason') == 'subscription_create':
+        return ()  # the first period is granted by checkout.session.completed
+    lines = (invoice.get('lines') or {}).get('data') or [{}]
+    user_id, plan_id = _metadata_ids(
+        (invoice.get('subscription_details') or {}).get('metadata'),
+        invoice.get('metadata'),
+        lines[0].get('metadata'),
+    )
+    plan = _plan(plan_id)
+    if _already_paid(invoice['id']):
+        return ()
+    sub = _start_or_extend(user_id, plan, invoice.get('subscription'))
+    _record_payment(user_id, invoice.get('amount_paid') or 0, invoice['id'], sub)
+    return (user_id,)
+
+
+@handles('charge.refunded')
+def _charge_refunded(charge):
+    keys = [k for k in (charge.get('payment_intent'), charge.get('invoice'), charge.get('id')) if k]
+    payment = Payment.query.filter(Payment.stripe_id.in_(keys)).first()
+    if payment is None:
+        # Usually the payment's own event has not been processed yet: retry later
+        raise LookupError(f"no payment recorded for {', '.join(keys)}")
+    if payment.status == 'Refunded':
+        return ()
+    if not charge.get('refunded'):
+        payment.status = 'Partially Refunded'
+        return ()
+    payment.status = 'Refunded'
+    if payment.subscription_id:
+        sub = db.session.get(UserSubscription, payment.subscription_id)
+        now = datetime.utcnow()
+        if sub and sub.end_date > now:
+            sub.end_date = now
+    return (payment.user_id,)
+
+
+@handles('customer.subscription.deleted')
+def _subscription_deleted(subscription):
+    now = datetime.utcnow()
+    subs = UserSubscription.query.filter(
+        UserSubscription.stripe_subscription_id == subscription['id'],
+        UserSubscription.end_date > now,
+    ).all()
+    for sub in subs:
+        sub.end_date = now
+    return [sub.user_id for sub in subs]
+
+
+# -- CLI -------------------------------------------------------------------------
+
+webhooks_cli = AppGroup('webhooks', help='Stripe webhook queue.')
+
+
+@webhooks_cli.command('work')
+@click.option('--once', is_flag=True, help='Drain the queue and exit.')
+@click.option('--batch-size', type=int, default=None)
+def work_command(once, batch_size):
+    """Process queued Stripe events (use with WEBHOOK_WORKER=off)."""
+    interval = current_app.config.get('WEBHOOK_POLL_INTERVAL', 5)
+    total, started = 0, time.perf_counter()
+    while True:
+        count = process_batch(batch_size)
+        total += count
+        if count:
+            continue
+        if once:
+            break
+        time.sleep(interval)
+    elapsed = time.perf_counter() - started
+    click.echo(f"✅ Processed {total} events in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.0f}/s)")
+
+
+@webhooks_cli.command('retry')
+def retry_command():
+    """Queue every failed event again."""
+    count = StripeEvent.query.filter_by(status='failed').update(
+        {StripeEvent.status: 'pending', StripeEvent.attempts: 0,
+         StripeEvent.next_attempt_at: datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.session.commit()
+    click.echo(f"Re-queued {count} failed events")
+
+
+@webhooks_cli.command('stats')
+def stats_command():
+    """Show queued events by status."""
+    rows = db.session.query(StripeEvent.status, db.func.count()).group_by(StripeEvent.status).all()
+    for status, count in sorted(rows):
+        click.echo(f"{status:<12}{count}")
+    for event in StripeEvent.query.filter_by(status='failed').order_by(StripeEvent.id.desc()).limit(5):
+        click.echo(f"  {event.event_id} {event.type}: {event.last_error}")
+
+
+@webhooks_cli.command('fake')
+@click.option('--count', type=int, default=1000, help='Events to send.')
+@click.option('--concurrency', type=int, default=8)
+@click.option('--duplicates', type=float, default=0.1, help='Share of events redelivered.')
+@click.option('--url', default=None, help='POST to a running server instead of the test client.')
+@click.option('--seed', type=int, default=None)
+def fake_command(count, concurrency, duplicates, url, seed):
+    """Fire a burst of signed fake Stripe events at /stripe/webhook."""
+    from benchmarks import fake_stripe
+    from app.models import User
+    secret = current_app.config.get('STRIPE_WEBHOOK_SECRET')
+    if not secret:
+        raise click.ClickException('STRIPE_WEBHOOK_SECRET must be set (any value works offline)')
+    users = [row[0] for row in db.session.query(User.id).filter(User.is_admin.isnot(True))]
+    plans = [(plan.id, plan.price) for plan in SubscriptionPlan.query.all()]
+    if not users or not plans:
+        raise click.ClickException('Need at least one non-admin user and one subscription plan')
+
+    events = fake_stripe.scenario(users, plans, count, duplicates, seed)
+    post = fake_stripe.http_poster(url) if url else fake_stripe.test_client_poster(current_app._get_current_object())
+    stats = fake_stripe.burst(events, secret, post, concurrency)
+    click.echo(json.dumps(stats, indent=2))
@@ -0,0 +1,7 @@
+"""ASGI entry point: the async read-only catalog API (see app/asgi.py)
+
+    uvicorn asgi:application --workers 2
+"""
+from app.asgi import create_asgi_app
+
+application = create_asgi_app()
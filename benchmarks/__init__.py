@@ -0,0 +1,15 @@
+"""Reproducible benchmarks for StreamVerse
+
+Seed a throwaway database with synthetic data, then measure the hot
+endpoints through the Flask test client and through a real threaded WSGI
+server; results are JSON, so runs on two commits can be compared:
+
+    python -m benchmarks.seed --database sqlite:////tmp/bench.db --movies 100000 --reviews 5000000
+    python -m benchmarks.harness --database sqlite:////tmp/bench.db --output before.json
+    git checkout my-branch
+    python -m benchmarks.harness --database sqlite:////tmp/bench.db --output after.json
+    python -m benchmarks.compare before.json after.json
+
+Both the generator and the request mix are driven by --seed, so the same
+arguments give the same data and the same URLs.
+"""
@@ -0,0 +1,73 @@
+"""Compare two benchmark reports
+
+    python -m benchmarks.compare before.json after.json --fail-over 10
+
+Prints per-scenario p50/p95/p99, throughput and SQL counts side by side.
+With --fail-over, exits with status 1 when any scenario's p95 got more than
+that many percent slower or now runs at least half a statement more SQL
+per request on average (cache misses make small fractions noisy).
+"""
+import argparse
+import json
+import sys
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'sql_per_request')
+SQL_TOLERANCE = 0.5
+
+
+def change(old, new):
+    """Percent change from old to new, or None"""
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def compare(before, after, fail_over=None):
+    """Yield report lines; the last item is the list of regressions"""
+    regressions = []
+    for mode in sorted(set(before['results']) & set(after['results'])):
+        old_mode, new_mode = before['results'][mode], after['results'][mode]
+        yield f'\n[{mode}]'
+        yield f"{'scenario':<18}" + ''.join(f'{m:>26}' for m in METRICS)
+        for name in sorted(set(old_mode) & set(new_mode)):
+            old, new = old_mode[name], new_mode[name]
+            cells = []
+            for metric in METRICS:
+                pct = change(old.get(metric), new.get(metric))
+                delta = f'{pct:+.0f}%' if pct is not None else ''
+                cells.append(f'{old.get(metric)!s:>9} -> {new.get(metric)!s:<9}{delta:>6}')
+            yield f'{name:<18}' + ''.join(f'{c:>26}' for c in cells)
+            if fail_over is not None:
+                slower = change(old.get('p95_ms'), new.get('p95_ms'))
+                if slower is not None and slower > fail_over:
+                    regressions.append(f'{mode}/{name}: p95 {slower:+.0f}%')
+                if (new.get('sql_per_request') or 0) - (old.get('sql_per_request') or 0) >= SQL_TOLERANCE:
+                    regressions.append(f"{mode}/{name}: SQL {old.get('sql_per_request')} -> {new.get('sql_per_request')}")
+    yield regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare two benchmark reports')
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--fail-over', type=float, metavar='PERCENT',
+                        help='exit 1 if a p95 regressed by more than this, or SQL counts grew')
+    args = parser.parse_args(argv)
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"before: {before['meta'].get('commit')}  after: {after['meta'].get('commit')}")
+    if before['meta'].get('dataset') != after['meta'].get('dataset'):
+        print('⚠️ The reports were run on different datasets')
+    *lines, regressions = compare(before, after, args.fail_over)
+    for line in lines:
+        print(line)
+    if regressions:
+        print('\nRegressions:\n  ' + '\n  '.join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""Offline stand-in for Stripe's webhook sender
+
+Builds Stripe-shaped events, signs them exactly like Stripe does
+(Stripe-Signature: t=<unix time>,v1=<HMAC-SHA256 of "t.payload">) and fires
+them at /stripe/webhook, either through the Flask test client or over
+HTTP at a running server.  Used by `flask webhooks fake` to benchmark
+bursts of webhooks (with redeliveries) without a Stripe account:
+
+    flask --app run webhooks fake --count 5000 --concurrency 16 --duplicates 0.2
+    flask --app run webhooks work --once
+
+It also runs a stub of the few Stripe API endpoints app/payments.py calls
+(products, prices, checkout sessions), optionally slowed down, so the
+checkout path can be exercised without network access:
+
+    python -m benchmarks.fake_stripe --port 12111 --delay 0.2
+"""
+import hashlib
+import hmac
+import http.client
+import json
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+def _id(prefix):
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+def make_event(event_type, obj):
+    return {
+        'id': _id('evt'),
+        'object': 'event',
+        'type': event_type,
+        'created': int(time.time()),
+        'livemode': False,
+        'data': {'object': obj},
+    }
+
+
+def checkout_completed(user_id, plan_id, amount_cents, subscription_id=None):
+    return make_event('checkout.session.completed', {
+        'id': _id('cs'),
+        'object': 'checkout.session',
+        'mode': 'subscription' if subscription_id else 'payment',
+        'payment_status': 'paid',
+        'payment_intent': None if subscription_id else _id('pi'),
+        'subscription': subscription_id,
+        'invoice': _id('in') if subscription_id else None,
+        'amount_total': amount_cents,
+        'metadata': {'user_id': str(user_id), 'plan_id': str(plan_id)},
+    })
+
+
+def invoice_paid(user_id, plan_id, amount_cents, subscription_id):
+    return make_event('invoice.paid', {
+        'id': _id('in'),
+        'object': 'invoice',
+        'billing_reason': 'subscription_cycle',
+        'subscription': subscription_id,
+        'amount_paid': amount_cents,
+        'subscription_details': {'metadata': {'user_id': str(user_id), 'plan_id': str(plan_id)}},
+    })
+
+
+def charge_refunded(payment_stripe_id, amount_cents, full=True):
+    key = 'invoice' if payment_stripe_id.startswith('in_') else 'payment_intent'
+    return make_event('charge.refunded', {
+        'id': _id('ch'),
+        'object': 'charge',
+        key: payment_stripe_id,
+        'amount': amount_cents,
+        'amount_refunded': amount_cents if full else amount_cents // 2,
+        'refunded': full,
+    })
+
+
+def sign(payload, secret, timestamp=None):
+    """Stripe-Signature header value for payload (str)"""
+    timestamp = int(timestamp or time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def scenario(users, plans, count, duplicates=0.1, seed=None):
+    """A realistic mix of events: purchases, renewals, refunds, noise and redeliveries
+
+    users is a list of user ids, plans a list of (plan_id, price) pairs.
+    """
+    rng = random.Random(seed)
+    events, paid = [], []  # paid: (stripe payment id, amount) available for refunds
+    subscriptions = {}     # user_id -> (stripe subscription id, plan_id, amount)
+    while len(events) < count:
+        roll = rng.random()
+        user_id = rng.choice(users)
+        plan_id, price = rng.choice(plans)
+        amount = int(price * 100)
+        if roll < 0.5 or (roll < 0.8 and user_id not in subscriptions):
+            sub_id = _id('sub') if rng.random() < 0.5 else None
+            event = checkout_completed(user_id, plan_id, amount, sub_id)
+            obj = event['data']['object']
+            if sub_id:
+                subscriptions[user_id] = (sub_id, plan_id, amount)
+            paid.append((obj['payment_intent'] or obj['invoice'] or obj['id'], amount))
+        elif roll < 0.8:
+            sub_id, plan_id, amount = subscriptions[user_id]
+            event = invoice_paid(user_id, plan_id, amount, sub_id)
+            paid.append((event['data']['object']['id'], amount))
+        elif roll < 0.9 and paid:
+            stripe_id, amount = paid.pop(rng.randrange(len(paid)))
+            event = charge_refunded(stripe_id, amount, full=rng.random() < 0.8)
+        else:
+            event = make_event('customer.updated', {'id': _id('cus'), 'object': 'customer'})
+        events.append(event)
+        # Stripe redelivers on timeouts: replay some events verbatim
+        if rng.random() < duplicates and len(events) < count:
+            events.append(event)
+    return events
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def burst(events, secret, post, concurrency=8):
+    """Send events concurrently via post(body, headers) -> status; returns a stats dict"""
+    def send(event):
+        body = json.dumps(event)
+        started = time.perf_counter()
+        status = post(body, {'Stripe-Signature': sign(body, secret), 'Content-Type': 'application/json'})
+        return status, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, events))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency * 1000 for _, latency in results)
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    return {
+        'sent': len(events),
+        'seconds': round(elapsed, 3),
+        'per_second': round(len(events) / elapsed, 1) if elapsed else None,
+        'statuses': statuses,
+        'ack_ms': {p: round(_percentile(latencies, p), 2) for p in (50, 95, 99)},
+    }
+
+
+def test_client_poster(app, path='/stripe/webhook'):
+    """post() for burst() that goes through app.test_client(), one client per thread"""
+    local = threading.local()
+
+    def post(body, headers):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        return local.client.post(path, data=body, headers=headers).status_code
+    return post
+
+
+def http_poster(url):
+    """post() for burst() against a running server, one keep-alive connection per thread"""
+    parts = urlsplit(url)
+    conn_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    local = threading.local()
+
+    def post(body, headers):
+        if not hasattr(local, 'conn'):
+            local.conn = conn_class(parts.netloc, timeout=30)
+        try:
+            local.conn.request('POST', parts.path or '/', body=body.encode(), headers=headers)
+            response = local.conn.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            local.conn.close()
+            del local.conn
+            return 'error'
+    return post
+
+
+# -- API stub ----------------------------------------------------------------
+
+class _APIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like api.stripe.com
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._reply(status, {'error': {'type': 'invalid_request_error', 'message': message}})
+
+    def _handle(self, method):
+        api = self.server
+        parts = urlsplit(self.path)
+        if method == 'GET':
+            form = dict(parse_qsl(parts.query))
+        else:
+            length = int(self.headers.get('Content-Length') or 0)
+            form = dict(parse_qsl(self.rfile.read(length).decode()))
+        with api.lock:
+            api.calls[f'{method} {parts.path}'] = api.calls.get(f'{method} {parts.path}', 0) + 1
+        if api.delay:
+            time.sleep(api.delay)
+        if not self.headers.get('Authorization', '').startswith('Bearer sk_'):
+            return self._error(401, 'Invalid API Key provided')
+
+        path = parts.path.rstrip('/')
+        with api.lock:
+            if method == 'GET' and path == '/v1/prices':
+                price = api.prices.get(form.get('lookup_keys[0]'))
+                return self._reply(200, {'object': 'list', 'data': [price] if price else []})
+            if method == 'POST' and path == '/v1/products':
+                if form.get('id') in api.products:
+                    return self._error(400, 'Product already exists.')
+                product = {'id': form.get('id') or _id('prod'), 'object': 'product', 'name': form.get('name')}
+                api.products[product['id']] = product
+                return self._reply(200, product)
+            if method == 'POST' and path.startswith('/v1/products/'):
+                product = api.products.get(path.rsplit('/', 1)[1])
+                if product is None:
+                    return self._error(404, 'No such product')
+                product['name'] = form.get('name', product['name'])
+                return self._reply(200, product)
+            if method == 'POST' and path == '/v1/prices':
+                price = {'id': _id('price'), 'object': 'price', 'product': form.get('product'),
+                         'unit_amount': int(form.get('unit_amount', 0)), 'currency': form.get('currency'),
+                         'lookup_key': form.get('lookup_key')}
+                api.prices[price['lookup_key']] = price
+                return self._reply(200, price)
+            if method == 'POST' and path == '/v1/checkout/sessions':
+                session = {'id': _id('cs'), 'object': 'checkout.session', 'mode': form.get('mode'),
+                           'url': f"https://checkout.stripe.test/pay/{_id('cs')}",
+                           'metadata': {k[9:-1]: v for k, v in form.items() if k.startswith('metadata[')}}
+                if not form.get('line_items[0][price]'):
+                    return self._error(400, 'Missing line_items[0][price]')
+                return self._reply(200, session)
+        self._error(404, f'Unrecognized request URL ({method}: {parts.path})')
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+
+def api_stub(host='127.0.0.1', port=0, delay=0.0):
+    """A threaded stub Stripe API server (not started); .calls counts requests per endpoint"""
+    server = ThreadingHTTPServer((host, port), _APIHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.lock = threading.Lock()
+    server.calls, server.products, server.prices = {}, {}, {}
+    return server
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Stub Stripe API for local checkout testing')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=12111)
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds to stall every call')
+    args = parser.parse_args()
+    stub = api_stub(args.host, args.port, args.delay)
+    print(f"Stub Stripe API on http://{args.host}:{stub.server_address[1]} (STRIPE_API_BASE)")
+    stub.serve_forever()
@@ -0,0 +1,333 @@
+"""Latency / throughput / SQL-count benchmark of the hot endpoints
+
+    python -m benchmarks.harness --database sqlite:////tmp/bench.db \\
+        --requests 500 --concurrency 8 --output results.json
+
+Every scenario is run twice:
+
+- "client": sequentially through app.test_client(), i.e. the app alone,
+  with no sockets and no server.
+- "server": through a threaded Werkzeug WSGI server on a local port, with
+  --concurrency keep-alive client threads, i.e. the app under concurrent
+  load.
+
+The results for each scenario are:
+
+- p50/p95/p99/mean/max latency in milliseconds.
+- Throughput in requests per second.
+- The status codes returned.
+- The SQL statements the app executed per request.  SQL is counted in the
+  app process from SQLAlchemy cursor events, attributed to the scenario
+  through the X-Bench-Scenario header.
+
+URLs are drawn up front from --seed, so two runs on the same database
+send the same requests.  The write scenarios (--writes) post reviews and
+watchlist saves and so change the database; run them against a copy when
+runs must be comparable:
+
+    cp /tmp/bench.db /tmp/bench-run.db
+    python -m benchmarks.harness --database sqlite:////tmp/bench-run.db --mode server \
+        --scenario read_write_mix --concurrency 16
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+SCENARIO_HEADER = 'X-Bench-Scenario'
+USERS = 50           # distinct subscribed accounts the logged-in scenarios rotate through
+WARMUP = 20          # unmeasured requests per scenario: fill caches and build lazy indexes first
+
+def _review(rng, s):
+    return f'/add_review/{rng.choice(s["movies"])}', {'content': 'Benchmark review', 'rating': rng.randint(1, 10)}
+
+
+def _mixed(rng, s):
+    """80% page views, 20% reviews and watchlist saves, like a busy evening"""
+    roll = rng.random()
+    if roll < 0.1:
+        return _review(rng, s)
+    if roll < 0.2:
+        return f'/watchlist/add/{rng.choice(s["movies"])}', {}
+    return rng.choice(('/home', f'/movie/{rng.choice(s["movies"])}', f'/api/search?q={rng.choice(s["words"])}'))
+
+
+# name -> (needs login, url factory(rng, sample)); a factory returns a URL to GET or (URL, form) to POST
+SCENARIOS = {
+    'landing': (False, lambda rng, s: '/'),
+    'home_anonymous': (False, lambda rng, s: '/home'),
+    'home_user': (True, lambda rng, s: '/home'),
+    'home_search': (False, lambda rng, s: f'/home?q={rng.choice(s["words"])}'),
+    'home_genre': (False, lambda rng, s: f'/home?genre={rng.choice(s["genres"])}'),
+    'api_search': (False, lambda rng, s: f'/api/search?q={rng.choice(s["words"])}'),
+    'api_suggest': (False, lambda rng, s: f'/api/search?mode=suggest&q={rng.choice(s["words"])[:3]}'),
+    'api_movies': (False, lambda rng, s: f'/api/movies?genre={rng.choice(s["genres"])}'),
+    'api_shelves': (False, lambda rng, s: '/api/shelves'),
+    'movie_detail': (True, lambda rng, s: f'/movie/{rng.choice(s["movies"])}'),
+    'movie_reviews': (True, lambda rng, s: f'/movie/{rng.choice(s["movies"])}/reviews'),
+    'watchlist': (True, lambda rng, s: '/watchlist'),
+    'dashboard': (True, lambda rng, s: '/dashboard'),
+    'subscriptions': (True, lambda rng, s: '/subscriptions'),
+    'add_review': (True, _review),
+    'watchlist_add': (True, lambda rng, s: (f'/watchlist/add/{rng.choice(s["movies"])}', {})),
+    'read_write_mix': (True, _mixed),
+}
+WRITE_SCENARIOS = {'add_review', 'watchlist_add', 'read_write_mix'}
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(latencies, statuses, queries, seconds):
+    latencies = sorted(latencies)
+    ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        'requests': len(latencies),
+        'errors': sum(n for status, n in statuses.items() if status >= 400),
+        'status': {str(status): n for status, n in sorted(statuses.items())},
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'max_ms': ms(latencies[-1]) if latencies else None,
+        'throughput_rps': round(len(latencies) / seconds, 1) if seconds else None,
+        'sql_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'sql_max': max(queries) if queries else None,
+    }
+
+
+class SQLCounter:
+    """Counts the SQL statements each request executes, per X-Bench-Scenario"""
+
+    def __init__(self, app):
+        from flask import request, request_started, request_finished
+        from sqlalchemy import event
+        from app import db
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.counts = defaultdict(list)
+
+        def started(sender, **extra):
+            self._local.count = 0
+
+        def finished(sender, response, **extra):
+            scenario = request.headers.get(SCENARIO_HEADER)
+            if scenario:
+                with self._lock:
+                    self.counts[scenario].append(getattr(self._local, 'count', 0))
+
+        def executed(*args):
+            self._local.count = getattr(self._local, 'count', 0) + 1
+
+        # Signals hold weak references; keep ours alive as long as the counter
+        self._receivers = (started, finished, executed)
+        request_started.connect(started, app)
+        request_finished.connect(finished, app)
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', executed)
+
+    def take(self, scenario):
+        with self._lock:
+            return self.counts.pop(scenario, [])
+
+
+def sample_data(app):
+    """Ids and words the URL factories draw from"""
+    from app import db
+    from app.models import Genre, Movie, User, UserSubscription
+    with app.app_context():
+        movies = db.session.scalars(db.select(Movie.id).order_by(Movie.id)).all()
+        titles = db.session.scalars(db.select(Movie.title).order_by(Movie.id).limit(2000)).all()
+        genres = db.session.scalars(db.select(Genre.slug).order_by(Genre.slug)).all()
+        # Subscribers, so premium titles render instead of redirecting to the plans page
+        emails = db.session.scalars(db.select(User.email).join(UserSubscription).where(
+            User.email.like('user%@bench.local'), UserSubscription.end_date > datetime.utcnow()
+        ).group_by(User.id).order_by(User.id).limit(USERS)).all()
+    if not movies or not emails:
+        sys.exit('No benchmark data here; run `python -m benchmarks.seed` first.')
+    words = sorted({w.lower() for t in titles for w in t.split() if w.isalpha() and len(w) > 3}) or ['movie']
+    return {'movies': movies, 'genres': genres or ['drama'], 'words': words, 'emails': emails}
+
+
+def plan(sample, scenarios, count, seed):
+    """{scenario: [url, ...]}, the same for the same seed and data"""
+    rng = random.Random(seed)
+    return {name: [SCENARIOS[name][1](rng, sample) for _ in range(count + WARMUP)] for name in scenarios}
+
+
+def run_client(app, urls, emails, counter):
+    """Sequential requests through the Flask test client"""
+    results = {}
+    anonymous = app.test_client()
+    logged_in = []
+    for email in emails:
+        client = app.test_client()
+        client.post('/login', data={'email': email, 'password': 'bench'})
+        logged_in.append(client)
+    for name, scenario_urls in urls.items():
+        clients = logged_in if SCENARIOS[name][0] else [anonymous]
+        latencies, statuses = [], Counter()
+        for i, url in enumerate(scenario_urls):
+            client = clients[i % len(clients)]
+            url, form = url if isinstance(url, tuple) else (url, None)
+            headers = {SCENARIO_HEADER: name if i >= WARMUP else ''}
+            begin = time.perf_counter()
+            if form is None:
+                response = client.get(url, headers=headers)
+            else:
+                response = client.post(url, data=form, headers=headers)
+            response.get_data()
+            elapsed = time.perf_counter() - begin
+            if i >= WARMUP:
+                latencies.append(elapsed)
+                statuses[response.status_code] += 1
+        results[name] = summarize(latencies, statuses, counter.take(name), sum(latencies))
+        print(f"  client  {name:<16} p50 {results[name]['p50_ms']:>8.2f} ms  "
+              f"p99 {results[name]['p99_ms']:>8.2f} ms  sql {results[name]['sql_per_request']}", file=sys.stderr)
+    return results
+
+
+def run_server(app, urls, emails, counter, concurrency):
+    """Concurrent keep-alive requests against a threaded WSGI server on a free port"""
+    import requests
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    def session(email=None):
+        s = requests.Session()
+        s.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=1))
+        if email:
+            s.post(base + '/login', data={'email': email, 'password': 'bench'}, allow_redirects=False)
+        return s
+
+    # One session per worker thread and account type, logged in as different users
+    anonymous = [session() for _ in range(concurrency)]
+    logged_in = [session(emails[i % len(emails)]) for i in range(concurrency)]
+    local = threading.local()
+    worker_ids = iter(range(concurrency))
+    worker_lock = threading.Lock()
+
+    def fetch(job):
+        name, url, measured = job
+        if not hasattr(local, 'worker'):
+            with worker_lock:
+                local.worker = next(worker_ids)
+        s = (logged_in if SCENARIOS[name][0] else anonymous)[local.worker]
+        url, form = url if isinstance(url, tuple) else (url, None)
+        headers = {SCENARIO_HEADER: name if measured else ''}
+        begin = time.perf_counter()
+        if form is None:
+            response = s.get(base + url, headers=headers, allow_redirects=False)
+        else:
+            response = s.post(base + url, data=form, headers=headers, allow_redirects=False)
+        _ = response.content
+        return time.perf_counter() - begin, response.status_code
+
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for name, scenario_urls in urls.items():
+                list(pool.map(fetch, [(name, url, False) for url in scenario_urls[:WARMUP]]))
+                begin = time.perf_counter()
+                timings = list(pool.map(fetch, [(name, url, True) for url in scenario_urls[WARMUP:]]))
+                wall = time.perf_counter() - begin
+                statuses = Counter(status for _, status in timings)
+                results[name] = summarize([t for t, _ in timings], statuses, counter.take(name), wall)
+                print(f"  server  {name:<16} p50 {results[name]['p50_ms']:>8.2f} ms  "
+                      f"p99 {results[name]['p99_ms']:>8.2f} ms  {results[name]['throughput_rps']:>8.1f} req/s",
+                      file=sys.stderr)
+    finally:
+        server.shutdown()
+        for s in anonymous + logged_in:
+            s.close()
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def dataset(app):
+    from app import db
+    from app.models import Movie, Review, User, UserSubscription, Watchlist
+    with app.app_context():
+        return {model.__tablename__: db.session.query(model).count()
+                for model in (Movie, User, Review, Watchlist, UserSubscription)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark StreamVerse endpoints')
+    parser.add_argument('--database', help='SQLAlchemy URL of a seeded database (default: $DATABASE_URL)')
+    parser.add_argument('--mode', choices=['client', 'server', 'both'], default='both')
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads in server mode')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='run only these (repeatable; default: all read-only scenarios)')
+    parser.add_argument('--writes', action='store_true', help='include the scenarios that write')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the JSON report here (default: stdout)')
+    args = parser.parse_args(argv)
+
+    if args.database:
+        os.environ['DATABASE_URL'] = args.database
+    os.environ.setdefault('WEBHOOK_WORKER', 'off')
+    from app import create_app
+    app = create_app()
+    counter = SQLCounter(app)
+    sample = sample_data(app)
+    scenarios = args.scenario or [name for name in SCENARIOS if args.writes or name not in WRITE_SCENARIOS]
+    urls = plan(sample, scenarios, args.requests, args.seed)
+
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': app.config['SQLALCHEMY_DATABASE_URI'].split('://')[0],
+            'db_profile': app.config.get('DB_PROFILE'),
+            'dataset': dataset(app),
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'seed': args.seed,
+        },
+        'results': {},
+    }
+    if args.mode in ('client', 'both'):
+        report['results']['client'] = run_client(app, urls, sample['emails'], counter)
+    if args.mode in ('server', 'both'):
+        report['results']['server'] = run_server(app, urls, sample['emails'], counter, args.concurrency)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"✅ Wrote {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""Synthetic data generator: movies, users, reviews, watchlists, subscriptions
+
+    python -m benchmarks.seed --database sqlite:////tmp/bench.db \\
+        --movies 100000 --users 50000 --reviews 5000000 --watchlist 20
+
+Movies go through the bulk importer (app.catalog_io), so taxonomy, the
+search index and the caches are built the way production builds them; the
+rest is inserted in large executemany batches.  Popularity is skewed (a few
+movies collect most reviews and saves), like a real catalog.  Every user's
+password is "bench"; user<N>@bench.local for N in 1..--users, plus
+admin@bench.local.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+import numpy as np
+
+GENRES = ('Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 'Drama', 'Family',
+          'Fantasy', 'Horror', 'Musical', 'Mystery', 'Romance', 'Sci-Fi', 'Sports', 'Thriller', 'War')
+TAGS = ('Trending', 'Popular', 'Premium', 'New', 'Classic', 'Award Winner', 'Cult', 'Indie')
+LANGUAGES = ('Hindi', 'English', 'Tamil', 'Telugu', 'Malayalam', 'Korean', 'Japanese', 'Spanish')
+AGE_RATINGS = ('U', 'U/A', 'A')
+WORDS = ('night', 'city', 'river', 'last', 'king', 'shadow', 'storm', 'dream', 'road', 'fire', 'silent',
+         'golden', 'broken', 'star', 'ocean', 'empire', 'ghost', 'summer', 'winter', 'iron', 'secret',
+         'wild', 'dark', 'love', 'war', 'song', 'hunter', 'garden', 'mountain', 'mirror', 'echo', 'legend')
+REVIEW_TEXTS = ('Loved it.', 'Not bad at all.', 'Too long for me.', 'A must watch!',
+                'Great performances, weak story.', 'Fell asleep halfway.', 'Better than the book.')
+
+PASSWORD = 'bench'
+CHUNK = 20_000
+POPULARITY_SKEW = 0.8  # Zipf-like exponent: weight of the n-th most popular movie ~ 1 / n**skew
+
+
+def popularity(rng, n):
+    """Probabilities of picking each of n items, heavily skewed but in random order"""
+    weights = 1.0 / np.arange(1, n + 1) ** POPULARITY_SKEW
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def movie_rows(rng, count):
+    """(line number, feed row) records for app.catalog_io.import_catalog"""
+    for i in range(1, count + 1):
+        words = rng.choice(WORDS, size=int(rng.integers(1, 4)), replace=False)
+        genres = rng.choice(GENRES, size=int(rng.integers(1, 3)), replace=False)
+        yield i, {
+            'external_id': f'bench-{i}',
+            'title': ' '.join(words).title() + f' {i}',
+            'description': f'A {genres[0].lower()} story about the {words[0]}. ' * 3,
+            'genre': '/'.join(genres),
+            'tags': ', '.join(rng.choice(TAGS, size=int(rng.integers(0, 3)), replace=False)),
+            'language': ', '.join(rng.choice(LANGUAGES, size=int(rng.integers(1, 3)), replace=False)),
+            'runtime': int(rng.integers(75, 190)),
+            'age_rating': str(rng.choice(AGE_RATINGS)),
+            'imdb_rating': round(float(rng.uniform(3, 9.5)), 1),
+            'release_date': str(int(rng.integers(1960, 2026))),
+        }
+
+
+def pairs(rng, users, movies, count, weights):
+    """Up to count distinct (user_id, movie_id) pairs, movies drawn by popularity"""
+    user_index = rng.integers(0, len(users), size=count)
+    movie_index = rng.choice(len(movies), size=count, p=weights)
+    _, first = np.unique(user_index.astype(np.int64) * len(movies) + movie_index, return_index=True)
+    first.sort()
+    return users[user_index[first]], movies[movie_index[first]]
+
+
+def insert_chunks(table, rows):
+    """executemany rows (an iterable of dicts) in CHUNK-sized transactions; returns the count"""
+    from app import db
+    written, chunk = 0, []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK:
+            db.session.execute(table.insert(), chunk)
+            db.session.commit()
+            written += len(chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(table.insert(), chunk)
+        db.session.commit()
+        written += len(chunk)
+    return written
+
+
+def seed(args):
+    from werkzeug.security import generate_password_hash
+    from app import db, catalog, shelves
+    from app.catalog_io import import_catalog
+    from app.models import Movie, Payment, Review, SubscriptionPlan, User, UserSubscription, Watchlist
+    from app.reviews import recompute_review_stats
+
+    rng = np.random.default_rng(args.seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    if db.session.query(Movie.id).first() or db.session.query(User.id).first():
+        sys.exit('Database is not empty; point --database at a new file.')
+
+    started = time.perf_counter()
+    stats = import_catalog(movie_rows(rng, args.movies), batch_size=2000, posters=False)
+    movies = np.array(db.session.scalars(db.select(Movie.id).order_by(Movie.id)).all())
+    print(f"✅ {stats['inserted']:,} movies ({time.perf_counter() - started:.1f}s)")
+
+    started = time.perf_counter()
+    password = generate_password_hash(PASSWORD)  # one hash for everyone: hashing is slow on purpose
+    insert_chunks(User.__table__, [{
+        'email': 'admin@bench.local', 'username': 'Admin', 'password': password, 'is_admin': True,
+    }])
+    insert_chunks(User.__table__, ({
+        'email': f'user{i}@bench.local', 'username': f'user{i}', 'password': password, 'is_admin': False,
+    } for i in range(1, args.users + 1)))
+    users = np.array(db.session.scalars(db.select(User.id).where(User.is_admin.is_(False)).order_by(User.id)).all())
+    print(f"✅ {len(users):,} users ({time.perf_counter() - started:.1f}s)")
+
+    weights = popularity(rng, len(movies))
+
+    started = time.perf_counter()
+    review_users, review_movies = pairs(rng, users, movies, args.reviews, weights)
+    ratings = np.clip(np.rint(rng.normal(7, 2, size=len(review_users))), 1, 10).astype(int)
+    ages = rng.integers(0, 730 * 86400, size=len(review_users))
+    texts = rng.integers(0, len(REVIEW_TEXTS), size=len(review_users))
+    written = insert_chunks(Review.__table__, ({
+        'user_id': int(u), 'movie_id': int(m), 'rating': int(r),
+        'content': REVIEW_TEXTS[t], 'timestamp': now - timedelta(seconds=int(a)),
+    } for u, m, r, t, a in zip(review_users, review_movies, ratings, texts, ages)))
+    recompute_review_stats()
+    print(f"✅ {written:,} reviews ({time.perf_counter() - started:.1f}s)")
+
+    started = time.perf_counter()
+    saved_users, saved_movies = pairs(rng, users, movies, args.watchlist * len(users), weights)
+    written = insert_chunks(Watchlist.__table__, (
+        {'user_id': int(u), 'movie_id': int(m)} for u, m in zip(saved_users, saved_movies)
+    ))
+    print(f"✅ {written:,} watchlist entries ({time.perf_counter() - started:.1f}s)")
+
+    started = time.perf_counter()
+    plans = db.session.execute(db.select(SubscriptionPlan.id, SubscriptionPlan.price).where(
+        SubscriptionPlan.price > 0)).all()
+    subscribers = rng.choice(users, size=int(len(users) * args.subscribers), replace=False) if plans else []
+    subscriptions = []
+    for user_id in subscribers:
+        plan_id, price = plans[int(rng.integers(0, len(plans)))]
+        start = now - timedelta(days=int(rng.integers(0, 60)))
+        subscriptions.append({'user_id': int(user_id), 'plan_id': plan_id, 'start_date': start,
+                              'end_date': start + timedelta(days=30), '_price': price})
+    insert_chunks(UserSubscription.__table__, ({k: v for k, v in s.items() if k != '_price'} for s in subscriptions))
+    insert_chunks(Payment.__table__, ({
+        'user_id': s['user_id'], 'amount': s['_price'], 'payment_date': s['start_date'], 'status': 'Completed',
+    } for s in subscriptions))
+    print(f"✅ {len(subscriptions):,} subscriptions ({time.perf_counter() - started:.1f}s)")
+
+    if args.collab:
+        from app import collab
+        started = time.perf_counter()
+        collab.refresh(full=True)
+        print(f"✅ Collaborative picks ({time.perf_counter() - started:.1f}s)")
+
+    shelves.invalidate()
+    catalog.bump()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Seed a database with synthetic StreamVerse data')
+    parser.add_argument('--database', help='SQLAlchemy URL of a new database (default: $DATABASE_URL)')
+    parser.add_argument('--movies', type=int, default=10_000)
+    parser.add_argument('--users', type=int, default=5_000)
+    parser.add_argument('--reviews', type=int, default=200_000, help='drawn before duplicates are dropped')
+    parser.add_argument('--watchlist', type=int, default=10, help='saved movies per user, on average')
+    parser.add_argument('--subscribers', type=float, default=0.2, help='share of users with a paid plan')
+    parser.add_argument('--collab', action='store_true', help='also run `flask collab refresh --full`')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    if args.database:
+        os.environ['DATABASE_URL'] = args.database
+    os.environ.setdefault('WEBHOOK_WORKER', 'off')
+    from app import create_app
+    from app.db_init import initialize_db
+    app = create_app()
+    initialize_db(app)
+    with app.app_context():
+        seed(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Cold-start report for create_app()
+
+    python -m benchmarks.startup --runs 5 --target-ms 600
+
+Starts fresh interpreters and reports the median import + create_app() time,
+the create_app() phases (app.extensions['startup']), and a
+`python -X importtime` breakdown of the slowest packages and app modules.
+Exits with status 1 when the median misses the target.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+TARGET_MS = 600  # median import + create_app(); measured ~550 ms on a 1-CPU container
+
+
+_PROBE = """
+import json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+print(json.dumps({'import': imported - started, 'create_app': time.perf_counter() - imported,
+                  'phases': app.extensions['startup']}))
+"""
+
+_IMPORTTIME = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+
+
+def probe(importtime=False):
+    """Run _PROBE in a fresh interpreter; returns (timings, `-X importtime` lines)"""
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', _PROBE]
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr.splitlines()
+
+
+def import_breakdown(lines):
+    """(self time per top-level package, cumulative time per app module) in microseconds"""
+    packages, modules = {}, {}
+    for line in lines:
+        match = _IMPORTTIME.match(line)
+        if not match:
+            continue
+        own, cumulative, name = int(match.group(1)), int(match.group(2)), match.group(4)
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + own
+        if package == 'app':
+            modules[name] = cumulative
+    return packages, modules
+
+
+def _top(totals, n):
+    return sorted(totals.items(), key=lambda item: -item[1])[:n]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the cold start of create_app()')
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters to time')
+    parser.add_argument('--top', type=int, default=12, help='packages / modules to list')
+    parser.add_argument('--target-ms', type=float, default=TARGET_MS,
+                        help='exit 1 if the median import + create_app() is slower')
+    args = parser.parse_args(argv)
+
+    runs = [probe()[0] for _ in range(args.runs)]
+    totals = [(run['import'] + run['create_app']) * 1000 for run in runs]
+    median = statistics.median(totals)
+    print(f"import + create_app(): median {median:.0f} ms, max {max(totals):.0f} ms "
+          f"over {args.runs} runs (target {args.target_ms:.0f} ms)")
+    print(f"  import app         {statistics.median(r['import'] for r in runs) * 1000:7.1f} ms")
+    for i, (phase, _) in enumerate(runs[0]['phases']):
+        print(f"  {phase:<18} {statistics.median(r['phases'][i][1] for r in runs) * 1000:7.1f} ms")
+
+    _, lines = probe(importtime=True)
+    packages, modules = import_breakdown(lines)
+    print('\nImport self time by package (-X importtime):')
+    for name, micros in _top(packages, args.top):
+        print(f'  {name:<28} {micros / 1000:7.1f} ms')
+    print('\nApp modules, cumulative:')
+    for name, micros in _top(modules, args.top):
+        print(f'  {name:<28} {micros / 1000:7.1f} ms')
+
+    if median > args.target_ms:
+        print(f'\nCold start is over the {args.target_ms:.0f} ms target')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
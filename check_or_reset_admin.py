@@ -7,7 +7,9 @@ Usage:
 This script runs within the Flask app context and uses the same database.
 """
 
-from app import app, db, User, initialize_db
+from app import create_app, db
+from app.db_init import initialize_db
+from app.models import User
 from werkzeug.security import generate_password_hash
 import sys
 
@@ -24,6 +26,9 @@ def print_admin_info():
     print(f"  is_admin: {admin.is_admin}")
 
 
+app = create_app()
+
+
 if __name__ == '__main__':
     if len(sys.argv) >= 2 and sys.argv[1] == '--set-pass':
         if len(sys.argv) < 3:
@@ -32,7 +37,7 @@ if __name__ == '__main__':
         new_pw = sys.argv[2]
 
         with app.app_context():
-            initialize_db()
+            initialize_db(app)
             admin = User.query.filter_by(email='admin@streamverse.com').first()
             if not admin:
                 print("Admin user not found. You can seed one by setting STREAMVERSE_CREATE_ADMIN=1 before running the app.")
@@ -43,5 +48,5 @@ if __name__ == '__main__':
             print_admin_info()
     else:
         with app.app_context():
-            initialize_db()
+            initialize_db(app)
             print_admin_info()
@@ -1,10 +1,15 @@
-"""Main entry point for the application"""
+"""Main entry point for the application: pre-forked production server (see app/server.py)
+
+    python run.py --bind 0.0.0.0:8000 --workers 4
+
+For the debug server use `python app.py` or `flask --app run run --debug`.
+"""
 from app import create_app
-from app.db_init import initialize_db
+from app.db_init import check_schema
 
 app = create_app()
 
 if __name__ == '__main__':
-    initialize_db(app)
-    app.run(debug=True)
-
+    from app import server
+    check_schema(app)
+    server.main(app)
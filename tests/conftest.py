@@ -0,0 +1,17 @@
+import pytest
+from app import create_app, db, migrations
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """An app on a fresh, migrated SQLite file (tuned profile: reader and writer pools)"""
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "test.db"}')
+    monkeypatch.setenv('WEBHOOK_WORKER', 'off')
+    app = create_app()
+    with app.app_context():
+        migrations.upgrade()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
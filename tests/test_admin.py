@@ -0,0 +1,52 @@
+import os
+import pytest
+from sqlalchemy.exc import OperationalError
+from app import db
+from app.models import Movie, User
+
+
+@pytest.fixture
+def admin_client(app):
+    with app.app_context():
+        admin = User(email='a@example.com', username='a', password='x', is_admin=True)
+        db.session.add(admin)
+        db.session.commit()
+        admin_id = admin.id
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+        session['_fresh'] = True
+    return client
+
+
+def _movie_with_poster(app, name):
+    path = os.path.join(app.static_folder, 'posters', name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    with app.app_context():
+        movie = Movie(title='Alpha', description='-', poster_path=f'posters/{name}')
+        db.session.add(movie)
+        db.session.commit()
+        return movie.id, path
+
+
+def test_delete_movie_removes_its_poster(app, admin_client):
+    movie_id, path = _movie_with_poster(app, 'test-delete.jpg')
+    assert admin_client.post(f'/delete_movie/{movie_id}').status_code == 302
+    with app.app_context():
+        assert db.session.get(Movie, movie_id) is None
+    assert not os.path.exists(path)
+
+
+def test_failed_delete_keeps_the_poster(app, admin_client, monkeypatch):
+    movie_id, path = _movie_with_poster(app, 'test-keep.jpg')
+
+    def commit():
+        raise OperationalError('DELETE', {}, Exception('database is locked'))
+    monkeypatch.setattr(db.session, 'commit', commit)
+    try:
+        admin_client.post(f'/delete_movie/{movie_id}')
+    except OperationalError:
+        pass
+    assert os.path.exists(path)
+    os.remove(path)
@@ -0,0 +1,66 @@
+import asyncio
+import pytest
+from app import catalog, db, search
+from app.asgi import create_asgi_app
+from app.models import Movie
+from app.taxonomy import sync_movie_taxonomy
+
+PATHS = [
+    ('/api/shelves', ''),
+    ('/api/movies', ''),
+    ('/api/movies', 'genre=Drama&per_page=5'),
+    ('/api/search', 'q=love'),
+    ('/api/search', 'q=love&genre=Drama&sort=community'),
+    ('/api/search', 'mode=suggest&q=lov'),
+]
+
+
+def call(application, path, query='', headers=()):
+    """(status, headers, body) of one GET through the ASGI app"""
+    sent = []
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': query.encode(), 'http_version': '1.1',
+             'headers': [(k.lower().encode(), v.encode()) for k, v in headers],
+             'scheme': 'http', 'server': ('localhost', 80), 'client': ('127.0.0.1', 1)}
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        sent.append(message)
+    asyncio.run(application(scope, receive, send))
+    response_headers = {k.decode().lower(): v.decode() for k, v in sent[0]['headers']}
+    return sent[0]['status'], response_headers, b''.join(m.get('body', b'') for m in sent[1:])
+
+
+@pytest.fixture
+def application(app):
+    with app.app_context():
+        movies = [Movie(title=f'Love Story {i}', description='-', genre='Drama' if i % 2 else 'Comedy',
+                        imdb_rating=i % 10) for i in range(30)]
+        db.session.add_all(movies)
+        for movie in movies:
+            sync_movie_taxonomy(movie)
+        db.session.commit()
+        search.rebuild_search_index()
+        catalog.bump()
+    application = create_asgi_app(app)
+    application.warm()
+    return application
+
+
+@pytest.mark.parametrize('path,query', PATHS)
+def test_responses_match_the_flask_views(app, application, path, query):
+    expected = app.test_client().get(f'{path}?{query}')
+    status, headers, body = call(application, path, query)
+    assert (status, headers.get('etag'), body) == (expected.status_code, expected.headers.get('ETag'), expected.data)
+
+    assert call(application, path, query, [('If-None-Match', headers['etag'])])[0] == 304
+
+
+def test_paging_and_errors(app, application):
+    status, _, body = call(application, '/api/movies', 'per_page=4')
+    cursor = app.json.loads(body)['next_cursor']
+    flask_page = app.test_client().get(f'/api/movies?per_page=4&cursor={cursor}')
+    assert call(application, '/api/movies', f'per_page=4&cursor={cursor}')[2] == flask_page.data
+    assert call(application, '/api/movies', 'cursor=garbage')[0] == 400
+    assert call(application, '/login')[0] == 404  # everything else stays on the WSGI app
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+from app import autocomplete, db
+from app.models import Movie
+
+
+def _row(id, title, genre='Drama', tags='', imdb_rating=None):
+    return SimpleNamespace(id=id, title=title, genre=genre, tags=tags, poster_url=None, poster_path=None,
+                           poster_widths=None, imdb_rating=imdb_rating, description='')
+
+
+def _texts(suggestions):
+    return [s['text'] for s in suggestions]
+
+
+def test_typos_allowed_grow_with_the_query():
+    index = autocomplete.build_index([_row(1, 'Interstellar', 'Sci-Fi'), _row(2, 'Inception', 'Action')])
+    assert _texts(index.suggest('ine')[0]) == []  # short queries must match exactly
+    suggestions, movies = index.suggest('intre')  # one typo allowed from four letters on
+    assert _texts(suggestions) == ['Interstellar'] and suggestions[0]['distance'] == 1
+    assert [m.id for m in movies] == [1]
+    assert _texts(index.suggest('interstelar')[0]) == ['Interstellar']  # missing letter
+    assert _texts(index.suggest('xnception')[0]) == []  # the first letters must be right
+
+
+def test_exact_matches_titles_and_popular_movies_come_first():
+    index = autocomplete.build_index([
+        _row(1, 'Dark Water', 'Horror', imdb_rating=6.0),
+        _row(2, 'Dark Knight', 'Action', imdb_rating=9.0),
+        _row(3, 'Other', 'Darkwave', imdb_rating=9.5),
+    ])
+    suggestions, movies = index.suggest('dark')
+    assert [(s['text'], s['type']) for s in suggestions][:3] == [
+        ('Dark Knight', 'title'), ('Dark Water', 'title'), ('Darkwave', 'genre'),
+    ]
+    assert [m.id for m in movies] == [2, 1, 3]
+    assert [m.id for m in index.suggest('dark', genre='Horror')[1]] == [1]
+
+
+def test_index_follows_movie_changes():
+    index = autocomplete.build_index([_row(1, 'Alpha'), _row(2, 'Alpine')])
+    index.update_movie(_row(1, 'Beta'))
+    assert _texts(index.suggest('alp')[0]) == ['Alpine']
+    assert _texts(index.suggest('bet')[0]) == ['Beta']
+    index.remove_movie(2)
+    assert index.suggest('alp') == ([], [])
+
+
+def test_suggest_mode_of_the_search_api(app):
+    with app.app_context():
+        db.session.add(Movie(title='Gladiator', description='-', genre='Action'))
+        db.session.commit()
+    response = app.test_client().get('/api/search?mode=suggest&q=gladaitor')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert _texts(body['suggestions']) == ['Gladiator']
@@ -0,0 +1,79 @@
+import time
+from werkzeug.http import http_date
+from app import autocomplete, catalog, create_app, db, recommend, shelves
+from app.models import Movie
+
+
+def test_only_content_changes_drop_other_processes_indexes(app, monkeypatch):
+    monkeypatch.setenv('CATALOG_VERSION_TTL', '0')  # re-read the version on every check
+    with app.app_context():
+        db.session.add_all(Movie(title=f'Movie {i}', description='-', genre='Drama') for i in range(5))
+        db.session.commit()
+    other = create_app()  # a second worker on the same database
+    with other.app_context():
+        catalog.current()
+        model, index = recommend.get_model(), autocomplete.get_index()
+
+    with app.app_context():
+        catalog.bump(content=False)  # e.g. a new review
+    with other.app_context():
+        catalog.current()
+        assert recommend.get_model() is model
+        assert autocomplete.get_index() is index
+
+    with app.app_context():
+        catalog.bump()  # e.g. an admin edit
+    with other.app_context():
+        catalog.current()
+        assert recommend.get_model() is not model
+        assert autocomplete.get_index() is not index
+
+
+def test_collab_refresh_leaves_catalog_caches_and_etags_alone(app, monkeypatch):
+    monkeypatch.setenv('CATALOG_VERSION_TTL', '0')
+    with app.app_context():
+        db.session.add_all(Movie(title=f'Movie {i}', description='-', genre='Drama') for i in range(5))
+        db.session.commit()
+    other = create_app()
+    with other.app_context():
+        version = catalog.current()
+        collab_version = catalog.collab_version()
+        index = autocomplete.get_index()
+        shelves.get_global_shelves()
+        global_token = shelves.cache_token()
+
+    with app.app_context():
+        catalog.bump_collab()  # what `flask collab refresh` does after writing new rails
+    with other.app_context():
+        assert catalog.current() == version
+        assert catalog.collab_version() == collab_version + 1
+        assert autocomplete.get_index() is index
+        assert shelves.cache_token() == global_token
+
+
+def test_changes_within_one_second_are_not_served_as_304(app):
+    with app.app_context():
+        db.session.add_all(Movie(title=f'Movie {i}', description='-', imdb_rating=i) for i in range(3))
+        db.session.commit()
+        catalog.bump()
+    client = app.test_client()
+    first = client.get('/api/shelves')
+    assert 'Last-Modified' not in first.headers
+
+    with app.app_context():
+        db.session.add(Movie(title='Newest', description='-', imdb_rating=9))
+        db.session.commit()
+        shelves.invalidate()
+        catalog.bump()  # the same second as the first bump
+    assert client.get('/api/shelves', headers={'If-None-Match': first.headers['ETag']}).status_code == 200
+    again = client.get('/api/shelves', headers={'If-Modified-Since': http_date(time.time())})
+    assert again.status_code == 200
+    assert b'Newest' in again.data
+
+
+def test_collab_bump_changes_this_processs_etags_at_once(app):
+    with app.app_context():
+        app.config['CATALOG_VERSION_TTL'] = 3600
+        version = catalog.collab_version()
+        assert catalog.bump_collab() == version + 1
+        assert catalog.collab_version() == version + 1
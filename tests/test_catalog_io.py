@@ -0,0 +1,36 @@
+import io
+from app import db
+from app.catalog_io import import_catalog, read_rows
+from app.models import Movie
+
+FEED = '''external_id,title,genre,tags,language,runtime,imdb_rating
+a1,Alpha,Action,"Trending, Premium",English,120,7.5
+a1,Alpha2,Drama,,,,
+'''
+
+
+def test_repeated_id_in_one_batch_keeps_earlier_values(app):
+    with app.app_context():
+        stats = import_catalog(read_rows(io.StringIO(FEED), 'csv'), posters=False)
+        assert stats['inserted'] == 1
+        movie = db.session.scalars(db.select(Movie).filter_by(external_id='a1')).one()
+        assert (movie.title, movie.genre) == ('Alpha2', 'Drama')
+        assert (movie.tags, movie.language, movie.runtime, movie.imdb_rating) == (
+            'Trending, Premium', 'English', 120, 7.5)
+
+
+def test_local_ids_only_match_when_asked(app):
+    feed = 'external_id,title\nstreamverse-1,Exported title\n'
+    with app.app_context():
+        db.session.add(Movie(title='Admin-added here', description='-'))
+        db.session.commit()
+
+        stats = import_catalog(read_rows(io.StringIO(feed), 'csv'), posters=False)
+        assert (stats['inserted'], stats['updated']) == (1, 0)
+        assert db.session.get(Movie, 1).title == 'Admin-added here'
+
+        db.session.execute(db.delete(Movie).where(Movie.external_id == 'streamverse-1'))
+        db.session.commit()
+        stats = import_catalog(read_rows(io.StringIO(feed), 'csv'), posters=False, match_local_ids=True)
+        assert (stats['inserted'], stats['updated']) == (0, 1)
+        assert db.session.get(Movie, 1, populate_existing=True).title == 'Exported title'
@@ -0,0 +1,56 @@
+import pytest
+from app import catalog, collab, db
+from app.models import Movie, User, Watchlist
+
+
+@pytest.fixture
+def taste_groups(app, tmp_path):
+    """Movies 0-2 are saved together by one group of users, 3-5 by another; user 3 has not saved movie 2 yet"""
+    app.config['COLLAB_MODEL_PATH'] = str(tmp_path / 'collab.npz')
+    with app.app_context():
+        movies = [Movie(title=f'Movie {i}', description='-') for i in range(6)]
+        users = [User(email=f'u{i}@example.com', username=f'u{i}', password='x') for i in range(9)]
+        db.session.add_all([*movies, *users])
+        db.session.flush()
+        for i, user in enumerate(users[:8]):
+            group = movies[:3] if i < 3 else movies[:2] if i == 3 else movies[3:]
+            db.session.add_all(Watchlist(user_id=user.id, movie_id=m.id) for m in group)
+        db.session.commit()
+        yield [m.id for m in movies], [u.id for u in users]
+
+
+def _save(user_id, *movie_ids):
+    db.session.add_all(Watchlist(user_id=user_id, movie_id=m) for m in movie_ids)
+    db.session.commit()
+
+
+@pytest.mark.parametrize('method', ['svd', 'als'])
+def test_full_refresh_finds_the_groups(taste_groups, method):
+    movie_ids, user_ids = taste_groups
+    stats = collab.refresh(full=True, method=method, factors=2, top_k=5)
+    assert stats['mode'] == 'full' and stats['neighbors']
+    neighbors = [card.id for card in collab.also_saved(movie_ids[0], limit=2)]
+    assert sorted(neighbors) == movie_ids[1:3]
+    assert collab.picks_for(user_ids[3])[0] == movie_ids[2]
+
+
+def test_incremental_refresh_picks_for_new_savers(taste_groups):
+    movie_ids, user_ids = taste_groups
+    collab.refresh(full=True, factors=2, top_k=5)
+    newcomer = user_ids[8]
+    assert collab.picks_for(newcomer) == []
+
+    _save(newcomer, movie_ids[0], movie_ids[1])
+    version = catalog.collab_version()
+    stats = collab.refresh(top_k=5)
+    assert (stats['mode'], stats['users']) == ('incremental', 1)
+    assert collab.picks_for(newcomer)[0] == movie_ids[2]  # what the rest of the group saved
+    assert catalog.collab_version() == version + 1
+
+
+def test_many_new_interactions_force_a_full_refresh(taste_groups, app):
+    movie_ids, user_ids = taste_groups
+    collab.refresh(full=True, factors=2, top_k=5)
+    app.config['COLLAB_FULL_REFRESH_RATIO'] = 0.1
+    _save(user_ids[8], *movie_ids)
+    assert collab.refresh(top_k=5)['mode'] == 'full'
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+from flask import g
+from app import cache, db, entitlements
+from app.models import SubscriptionPlan, User, UserSubscription
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expires_and_evicts_least_recently_used(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+    ttl_cache = cache.TTLCache(maxsize=2, ttl=10)
+    ttl_cache.set('a', 1)
+    ttl_cache.set('b', 2, ttl=1)
+    clock.now += 2
+    assert ttl_cache.get('b') is None  # its own, shorter ttl
+    assert ttl_cache.get('a') == 1
+    ttl_cache.set('c', 3)
+    ttl_cache.set('d', 4)  # over maxsize: drops the least recently used
+    assert (ttl_cache.get('a'), ttl_cache.get('c'), ttl_cache.get('d')) == (None, 3, 4)
+    clock.now += 10
+    assert ttl_cache.get('c') is None
+
+
+def _user_with_plan():
+    user, plan = User(email='u@example.com', username='u', password='x'), SubscriptionPlan(
+        name='Basic', price=5, duration_days=30)
+    db.session.add_all([user, plan])
+    db.session.commit()
+    return user.id, plan.id
+
+
+def _subscribe(user_id, plan_id, end_date):
+    db.session.add(UserSubscription(user_id=user_id, plan_id=plan_id, end_date=end_date))
+    db.session.commit()
+
+
+def test_status_is_cached_until_invalidated(app):
+    with app.app_context():
+        user_id, plan_id = _user_with_plan()
+        assert entitlements.active_entitlement(user_id) is None
+        _subscribe(user_id, plan_id, datetime.utcnow() + timedelta(days=30))
+        g.pop('_entitlements')  # next request
+        assert entitlements.active_entitlement(user_id) is None  # cached "no subscription"
+        entitlements.invalidate(user_id)
+        entitlement = entitlements.active_entitlement(user_id)
+        assert entitlement.plan.name == 'Basic'
+
+
+def test_entry_expires_after_the_ttl(app, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+    app.config['SUBSCRIPTION_CACHE_TTL'] = 60
+    with app.app_context():
+        user_id, plan_id = _user_with_plan()
+        assert entitlements.active_entitlement(user_id) is None
+        _subscribe(user_id, plan_id, datetime.utcnow() + timedelta(days=30))  # e.g. by another worker
+        clock.now += 61
+        g.pop('_entitlements')
+        assert entitlements.active_entitlement(user_id) is not None
+
+
+def test_a_subscription_is_not_served_past_its_end(app, monkeypatch):
+    with app.app_context():
+        user_id, plan_id = _user_with_plan()
+        end = datetime.utcnow() + timedelta(hours=1)
+        _subscribe(user_id, plan_id, end)
+        assert entitlements.active_entitlement(user_id).end_date == end
+
+        class later(datetime):
+            @classmethod
+            def utcnow(cls):
+                return end + timedelta(seconds=1)
+        monkeypatch.setattr(entitlements, 'datetime', later)
+        g.pop('_entitlements')
+        assert entitlements.active_entitlement(user_id) is None  # cached, but ended
@@ -0,0 +1,19 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+from app import db
+
+
+def test_metrics_token(app):
+    app.config['METRICS_TOKEN'] = 's3cret'
+    client = app.test_client()
+    assert client.get('/admin/metrics', headers={'Authorization': 'Bearer s3cret'}).status_code == 200
+    assert client.get('/admin/metrics', headers={'Authorization': 'Bearer wrong'}).status_code != 200
+    assert client.get('/admin/metrics').status_code != 200
+
+
+def test_failed_statements_leave_no_timer_on_the_connection(app):
+    with app.app_context(), db.engine.connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.exec_driver_sql('SELECT * FROM no_such_table')
+        assert 'metrics_started' not in connection.info  # pooled connections would collect one per error
+        assert connection.exec_driver_sql('SELECT 1').scalar() == 1
@@ -0,0 +1,38 @@
+from app import db, migrations
+from app.models import Movie, Review, SchemaVersion, User
+
+
+def test_baseline_rerun_counts_reviews_it_missed(app):
+    """A baseline that died after adding the aggregate columns still fills them when it runs again"""
+    with app.app_context():
+        movie, user = Movie(title='Alpha', description='-'), User(email='u@example.com', username='u', password='x')
+        db.session.add_all([movie, user])
+        db.session.flush()
+        db.session.add_all(Review(content='-', rating=r, user_id=user.id, movie_id=movie.id) for r in (6, 8))
+        db.session.execute(db.delete(SchemaVersion))  # as if no migration had been recorded
+        db.session.commit()
+
+        assert migrations.current_version() == 0
+        migrations.upgrade()
+
+        movie = db.session.get(Movie, movie.id, populate_existing=True)
+        assert (movie.review_count, movie.rating_sum) == (2, 14)
+        assert movie.rating_counts == [0, 0, 0, 0, 0, 1, 0, 1, 0, 0]
+        assert migrations.current_version() == migrations.head()
+
+
+def test_histogram_counters_are_filled_from_the_reviews(app):
+    """Movies counted before the rating_N columns existed get their histogram on upgrade"""
+    with app.app_context():
+        movie, user = Movie(title='Alpha', description='-'), User(email='u@example.com', username='u', password='x')
+        db.session.add_all([movie, user])
+        db.session.flush()
+        db.session.add_all(Review(content='-', rating=r, user_id=user.id, movie_id=movie.id) for r in (3, 3, 9))
+        movie.review_count, movie.rating_sum = 3, 15  # the old counters, no histogram yet
+        db.session.execute(db.delete(SchemaVersion).where(SchemaVersion.version == 6))
+        db.session.commit()
+
+        migrations.upgrade()
+
+        movie = db.session.get(Movie, movie.id, populate_existing=True)
+        assert movie.rating_counts == [0, 0, 2, 0, 0, 0, 0, 0, 1, 0]
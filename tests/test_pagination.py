@@ -0,0 +1,56 @@
+from datetime import datetime
+import pytest
+from app import db
+from app.models import Movie
+from app.pagination import InvalidCursor, decode_cursor, encode_cursor, movie_page
+
+
+def _catalog():
+    """Seven movies, three of them sharing a created_at, so the id breaks ties"""
+    same = datetime(2024, 5, 1, 12, 0)
+    times = [datetime(2024, 1, 1), datetime(2024, 2, 1), same, same, same, datetime(2024, 6, 1), datetime(2024, 7, 1)]
+    movies = [Movie(title=f'Movie {i}', description='-', created_at=t) for i, t in enumerate(times)]
+    db.session.add_all(movies)
+    db.session.commit()
+    return sorted(movies, key=lambda m: (m.created_at, m.id), reverse=True)
+
+
+def test_cursor_round_trip():
+    when = datetime(2024, 5, 1, 12, 0, 30, 123456)
+    assert decode_cursor(encode_cursor(when, 42)) == (when, 42)
+    for garbage in ('', 'not-a-cursor', encode_cursor(when, 1)[:-3] + '!!'):
+        with pytest.raises(InvalidCursor):
+            decode_cursor(garbage)
+
+
+def test_pages_cover_the_catalog_once_in_order(app):
+    with app.app_context():
+        expected = [m.id for m in _catalog()]
+        seen, cursor = [], None
+        while True:
+            movies, cursor = movie_page(Movie.query, cursor, per_page=2)
+            seen += [m.id for m in movies]
+            if cursor is None:
+                break
+        assert seen == expected
+
+
+def test_new_movies_do_not_shift_later_pages(app):
+    with app.app_context():
+        expected = [m.id for m in _catalog()]
+        first, cursor = movie_page(Movie.query, None, per_page=3)
+        db.session.add(Movie(title='Just added', description='-', created_at=datetime(2025, 1, 1)))
+        db.session.commit()
+        second, _ = movie_page(Movie.query, cursor, per_page=3)
+        assert [m.id for m in first + second] == expected[:6]
+
+
+def test_api_movies_pages_and_rejects_bad_cursors(app):
+    with app.app_context():
+        expected = [m.id for m in _catalog()]
+    client = app.test_client()
+    first = client.get('/api/movies?per_page=4').get_json()
+    second = client.get(f"/api/movies?per_page=4&cursor={first['next_cursor']}").get_json()
+    assert [m['id'] for m in first['movies'] + second['movies']] == expected
+    assert second['next_cursor'] is None
+    assert client.get('/api/movies?cursor=garbage').status_code == 400
@@ -0,0 +1,86 @@
+import threading
+from types import SimpleNamespace
+import pytest
+from benchmarks import fake_stripe
+from app import db, payments
+from app.models import SubscriptionPlan, User, UserSubscription
+
+
+def test_a_slow_price_lookup_does_not_hold_up_other_plans():
+    client = payments.StripeClient('sk_test')
+    stalled, release = threading.Event(), threading.Event()
+
+    def find_price(lookup_key):
+        if '-plan-1-' in lookup_key:
+            stalled.set()
+            release.wait(5)
+        return f'price_{lookup_key}'
+    client._find_price = find_price
+
+    slow = threading.Thread(target=client.price_for, args=(SimpleNamespace(id=1, name='Basic', price=5),))
+    slow.start()
+    assert stalled.wait(5)
+    try:
+        assert client.price_for(SimpleNamespace(id=2, name='Pro', price=9)) == 'price_streamverse-plan-2-900-usd'
+        assert slow.is_alive()  # plan 1 is still being looked up
+    finally:
+        release.set()
+        slow.join()
+
+
+@pytest.fixture
+def stub():
+    server = fake_stripe.api_stub()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _base(server):
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def test_checkout_creates_the_price_once(stub):
+    client = payments.StripeClient('sk_test', api_base=_base(stub))
+    plan = SimpleNamespace(id=1, name='Basic', price=4.99)
+    for _ in range(2):
+        session = client.create_checkout_session(plan, 7, 'https://example.test/ok', 'https://example.test/no')
+        assert session['metadata'] == {'user_id': '7', 'plan_id': '1'}
+    assert stub.calls['POST /v1/prices'] == 1
+    assert stub.calls['POST /v1/checkout/sessions'] == 2
+
+
+def test_a_slow_stripe_times_out(stub):
+    stub.delay = 0.5
+    client = payments.StripeClient('sk_test', api_base=_base(stub), read_timeout=0.1)
+    with pytest.raises(payments.PaymentError, match='Timeout'):
+        client.request('GET', '/v1/prices')
+
+
+def test_calls_beyond_the_concurrency_limit_fail_fast():
+    client = payments.StripeClient('sk_test', api_base='http://127.0.0.1:9', max_concurrency=1, acquire_timeout=0.05)
+    assert client._slots.acquire()  # a call in flight
+    with pytest.raises(payments.PaymentsBusy):
+        client.request('GET', '/v1/prices')
+
+
+def test_subscribe_reports_an_unreachable_stripe(app, stub):
+    stub.delay = 0.5
+    app.config.update(STRIPE_SECRET_KEY='sk_test', STRIPE_API_BASE=_base(stub), STRIPE_READ_TIMEOUT=0.1)
+    with app.app_context():
+        user, plan = User(email='u@example.com', username='u', password='x'), SubscriptionPlan(
+            name='Basic', price=5, duration_days=30)
+        db.session.add_all([user, plan])
+        db.session.commit()
+        user_id, plan_id = user.id, plan.id
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+    response = client.post(f'/subscribe/{plan_id}')
+    assert response.status_code == 302 and response.location.endswith(f'/subscribe/{plan_id}')
+    with app.app_context():
+        assert UserSubscription.query.count() == 0  # no mock subscription either
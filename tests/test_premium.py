@@ -0,0 +1,33 @@
+from app import db
+from app.models import Movie, User
+from app.taxonomy import sync_movie_taxonomy
+
+
+def _login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+
+def test_badge_and_paywall_use_the_same_rule(app):
+    with app.app_context():
+        gated = Movie(title='Gated', description='-', tags='Drama, Premium')
+        open_ = Movie(title='Open', description='-', tags='Premium Exclusive')
+        user = User(email='u@example.com', username='u', password='x')
+        db.session.add_all([gated, open_, user])
+        for movie in (gated, open_):
+            sync_movie_taxonomy(movie)
+        db.session.commit()
+        assert (gated.is_premium, open_.is_premium) == (True, False)
+        ids = gated.id, open_.id, user.id
+
+    client = app.test_client()
+    _login(client, ids[2])
+    assert client.get(f'/movie/{ids[0]}').status_code == 302  # to the subscription page
+    response = client.get(f'/movie/{ids[1]}')
+    assert response.status_code == 200
+    assert b'sv-premium-badge' not in response.data
+
+    grid = {m['id']: m['premium'] for m in client.get('/api/movies').get_json()['movies']}
+    assert grid == {ids[0]: True, ids[1]: False}
+    assert client.get('/home').data.count(b'sv-premium-badge') >= 1
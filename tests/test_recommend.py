@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+from app import recommend
+
+
+def _row(id, genre, tags='', language='English', imdb_rating=7.0, runtime=110, age_rating='U/A'):
+    return SimpleNamespace(id=id, genre=genre, tags=tags, language=language, age_rating=age_rating,
+                           runtime=runtime, imdb_rating=imdb_rating)
+
+
+def _catalog():
+    return [
+        _row(1, 'Horror', 'Cult'),
+        _row(2, 'Horror', 'Cult', runtime=130),
+        _row(3, 'Horror', imdb_rating=5.0),
+        _row(4, 'Comedy', 'Family', language='Hindi', runtime=95),
+        _row(5, 'Comedy/Romance', 'Family', language='Hindi', runtime=100),
+    ]
+
+
+def test_picks_resemble_the_watchlist():
+    model = recommend.build_model(_catalog())
+    assert model.top_picks([1], limit=2) == [2, 3]
+    assert model.top_picks([4], limit=1) == [5]
+    assert 1 not in model.top_picks([1], limit=10)  # never the seeds themselves
+    assert model.top_picks([99]) == []
+
+
+def test_better_rated_movies_win_ties():
+    model = recommend.build_model([_row(1, 'Drama'), _row(2, 'Drama', imdb_rating=6.0), _row(3, 'Drama', imdb_rating=9.0)])
+    assert model.top_picks([1], limit=2) == [3, 2]
+
+
+def test_model_follows_movie_changes():
+    model = recommend.build_model(_catalog())
+    model.update_movie(_row(3, 'Comedy', 'Family', language='Hindi', runtime=95))
+    assert model.top_picks([4], limit=1) == [3]
+    model.update_movie(_row(6, 'Western', 'Spaghetti'))  # new terms get new columns
+    assert model.top_picks([6], limit=5)
+    model.remove_movie(5)
+    assert 5 not in model.top_picks([4], limit=10)
+
+
+def test_picks_are_cached_per_watchlist(app, monkeypatch):
+    with app.app_context():
+        model = recommend.build_model(_catalog())
+        monkeypatch.setattr(recommend, 'get_model', lambda: model)
+        calls = []
+        original = model.top_picks
+        monkeypatch.setattr(model, 'top_picks', lambda ids, limit: calls.append(ids) or original(ids, limit))
+        assert recommend.top_picks(1, [1], limit=2) == [2, 3]
+        assert recommend.top_picks(1, [1], limit=2) == [2, 3]
+        assert len(calls) == 1
+        recommend.top_picks(1, [1, 4], limit=2)  # the watchlist changed
+        assert len(calls) == 2
+        assert recommend.top_picks(1, []) == []
@@ -0,0 +1,54 @@
+import threading
+from app import db, reviews
+from app.models import Movie, Review, User
+
+
+def _movie_and_users(n_users=1):
+    movie = Movie(title='Alpha', description='A movie')
+    users = [User(email=f'u{i}@example.com', username=f'u{i}', password='x') for i in range(n_users)]
+    db.session.add_all([movie, *users])
+    db.session.commit()
+    return movie.id, [u.id for u in users]
+
+
+def test_add_review_counts_reviews_it_did_not_load(app):
+    with app.app_context():
+        movie_id, (user_id,) = _movie_and_users()
+        movie = db.session.get(Movie, movie_id)  # loaded before the other review lands, as the route does
+        assert movie.review_count == 0
+
+        with db.engine.begin() as connection:  # someone else's review, committed meanwhile
+            connection.execute(db.insert(Review).values(content='x', rating=4, user_id=user_id, movie_id=movie_id))
+            connection.execute(db.update(Movie).where(Movie.id == movie_id).values(
+                review_count=Movie.review_count + 1, rating_sum=Movie.rating_sum + 4, rating_4=Movie.rating_4 + 1))
+
+        reviews.add_review(movie_id, user_id, 'Great', 8)
+        db.session.commit()
+
+        db.session.expire_all()
+        movie = db.session.get(Movie, movie_id)
+        assert (movie.review_count, movie.rating_sum) == (2, 12)
+        assert movie.rating_counts == [0, 0, 0, 1, 0, 0, 0, 1, 0, 0]
+
+
+def test_concurrent_reviews_keep_aggregates_consistent(app):
+    with app.app_context():
+        movie_id, user_ids = _movie_and_users(8)
+
+    def post_reviews(user_id):
+        with app.app_context():
+            for i in range(10):
+                reviews.add_review(movie_id, user_id, 'Review', i % 10 + 1)
+                db.session.commit()
+
+    threads = [threading.Thread(target=post_reviews, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        movie = db.session.get(Movie, movie_id)
+        assert movie.review_count == 80
+        assert movie.rating_sum == 8 * sum(range(1, 11))
+        assert movie.rating_counts == [8] * 10
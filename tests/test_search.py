@@ -0,0 +1,44 @@
+from datetime import datetime
+from app import db, search
+from app.models import Movie
+from app.taxonomy import sync_movie_taxonomy
+
+
+def _movies(*rows):
+    movies = [Movie(title=title, description=description, genre=genre) for title, description, genre in rows]
+    db.session.add_all(movies)
+    for movie in movies:
+        sync_movie_taxonomy(movie)
+    db.session.commit()
+    search.rebuild_search_index()
+    return [m.id for m in movies]
+
+
+def test_title_matches_rank_above_description_matches(app):
+    with app.app_context():
+        in_description, in_title = _movies(
+            ('Quiet Days', 'A story about a storm at sea', 'Drama'),
+            ('Storm Front', 'Weather people', 'Thriller'),
+        )
+        assert search.fts_enabled()
+        assert [m.id for m in search.search_movies('storm')] == [in_title, in_description]
+        assert [m.id for m in search.search_movies('sto')] == [in_title, in_description]  # prefix of the last word
+        assert [m.id for m in search.search_movies('storm', genre='Drama')] == [in_description]
+
+
+def test_punctuation_is_not_fts_syntax(app):
+    with app.app_context():
+        (movie_id,) = _movies(('Love "Actually"', 'Christmas', 'Romance'))
+        assert search.build_match_query('love" OR (') == '"love" "or"*'
+        assert [m.id for m in search.search_movies('love" actually*')] == [movie_id]
+        assert search.search_movies('***') == []
+
+
+def test_substring_fallback_without_the_index(app):
+    with app.app_context():
+        older, newer = _movies(('Ocean Blue', '-', 'Drama'), ('Deep Ocean', '-', 'Drama'))
+        db.session.get(Movie, older).created_at = datetime(2020, 1, 1)
+        db.session.commit()
+        search._state()['fts'] = False  # e.g. PostgreSQL, or SQLite without FTS5
+        assert [m.id for m in search.search_movies('cean')] == [newer, older]  # newest first
+        assert [m.id for m in search.search_movies('ocean', genre='Comedy')] == []
@@ -0,0 +1,90 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import pytest
+from app import db, server
+from app.models import Movie
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_listen_binds_host_and_port(monkeypatch):
+    monkeypatch.delenv(server.LISTEN_FD, raising=False)
+    sock = server.listen('127.0.0.1:0')
+    try:
+        assert sock.getsockname()[0] == '127.0.0.1'
+        assert not sock.getblocking()  # workers race to accept
+    finally:
+        sock.close()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _get(url):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return response.status
+
+
+def _wait_until_serving(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        assert process.poll() is None, process.log.read_text()
+        try:
+            return _get(url)
+        except OSError:
+            time.sleep(0.2)
+    raise AssertionError('server did not come up')
+
+
+@pytest.fixture
+def running(app, tmp_path):
+    """run.py on the test database: two workers recycled every few requests"""
+    with app.app_context():
+        db.session.add_all(Movie(title=f'Movie {i}', description='-', imdb_rating=i) for i in range(5))
+        db.session.commit()
+    port = _free_port()
+    env = {**os.environ, 'DATABASE_URL': app.config['SQLALCHEMY_DATABASE_URI'], 'WEBHOOK_WORKER': 'off',
+           'PYTHONUNBUFFERED': '1'}
+    log = tmp_path / 'server.log'
+    with open(log, 'w') as out:
+        process = subprocess.Popen(
+            [sys.executable, 'run.py', '--bind', f'127.0.0.1:{port}', '--workers', '2', '--threads', '2',
+             '--max-requests', '3', '--max-requests-jitter', '0', '--graceful-timeout', '5'],
+            cwd=ROOT, env=env, stdout=out, stderr=subprocess.STDOUT,
+        )
+    process.log = log
+    url = f'http://127.0.0.1:{port}/api/shelves'
+    try:
+        assert _wait_until_serving(url, process) == 200
+        yield process, url
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+
+def test_recycles_reloads_and_shuts_down(running):
+    process, url = running
+    assert [_get(url) for _ in range(20)] == [200] * 20  # every worker recycled several times
+
+    process.send_signal(signal.SIGHUP)
+    deadline = time.monotonic() + 60
+    statuses = []
+    while 'Reloaded' not in process.log.read_text():
+        assert time.monotonic() < deadline, process.log.read_text()
+        statuses.append(_get(url))  # served by the old workers meanwhile
+    assert set(statuses) <= {200}
+    assert [_get(url) for _ in range(10)] == [200] * 10
+    assert process.poll() is None  # the same master process
+
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(timeout=30) == 0
+    assert 'Stopped' in process.log.read_text()
@@ -0,0 +1,18 @@
+from app import create_app, db
+from app.models import Movie
+
+
+def test_shelf_etags_match_across_processes(app):
+    with app.app_context():
+        db.session.add_all(Movie(title=f'Movie {i}', description='-', imdb_rating=i / 2) for i in range(12))
+        db.session.commit()
+    other = create_app()  # a second worker on the same database
+
+    first = app.test_client().get('/api/shelves')
+    second = other.test_client().get('/api/shelves')
+    assert first.status_code == second.status_code == 200
+    assert first.get_data() == second.get_data()
+    assert first.headers['ETag'] == second.headers['ETag']
+
+    revalidated = other.test_client().get('/api/shelves', headers={'If-None-Match': first.headers['ETag']})
+    assert revalidated.status_code == 304
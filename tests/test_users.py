@@ -0,0 +1,20 @@
+from app import db
+from app.models import User
+
+
+def test_revoked_admin_is_denied_on_the_next_request(app):
+    with app.app_context():
+        admin = User(email='a@example.com', username='a', password='x', is_admin=True)
+        db.session.add(admin)
+        db.session.commit()
+        admin_id = admin.id
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+        session['_fresh'] = True
+    assert client.get('/admin').status_code == 200  # the user is cached from here on
+
+    with app.app_context(), db.engine.begin() as connection:  # e.g. another process demotes them
+        connection.execute(db.update(User).where(User.id == admin_id).values(is_admin=False))
+    assert client.get('/admin').status_code == 302
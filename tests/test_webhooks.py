@@ -0,0 +1,93 @@
+import json
+from datetime import datetime
+from benchmarks import fake_stripe
+from app import db, webhooks
+from app.models import Payment, StripeEvent, SubscriptionPlan, User, UserSubscription
+
+SECRET = 'whsec_test'
+
+
+def _user_and_plan(app):
+    app.config['STRIPE_WEBHOOK_SECRET'] = SECRET
+    with app.app_context():
+        user, plan = User(email='u@example.com', username='u', password='x'), SubscriptionPlan(
+            name='Basic', price=5, duration_days=30)
+        db.session.add_all([user, plan])
+        db.session.commit()
+        return user.id, plan.id
+
+
+def _post(client, event, secret=SECRET):
+    body = json.dumps(event)
+    return client.post('/stripe/webhook', data=body, content_type='application/json',
+                       headers={'Stripe-Signature': fake_stripe.sign(body, secret)})
+
+
+def _due_now():
+    StripeEvent.query.update({StripeEvent.next_attempt_at: datetime.utcnow()})
+    db.session.commit()
+
+
+def test_redelivered_events_apply_once(app):
+    user_id, plan_id = _user_and_plan(app)
+    client = app.test_client()
+    event = fake_stripe.checkout_completed(user_id, plan_id, 500)
+    assert _post(client, event).status_code == 200
+    assert _post(client, event).status_code == 200  # Stripe retried: acknowledged again
+    same_payment = {**event, 'id': 'evt_other'}  # a different event about the same payment
+    assert _post(client, same_payment).status_code == 200
+
+    with app.app_context():
+        assert StripeEvent.query.count() == 2
+        assert webhooks.process_batch() == 2
+        assert Payment.query.count() == 1
+        assert UserSubscription.query.filter_by(user_id=user_id).count() == 1
+        assert {e.status for e in StripeEvent.query} == {'done'}
+
+
+def test_bad_signatures_are_rejected(app):
+    user_id, plan_id = _user_and_plan(app)
+    response = _post(app.test_client(), fake_stripe.checkout_completed(user_id, plan_id, 500), secret='whsec_wrong')
+    assert response.status_code == 400
+    with app.app_context():
+        assert StripeEvent.query.count() == 0
+
+
+def test_an_event_that_arrives_too_early_is_retried(app):
+    user_id, plan_id = _user_and_plan(app)
+    client = app.test_client()
+    purchase = fake_stripe.checkout_completed(user_id, plan_id, 500)
+    refund = fake_stripe.charge_refunded(purchase['data']['object']['payment_intent'], 500)
+    _post(client, refund)  # overtook the purchase
+    with app.app_context():
+        webhooks.process_batch()
+        event = StripeEvent.query.one()
+        assert (event.status, event.attempts) == ('pending', 1)
+        assert event.next_attempt_at > datetime.utcnow()  # backed off
+        assert webhooks.process_batch() == 0  # not due yet
+
+    _post(client, purchase)
+    with app.app_context():
+        assert webhooks.process_batch() == 1  # just the purchase
+        _due_now()
+        assert webhooks.process_batch() == 1
+        assert {e.status for e in StripeEvent.query} == {'done'}
+        assert Payment.query.one().status == 'Refunded'
+        assert UserSubscription.query.one().end_date <= datetime.utcnow()
+
+
+def test_events_stop_retrying(app):
+    user_id, plan_id = _user_and_plan(app)
+    app.config['WEBHOOK_MAX_ATTEMPTS'] = 2
+    client = app.test_client()
+    _post(client, fake_stripe.checkout_completed(user_id, 999, 500))  # unknown plan: never retried
+    _post(client, fake_stripe.charge_refunded('pi_unknown', 500))     # retried, then parked
+    with app.app_context():
+        for _ in range(3):
+            _due_now()
+            webhooks.process_batch()
+        events = {e.type: e for e in StripeEvent.query}
+        assert (events['checkout.session.completed'].status, events['checkout.session.completed'].attempts) == (
+            'failed', 1)
+        assert (events['charge.refunded'].status, events['charge.refunded'].attempts) == ('failed', 2)
+        assert 'LookupError' in events['charge.refunded'].last_error